@@ -0,0 +1,228 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+# How often a submission waiting on a full queue retries (and checks for stop())
+_FULL_POLL_S = 0.001
+
+
+class MicroBatcher:
+    """
+    Cross-request dynamic batching.
+
+    Callers submit an array/tensor with a leading batch dimension and get a
+    Future back. A worker thread concatenates pending submissions and runs
+    fn once per batch, flushing when max_batch_size rows are collected or
+    max_wait_ms has passed since the first pending submission. Each caller's
+    slice of the output is routed back to its Future. After stop(), queued
+    and new submissions fail with RuntimeError.
+    """
+
+    def __init__(self, fn, concat=np.concatenate, max_batch_size=64, max_wait_ms=5.0, max_queue=1024, name="batcher"):
+        self.fn = fn
+        self.concat = concat
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue = max_queue
+        self.name = name
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._carry = None
+        self._stopped = False
+        self._submit_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats = {
+            "batches": 0,
+            "items": 0,
+            "submissions": 0,
+            "last_batch_size": 0,
+            "max_queue_depth_seen": 0,
+            "queue_wait_ms_total": 0.0,
+            "run_ms_total": 0.0,
+            "errors": 0,
+        }
+        self._thread = threading.Thread(target=self._worker, name=f"{name}-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, batch):
+        """Queue rows for the next batch; blocks when max_queue submissions are pending."""
+        future = Future()
+        item = (batch, future, time.perf_counter())
+        while True:
+            # Nothing is queued once stop() has set the flag, so the worker can fail what is left.
+            # The lock is only held for non-blocking puts: a caller waiting on a full queue must
+            # not keep stop() from setting the flag
+            with self._submit_lock:
+                if self._stopped:
+                    future.set_exception(RuntimeError(f"{self.name} stopped"))
+                    return future
+                try:
+                    self._queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    pass
+            time.sleep(_FULL_POLL_S)
+        with self._lock:
+            self._stats["submissions"] += 1
+            self._stats["max_queue_depth_seen"] = max(self._stats["max_queue_depth_seen"], self._queue.qsize())
+        return future
+
+    def __call__(self, batch):
+        return self.submit(batch).result()
+
+    def stop(self):
+        """Finish the batch being run and fail the submissions still queued."""
+        with self._submit_lock:
+            self._stopped = True
+        try:
+            # Wakes an idle worker; a busy one sees the flag after its current batch
+            self._queue.put(_STOP, timeout=5)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=5)
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+        batches = max(stats["batches"], 1)
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "max_queue": self.max_queue,
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth_seen": stats["max_queue_depth_seen"],
+            "batches": stats["batches"],
+            "items": stats["items"],
+            "submissions": stats["submissions"],
+            "avg_batch_size": round(stats["items"] / batches, 2),
+            "last_batch_size": stats["last_batch_size"],
+            "avg_queue_wait_ms": round(stats["queue_wait_ms_total"] / max(stats["submissions"], 1), 3),
+            "avg_run_ms": round(stats["run_ms_total"] / batches, 3),
+            "errors": stats["errors"],
+        }
+
+    def _next(self, timeout):
+        if self._carry is not None:
+            item, self._carry = self._carry, None
+            return item
+        return self._queue.get(timeout=timeout) if timeout is not None else self._queue.get()
+
+    def _worker(self):
+        while True:
+            first = self._next(None)
+            if first is _STOP or self._stopped:
+                self._fail_pending(first)
+                return
+
+            pending = [first]
+            rows = len(first[0])
+            deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+            while rows < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._next(remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    # Run what was collected, then stop on it in the outer loop
+                    self._carry = item
+                    break
+                if rows + len(item[0]) > self.max_batch_size:
+                    # Keep it for the next batch rather than overshooting
+                    self._carry = item
+                    break
+                pending.append(item)
+                rows += len(item[0])
+
+            self._run(pending)
+
+    def _fail_pending(self, first):
+        items = [first, self._carry]
+        self._carry = None
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        failed = 0
+        for item in items:
+            if item is None or item is _STOP:
+                continue
+            item[1].set_exception(RuntimeError(f"{self.name} stopped"))
+            failed += 1
+        if failed:
+            logger.warning(f"{self.name}: stopped with {failed} submissions queued - failed them")
+
+    def _run(self, pending):
+        started = time.perf_counter()
+        try:
+            inputs = [batch for batch, _, _ in pending]
+            outputs = self.fn(inputs[0] if len(inputs) == 1 else self.concat(inputs))
+        except Exception as e:
+            logger.error(f"{self.name}: batch of {len(pending)} submissions failed: {e}")
+            with self._lock:
+                self._stats["errors"] += 1
+            for _, future, _ in pending:
+                future.set_exception(e)
+            return
+
+        offset = 0
+        for batch, future, _ in pending:
+            n = len(batch)
+            future.set_result(outputs[offset:offset + n])
+            offset += n
+
+        finished = time.perf_counter()
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["items"] += offset
+            self._stats["last_batch_size"] = offset
+            self._stats["queue_wait_ms_total"] += sum((started - queued) * 1000 for _, _, queued in pending)
+            self._stats["run_ms_total"] += (finished - started) * 1000
+
+
+class BatchedEmbedder:
+    """
+    Drop-in for the FaceNet module: embedder_model(face_t) calls from every
+    in-flight request are merged into shared forward passes.
+    """
+
+    def __init__(self, embedder_model, **batch_kwargs):
+        self.model = embedder_model
+        self.batcher = MicroBatcher(self._forward, concat=torch.cat, name="embedder", **batch_kwargs)
+
+    def _forward(self, batch):
+        # Grad mode is thread-local, so the worker needs its own no_grad
+        with torch.no_grad():
+            return self.model(batch)
+
+    def __call__(self, face_t):
+        return self.batcher(face_t)
+
+
+class BatchedQuantumHead:
+    """
+    Drop-in for a quantum head taking scaled embeddings
+    (NumpyQuantumHead / TFQTemplateHead): predict() calls are batched across requests.
+    """
+
+    def __init__(self, head, **batch_kwargs):
+        self.head = head
+        self.batcher = MicroBatcher(self._predict, name="quantum_head", **batch_kwargs)
+
+    def _predict(self, X_scaled):
+        return np.asarray(self.head.predict(X_scaled))
+
+    def predict(self, X_scaled):
+        return self.batcher(np.asarray(X_scaled, dtype=np.float64))
@@ -0,0 +1,866 @@
+"""
+Local benchmarks for the deepfake pipeline.
+
+Usage:
+    python benchmark.py quantum [--weights tfq_face_layers_weights.h5]
+    python benchmark.py circuits [--weights tfq_face_layers_weights.h5]
+    python benchmark.py tfq-warm [--weights tfq_face_layers_weights.h5]
+    python benchmark.py embed [--faces 20]
+    python benchmark.py preprocess [--faces 20]
+    python benchmark.py sampler [--durations 30 300 1800] [--clip-dir /tmp/entangl_clips]
+    python benchmark.py video-pipeline [--video clip.mp4] [--workers 1 2 4 8 16]
+    python benchmark.py detect --images faces/ [--labels boxes.json] [--max-sides 0 320 480 640 960]
+    python benchmark.py detect-backends --images faces/ [--labels boxes.json] [--backends haar res10 yunet]
+    python benchmark.py detect-pool --images faces/ [--threads 1 2 4 8]
+    python benchmark.py ranged-download [--seconds 300] [--seconds-range 6]
+    python benchmark.py early-exit --videos clips/ [--max-faces 20] [--delta 0.05]
+    python benchmark.py embedding-cache --images faces/ [--distances 0 2 4 6 8 10] [--hashes dhash phash]
+    python benchmark.py serve-load --images faces/ --video clip.mp4 [--url http://127.0.0.1:8000] [--concurrency 8]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_WEIGHTS = os.path.join(BASE_DIR, "tfq_face_layers_weights.h5")
+BATCH_SIZES = (1, 20, 200)
+
+
+def _time_call(fn, repeats=5):
+    """Best-of-N wall time of fn() in seconds."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_quantum(args):
+    """NumPy statevector head vs the TFQ model (when TFQ is installed)."""
+    from quantum_numpy import NumpyQuantumHead
+
+    load_start = time.perf_counter()
+    head = NumpyQuantumHead.from_h5(args.weights, n_qubits=8, n_layers=12)
+    print(f"compile from h5: {(time.perf_counter() - load_start) * 1e3:.1f} ms")
+    rng = np.random.default_rng(0)
+
+    tfq_model = None
+    try:
+        import tensorflow_quantum as tfq
+        from predictimg import create_tfq_model_layers, batch_features_to_circuits_layers
+        tfq_model = create_tfq_model_layers(n_qubits=8, n_layers=12, learning_rate=1e-3)
+        tfq_model.load_weights(args.weights)
+    except ImportError:
+        print("TensorFlow Quantum not installed - timing NumPy head only")
+
+    for batch in BATCH_SIZES:
+        X = rng.normal(size=(batch, 512))
+        t_np = _time_call(lambda: head.predict(X))
+        line = f"batch={batch:4d}  numpy: {t_np * 1e6 / batch:9.1f} us/face"
+        if tfq_model is not None:
+            def run_tfq():
+                circuits, _ = batch_features_to_circuits_layers(X, 8)
+                return tfq_model.predict(tfq.convert_to_tensor(circuits), verbose=0)
+            t_tfq = _time_call(run_tfq, repeats=2)
+            max_err = np.max(np.abs(run_tfq().ravel() - head.predict(X).ravel()))
+            line += f"  tfq: {t_tfq * 1e6 / batch:9.1f} us/face  max|diff|: {max_err:.2e}"
+        print(line)
+
+
+def bench_circuits(args):
+    """TFQ circuit prep: cirq circuit per face + serialization vs symbolic template angles."""
+    import tensorflow_quantum as tfq
+    from predictimg import create_tfq_model_layers, batch_features_to_circuits_layers, TFQTemplateHead
+
+    keras_model = create_tfq_model_layers(n_qubits=8, n_layers=12, learning_rate=1e-3)
+    keras_model.load_weights(args.weights)
+    head = TFQTemplateHead(keras_model, n_qubits=8)
+    rng = np.random.default_rng(0)
+
+    for batch in BATCH_SIZES:
+        X = rng.normal(size=(batch, 512))
+
+        def before():
+            circuits, _ = batch_features_to_circuits_layers(X, 8)
+            return tfq.convert_to_tensor(circuits)
+
+        t_before = _time_call(before, repeats=2)
+        t_after = _time_call(lambda: head.encode_angles(X))
+        max_err = np.max(np.abs(keras_model.predict(before(), verbose=0).ravel() - head.predict(X).ravel()))
+        print(
+            f"batch={batch:4d}  before: {t_before * 1e3:9.2f} ms  after: {t_after * 1e3:7.3f} ms  "
+            f"speedup: {t_before / t_after:7.0f}x  max|diff|: {max_err:.2e}"
+        )
+
+
+def bench_tfq_warm(args):
+    """First-request and steady-state latency: Keras model.predict vs the warmed tf.function head."""
+    import tensorflow_quantum as tfq
+    from predictimg import create_tfq_model_layers, batch_features_to_circuits_layers, TFQTemplateHead
+
+    keras_model = create_tfq_model_layers(n_qubits=8, n_layers=12, learning_rate=1e-3)
+    keras_model.load_weights(args.weights)
+    rng = np.random.default_rng(0)
+
+    for batch in (5, 20):
+        X = rng.normal(size=(batch, 512))
+        tensor = tfq.convert_to_tensor(batch_features_to_circuits_layers(X, 8)[0])
+
+        start = time.perf_counter()
+        keras_model.predict(tensor, verbose=0)
+        keras_first = time.perf_counter() - start
+        keras_steady = _time_call(lambda: keras_model.predict(tensor, verbose=0))
+
+        head = TFQTemplateHead(keras_model, n_qubits=8)
+        start = time.perf_counter()
+        head.predict(X)
+        head_first = time.perf_counter() - start
+        head_steady = _time_call(lambda: head.predict(X))
+
+        print(
+            f"batch={batch:3d}  model.predict first/steady: {keras_first * 1e3:8.1f} / {keras_steady * 1e3:7.1f} ms  "
+            f"tf.function first(trace)/steady: {head_first * 1e3:8.1f} / {head_steady * 1e3:7.1f} ms"
+        )
+
+
+def bench_embed(args):
+    """Per-face FaceNet calls vs one batched pass over all crops of a request."""
+    import torch
+    from predictimg import get_facenet_feature_extractor, facenet_transform, embed_faces
+
+    embedder = get_facenet_feature_extractor()
+    rng = np.random.default_rng(0)
+    crops = [rng.random((rng.integers(90, 200), rng.integers(90, 200), 3), dtype=np.float32) for _ in range(args.faces)]
+
+    def per_face():
+        with torch.no_grad():
+            return np.stack([embedder(facenet_transform(c).unsqueeze(0)).view(-1).numpy() for c in crops])
+
+    t_loop = _time_call(per_face, repeats=2)
+    t_batch = _time_call(lambda: embed_faces(crops, embedder), repeats=2)
+    max_err = np.max(np.abs(per_face() - embed_faces(crops, embedder)))
+    print(
+        f"faces={args.faces}  per-face: {t_loop * 1e3 / args.faces:7.1f} ms/face  "
+        f"batched: {t_batch * 1e3 / args.faces:7.1f} ms/face  speedup: {t_loop / t_batch:4.1f}x  max|diff|: {max_err:.2e}"
+    )
+
+
+def bench_preprocess(args):
+    """PIL facenet_transform vs vectorized cv2/NumPy preprocessing, per face."""
+    import torch
+    from predictimg import facenet_transform, facenet_preprocess_batch
+
+    rng = np.random.default_rng(0)
+    crops = [rng.random((rng.integers(80, 400), rng.integers(80, 400), 3), dtype=np.float32) for _ in range(args.faces)]
+
+    t_pil = _time_call(lambda: torch.stack([facenet_transform(c) for c in crops]))
+    t_cv = _time_call(lambda: facenet_preprocess_batch(crops))
+    max_err = torch.max(torch.abs(torch.stack([facenet_transform(c) for c in crops]) - facenet_preprocess_batch(crops)))
+    print(
+        f"faces={args.faces}  PIL: {t_pil * 1e6 / args.faces:8.1f} us/face  "
+        f"cv2: {t_cv * 1e6 / args.faces:8.1f} us/face  speedup: {t_pil / t_cv:4.1f}x  max|diff|: {max_err:.4f}"
+    )
+
+
+def _make_h264_clip(path, seconds, fps=30, size=(320, 240), audio=False, faststart=False):
+    """
+    Synthetic H.264 clip (libx264 via PyAV, default GOP) whose frames all differ,
+    optionally with an interleaved AAC tone and the moov index at the front.
+    """
+    import av
+
+    width, height = size
+    pattern = np.add.outer(np.arange(height), np.arange(width)).astype(np.uint8)
+    with av.open(path, "w", options={"movflags": "faststart"} if faststart else {}) as container:
+        stream = container.add_stream("libx264", rate=fps)
+        stream.width, stream.height, stream.pix_fmt = width, height, "yuv420p"
+        stream.options = {"preset": "ultrafast"}
+        if audio:
+            audio_stream = container.add_stream("aac", rate=44100)
+            samples = 44100 // fps
+        for i in range(int(seconds * fps)):
+            shift = np.uint8(i % 256)
+            image = np.dstack([pattern + shift, np.roll(pattern, i, axis=1), pattern - shift])
+            for packet in stream.encode(av.VideoFrame.from_ndarray(image, format="bgr24")):
+                container.mux(packet)
+            if audio:
+                tone = np.sin(2 * np.pi * 440 * (np.arange(samples) + i * samples) / 44100).astype(np.float32)
+                frame = av.AudioFrame.from_ndarray(tone[None, :], format="fltp", layout="mono")
+                frame.sample_rate = 44100
+                for packet in audio_stream.encode(frame):
+                    container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+        if audio:
+            for packet in audio_stream.encode():
+                container.mux(packet)
+
+
+def bench_sampler(args):
+    """Per-frame seek vs seek-once + grab/retrieve vs PyAV keyframes, tail window and whole video."""
+    import cv2
+    from frame_sampling import FRAME_SAMPLERS, PYAV_AVAILABLE, iter_sampled_frames
+
+    if not PYAV_AVAILABLE:
+        raise SystemExit("PyAV is needed to generate the H.264 clips (pip install av)")
+    os.makedirs(args.clip_dir, exist_ok=True)
+
+    for seconds in args.durations:
+        path = os.path.join(args.clip_dir, f"clip_{seconds}s.mp4")
+        if not os.path.exists(path):
+            start = time.perf_counter()
+            _make_h264_clip(path, seconds)
+            print(f"generated {path} in {time.perf_counter() - start:.1f} s")
+
+        for window, seconds_range in (("tail", 6), ("whole", seconds)):
+            line = f"{seconds:5d}s clip  {window:5s}"
+            reference = None
+            for sampler in FRAME_SAMPLERS:
+                cap = cv2.VideoCapture(path)
+                fps = cap.get(cv2.CAP_PROP_FPS)
+                frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                # Same sampling range as predict_video_consistent with max_faces=20
+                start_frame = max(0, frame_count - int(seconds_range * fps))
+                step = max(1, int((frame_count - start_frame) / (20 * 2)))
+
+                start = time.perf_counter()
+                frames = list(iter_sampled_frames(path, cap, start_frame, frame_count, step, sampler))
+                elapsed = time.perf_counter() - start
+                cap.release()
+
+                line += f"  {sampler}: {elapsed * 1e3:8.1f} ms ({len(frames):2d} frames)"
+                if sampler == "seek":
+                    reference = frames
+                elif sampler == "grab":
+                    same = len(frames) == len(reference) and all(
+                        a[0] == b[0] and np.array_equal(a[1], b[1]) for a, b in zip(frames, reference)
+                    )
+                    line += " same" if same else " DIFF"
+            print(line)
+
+
+def bench_video_pipeline(args):
+    """Single-threaded decode/detect/embed loop vs the threaded pipeline, wall clock per video."""
+    import cv2
+    from frame_sampling import iter_sampled_frames
+    from predictimg import detect_faces_upper_half, get_facenet_feature_extractor, embed_faces
+    from video_pipeline import VideoFacePipeline
+
+    path = args.video
+    if path is None:
+        os.makedirs(args.clip_dir, exist_ok=True)
+        path = os.path.join(args.clip_dir, "clip_1080p_10s.mp4")
+        if not os.path.exists(path):
+            _make_h264_clip(path, 10, size=(1920, 1080))
+
+    embedder = get_facenet_feature_extractor()
+    embed = lambda crops: embed_faces(crops, embedder)
+
+    def frames():
+        cap = cv2.VideoCapture(path)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        # Tail window as in predict_video_consistent (6 s, max_faces=20)
+        start_frame = max(0, frame_count - int(6 * cap.get(cv2.CAP_PROP_FPS)))
+        step = max(1, int((frame_count - start_frame) / 40))
+        return cap, iter_sampled_frames(path, cap, start_frame, frame_count, step, "grab")
+
+    def sequential():
+        cap, sampled = frames()
+        crops = []
+        for _, frame in sampled:
+            for (x, y, w, h) in detect_faces_upper_half(frame):
+                crops.append(frame[y:y+h, x:x+w])
+            if len(crops) >= args.max_faces:
+                break
+        cap.release()
+        return embed(crops[:args.max_faces]) if crops else None
+
+    def pipelined(workers):
+        cap, sampled = frames()
+        pipeline = VideoFacePipeline(lambda: detect_faces_upper_half, embed, detect_workers=workers)
+        result = pipeline.run(sampled, args.max_faces)
+        cap.release()
+        return result
+
+    t_seq = _time_call(sequential, repeats=2)
+    print(f"{path}  cpus={os.cpu_count()}  sequential: {t_seq * 1e3:8.1f} ms")
+    for workers in args.workers:
+        t_pipe = _time_call(lambda: pipelined(workers), repeats=2)
+        print(f"  detect_workers={workers:2d}  pipeline: {t_pipe * 1e3:8.1f} ms  speedup: {t_seq / t_pipe:4.1f}x")
+
+
+def _iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter) if inter else 0.0
+
+
+def _match(found, expected, threshold=0.5):
+    """Greedy one-to-one matches between detected and expected boxes at IoU >= threshold."""
+    unmatched, hits = list(expected), 0
+    for box in found:
+        best = max(unmatched, key=lambda ref: _iou(box, ref), default=None)
+        if best is not None and _iou(box, best) >= threshold:
+            unmatched.remove(best)
+            hits += 1
+    return hits
+
+
+def bench_detect(args):
+    """
+    Haar detection accuracy vs speed per working size on a local image set.
+    --labels is a JSON file {"image.jpg": [[x, y, w, h], ...]} in full-resolution
+    pixels; without it, full-resolution detections (max side 0) are the reference.
+    """
+    import json
+
+    import cv2
+    from predictimg import detect_faces_in_image
+
+    images = {}
+    for name in sorted(os.listdir(args.images)):
+        image = cv2.imread(os.path.join(args.images, name))
+        if image is not None:
+            images[name] = image
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+
+    if args.labels:
+        with open(args.labels) as f:
+            reference = {name: [tuple(box) for box in boxes] for name, boxes in json.load(f).items() if name in images}
+    else:
+        reference = {name: detect_faces_in_image(image, max_side=0) for name, image in images.items()}
+    expected = sum(len(boxes) for boxes in reference.values())
+    print(f"{len(images)} images, {expected} reference faces ({'labels' if args.labels else 'full-resolution detections'})")
+
+    baseline = None
+    for max_side in args.max_sides:
+        found, hits, elapsed = 0, 0, 0.0
+        for name, image in images.items():
+            start = time.perf_counter()
+            boxes = detect_faces_in_image(image, max_side=max_side)
+            elapsed += time.perf_counter() - start
+            found += len(boxes)
+            hits += _match(boxes, reference.get(name, []))
+        ms = elapsed * 1e3 / len(images)
+        baseline = baseline or ms
+        print(
+            f"max_side={max_side or 'full':>5}  {ms:8.1f} ms/image  speedup: {baseline / ms:5.1f}x  "
+            f"recall: {hits / max(expected, 1):.3f}  precision: {hits / max(found, 1):.3f}  faces lost: {expected - hits}"
+        )
+
+
+def bench_detect_backends(args):
+    """
+    Latency per megapixel and recall/precision of each face detector backend
+    on a local image set, at --max-side. Reference boxes come from --labels
+    (as in `detect`) or, without labels, from the first backend at full resolution.
+    Backends whose model files are missing from models/ are skipped. Box
+    conventions differ between backends, so --iou may need to be lower than
+    the 0.5 used for same-backend comparisons.
+    """
+    import json
+
+    import cv2
+    from detector_backends import create_detector
+
+    images = {}
+    for name in sorted(os.listdir(args.images)):
+        image = cv2.imread(os.path.join(args.images, name))
+        if image is not None:
+            images[name] = image
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+    megapixels = sum(image.shape[0] * image.shape[1] for image in images.values()) / 1e6
+
+    detectors = {}
+    for backend in args.backends:
+        try:
+            detectors[backend] = create_detector(backend)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"{backend:>6}  skipped: {e}")
+    if not detectors:
+        raise SystemExit("No detector backend available")
+
+    if args.labels:
+        with open(args.labels) as f:
+            reference = {name: [tuple(box) for box in boxes] for name, boxes in json.load(f).items() if name in images}
+    else:
+        first = next(iter(detectors.values()))
+        reference = {name: first.detect(image, max_side=0) for name, image in images.items()}
+    expected = sum(len(boxes) for boxes in reference.values())
+    print(f"{len(images)} images ({megapixels:.1f} MP), {expected} reference faces "
+          f"({'labels' if args.labels else next(iter(detectors)) + ' at full resolution'}), max_side={args.max_side or 'full'}")
+
+    for backend, detector in detectors.items():
+        # Warm-up run so one-off DNN initialisation is not timed
+        detector.detect(next(iter(images.values())), max_side=args.max_side)
+        found, hits, elapsed = 0, 0, 0.0
+        for name, image in images.items():
+            start = time.perf_counter()
+            boxes = detector.detect(image, max_side=args.max_side)
+            elapsed += time.perf_counter() - start
+            found += len(boxes)
+            hits += _match(boxes, reference.get(name, []), threshold=args.iou)
+        print(
+            f"{backend:>6}  {elapsed * 1e3 / megapixels:8.1f} ms/MP  {elapsed * 1e3 / len(images):8.1f} ms/image  "
+            f"recall: {hits / max(expected, 1):.3f}  precision: {hits / max(found, 1):.3f}"
+        )
+
+
+def bench_detect_pool(args):
+    """Concurrent detect_faces_in_image calls through the detector pool, images/s per thread count."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    import cv2
+    from detector_pool import DetectorPool
+    import predictimg
+
+    images = [cv2.imread(os.path.join(args.images, name)) for name in sorted(os.listdir(args.images))]
+    images = [image for image in images if image is not None] * args.repeat
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+
+    for threads in args.threads:
+        predictimg.face_detectors = DetectorPool(max_size=threads)
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            elapsed = _time_call(lambda: list(executor.map(predictimg.detect_faces_in_image, images)), repeats=2)
+        metrics = predictimg.face_detectors.metrics()
+        per_detector = ", ".join(f"{d['calls_per_s']:.0f}" for d in metrics["detectors"])
+        print(
+            f"threads={threads:>2}  {len(images) / elapsed:8.1f} images/s  detectors: {metrics['created']}  "
+            f"avg wait: {metrics['avg_wait_ms']:.2f} ms  per-detector calls/s: {per_detector}"
+        )
+
+
+def _serve_directory(directory, range_support):
+    """Local static file server in a background thread (http.server ignores Range; the subclass adds it)."""
+    import re
+    import threading
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(SimpleHTTPRequestHandler):
+        def __init__(self, *handler_args, **kwargs):
+            super().__init__(*handler_args, directory=directory, **kwargs)
+
+        def log_message(self, *log_args):
+            pass
+
+        def send_head(self):
+            match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+            path = self.translate_path(self.path)
+            if not range_support or not match or not os.path.isfile(path):
+                return super().send_head()
+            size = os.path.getsize(path)
+            start = int(match.group(1))
+            end = min(int(match.group(2) or size - 1), size - 1)
+            f = open(path, "rb")
+            f.seek(start)
+            self.send_response(206)
+            self.send_header("Content-Type", self.guess_type(path))
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Accept-Ranges", "bytes")
+            self.end_headers()
+            return _LimitedReader(f, end - start + 1)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class _LimitedReader:
+    """File wrapper that lets SimpleHTTPRequestHandler.copyfile send only one byte range."""
+
+    def __init__(self, f, length):
+        self.f, self.remaining = f, length
+
+    def read(self, size=-1):
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+def bench_ranged_download(args):
+    """
+    Full vs tail-only ranged download of generated clips (moov at the end and
+    at the front, with audio) from local servers with and without Range
+    support: bytes transferred, requests, time, and whether the sampled tail
+    frames decode identically from the sparse file.
+    """
+    import cv2
+    from frame_sampling import PYAV_AVAILABLE, iter_sampled_frames
+    from ranged_download import download_video_tail
+
+    if not PYAV_AVAILABLE:
+        raise SystemExit("PyAV is needed to generate the H.264 clips (pip install av)")
+    os.makedirs(args.clip_dir, exist_ok=True)
+
+    def tail_frames(path):
+        cap = cv2.VideoCapture(path)
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        start_frame = max(0, frame_count - int(args.seconds_range * fps))
+        step = max(1, int((frame_count - start_frame) / 40))
+        frames = [frame for _, frame in iter_sampled_frames(path, cap, start_frame, frame_count, step, "grab")]
+        cap.release()
+        return frames
+
+    for faststart in (False, True):
+        name = f"clip_{args.seconds}s_audio{'_faststart' if faststart else ''}.mp4"
+        path = os.path.join(args.clip_dir, name)
+        if not os.path.exists(path):
+            _make_h264_clip(path, args.seconds, audio=True, faststart=faststart)
+        reference = tail_frames(path)
+
+        for range_support in (True, False):
+            server = _serve_directory(args.clip_dir, range_support)
+            url = f"http://127.0.0.1:{server.server_address[1]}/{name}"
+            with tempfile.TemporaryDirectory() as tmp:
+                stats = {}
+                local = download_video_tail(url, os.path.join(tmp, name), args.seconds_range, stats=stats)
+                frames = tail_frames(local)
+                identical = len(frames) == len(reference) and all(np.array_equal(a, b) for a, b in zip(frames, reference))
+            server.shutdown()
+            print(
+                f"{'faststart' if faststart else 'moov-at-end':>11}  range={'yes' if range_support else 'no ':<3}  "
+                f"mode={stats['mode']:<6}  {stats['bytes_transferred'] / 1e6:8.2f} / {stats['file_size'] / 1e6:.2f} MB  "
+                f"requests: {stats['requests']}  {stats['download_ms']:8.1f} ms  tail frames identical: {identical}"
+            )
+
+
+def bench_early_exit(args):
+    """Full face budget vs early-exit scoring per video: latency, faces used and label agreement."""
+    import joblib
+    from predictimg import predict_video_consistent, get_facenet_feature_extractor
+    from quantum_numpy import NumpyQuantumHead
+    from early_exit import EARLY_EXIT_METHODS
+
+    scaler = joblib.load(args.scaler)
+    head = NumpyQuantumHead.from_h5(args.weights, n_qubits=8, n_layers=12)
+    embedder = get_facenet_feature_extractor()
+    videos = [os.path.join(args.videos, name) for name in sorted(os.listdir(args.videos))
+              if name.lower().endswith(('.mp4', '.avi', '.mov', '.mkv'))]
+
+    results = {method: [] for method in EARLY_EXIT_METHODS}
+    for path in videos:
+        for method in EARLY_EXIT_METHODS:
+            stats = {}
+            start = time.perf_counter()
+            try:
+                _, label = predict_video_consistent(
+                    path, head, scaler, embedder,
+                    max_faces_per_video=args.max_faces,
+                    augment="deterministic",
+                    early_exit=method,
+                    early_exit_delta=args.delta,
+                    stats=stats
+                )
+            except Exception as e:
+                print(f"{os.path.basename(path)}: {e}")
+                break
+            results[method].append((label, time.perf_counter() - start, stats["faces_used"]))
+
+    full = results["off"]
+    for method in EARLY_EXIT_METHODS:
+        runs = results[method][:len(full)]
+        if not runs:
+            continue
+        agree = sum(run[0] == ref[0] for run, ref in zip(runs, full)) / len(runs)
+        latency = np.mean([run[1] for run in runs])
+        print(
+            f"{method:9s}  videos: {len(runs):3d}  mean latency: {latency * 1e3:8.1f} ms  "
+            f"saved: {1 - latency / np.mean([ref[1] for ref in full]):6.1%}  "
+            f"faces used: {np.mean([run[2] for run in runs]):5.1f}/{args.max_faces}  agreement: {agree:.3f}"
+        )
+
+
+def _near_duplicates(image):
+    """(name, image) copies of an image as re-shared media: re-encoded, rescaled, re-cropped, brightened."""
+    import cv2
+
+    h, w = image.shape[:2]
+    margin = max(1, int(0.03 * min(h, w)))
+
+    def jpeg(quality):
+        return cv2.imdecode(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1], cv2.IMREAD_COLOR)
+
+    def rescale(factor):
+        return cv2.resize(image, (int(w * factor), int(h * factor)), interpolation=cv2.INTER_AREA)
+
+    return [
+        ("jpeg q90", jpeg(90)),
+        ("jpeg q50", jpeg(50)),
+        ("rescale 0.75", rescale(0.75)),
+        ("rescale 0.5", rescale(0.5)),
+        ("crop 3%", image[margin:h - margin, margin:w - margin]),
+        ("brightness +12", cv2.convertScaleAbs(image, alpha=1.0, beta=12)),
+    ]
+
+
+def bench_embedding_cache(args):
+    """
+    Perceptual-hash embedding cache on near-duplicate media. The faces of
+    every image fill a fresh cache, then re-encoded, rescaled, re-cropped
+    and brightened copies are scored through it. Per hash and Hamming
+    distance: share of the copies' crops served from the cache, false hits
+    (faces of the other half of the images hitting a cache filled with the
+    first half), cosine similarity of reused to true embeddings, and how
+    often the image label changes compared with embedding every crop.
+    """
+    import cv2
+    import joblib
+    from predictimg import extract_image_faces, get_facenet_feature_extractor, embed_faces
+    from quantum_numpy import NumpyQuantumHead
+    from embedding_cache import EmbeddingCache, CachedEmbedder
+
+    scaler = joblib.load(args.scaler)
+    head = NumpyQuantumHead.from_h5(args.weights, n_qubits=8, n_layers=12)
+    embedder = get_facenet_feature_extractor()
+
+    def faces(image):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "image.png")
+            cv2.imwrite(path, image)
+            try:
+                return extract_image_faces(path, max_faces=args.max_faces)
+            except Exception:
+                return []
+
+    def score(embeddings):
+        prob = float(np.mean(head.predict(scaler.transform(embeddings)).flatten()))
+        return prob, "fake" if prob > 0.5 else "real"
+
+    def embed_through(cached, crops):
+        """Embeddings of crops through the cache, one crop per call, and which of them were hits."""
+        embeddings, hits = [], []
+        for crop in crops:
+            before = cached.cache.metrics()["hits"]
+            embeddings.append(embed_faces([crop], cached)[0])
+            hits.append(cached.cache.metrics()["hits"] > before)
+        return np.stack(embeddings), np.array(hits)
+
+    originals, copies = [], []
+    for name in sorted(os.listdir(args.images)):
+        image = cv2.imread(os.path.join(args.images, name))
+        crops = faces(image) if image is not None else []
+        if not crops:
+            continue
+        originals.append(crops)
+        for variant, copy in _near_duplicates(image):
+            copy_crops = faces(copy)
+            if copy_crops:
+                copies.append((variant, copy_crops, embed_faces(copy_crops, embedder)))
+    crops_total = sum(len(crops) for _, crops, _ in copies)
+    print(f"{len(originals)} images with faces, {len(copies)} near-duplicate copies with {crops_total} faces")
+    if not copies:
+        return
+
+    for hash_name in args.hashes:
+        for distance in args.distances:
+            cached = CachedEmbedder(embedder, EmbeddingCache(capacity=args.capacity, max_distance=distance, hash=hash_name))
+            for crops in originals:
+                embed_faces(crops, cached)
+            hits, flips, prob_shift, similarity = 0, 0, [], []
+            for _, crops, reference in copies:
+                embeddings, hit = embed_through(cached, crops)
+                hits += int(hit.sum())
+                a, b = embeddings[hit], reference[hit]
+                similarity.extend(np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)))
+                (prob, label), (ref_prob, ref_label) = score(embeddings), score(reference)
+                flips += label != ref_label
+                prob_shift.append(abs(prob - ref_prob))
+
+            # False hits: distinct faces matching a cache that never saw them
+            held_out = CachedEmbedder(embedder, EmbeddingCache(capacity=args.capacity, max_distance=distance, hash=hash_name))
+            for crops in originals[::2]:
+                embed_faces(crops, held_out)
+            others = [crop for crops in originals[1::2] for crop in crops]
+            false_hits = int(embed_through(held_out, others)[1].sum()) if others else 0
+
+            print(
+                f"{hash_name} d<={distance:2d}  hits: {hits / crops_total:6.1%}  "
+                f"false hits: {false_hits}/{len(others)}  "
+                f"cosine of reused: {np.mean(similarity) if similarity else float('nan'):.3f}  "
+                f"label flips: {flips}/{len(copies)}  mean |dprob|: {np.mean(prob_shift):.4f}"
+            )
+
+
+def _percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q)) * 1000 if latencies else float("nan")
+
+
+def bench_serve_load(args):
+    """
+    Load test against a running server (uvicorn main:app): whether concurrent
+    /predict/image requests overlap (speedup of N concurrent over N sequential
+    requests, 1.0 = served one at a time), and /health latency idle vs while a
+    /predict video request is being analysed.
+    """
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    import requests
+
+    images = [os.path.join(args.images, name) for name in sorted(os.listdir(args.images))
+              if name.lower().endswith((".jpg", ".jpeg", ".png", ".bmp", ".webp"))]
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+    images = (images * args.concurrency)[:args.concurrency]
+
+    def post_image(path):
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            response = requests.post(f"{args.url}/predict/image", files={"file": (os.path.basename(path), f)}, timeout=600)
+        return time.perf_counter() - start, response.status_code
+
+    def ping_health(stop, latencies):
+        while not stop.is_set():
+            start = time.perf_counter()
+            requests.get(f"{args.url}/health", timeout=60)
+            latencies.append(time.perf_counter() - start)
+            stop.wait(args.health_interval_ms / 1000)
+
+    post_image(images[0])  # warm-up
+    sequential_wall = None
+    for concurrency in (1, args.concurrency):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(post_image, images))
+        wall = time.perf_counter() - start
+        sequential_wall = sequential_wall or wall
+        latencies = [latency for latency, _ in results]
+        statuses = sorted({status for _, status in results})
+        print(
+            f"images concurrency={concurrency:>2}  {len(images)} requests in {wall:6.2f} s  "
+            f"mean latency {np.mean(latencies) * 1000:8.1f} ms  speedup {sequential_wall / wall:5.2f}x  HTTP {statuses}"
+        )
+
+    for phase in ("idle", "video"):
+        latencies, stop = [], threading.Event()
+        pinger = threading.Thread(target=ping_health, args=(stop, latencies))
+        pinger.start()
+        if phase == "idle":
+            time.sleep(args.idle_seconds)
+            note = ""
+        else:
+            start = time.perf_counter()
+            with open(args.video, "rb") as f:
+                response = requests.post(
+                    f"{args.url}/predict", files={"file": (os.path.basename(args.video), f)}, timeout=3600
+                )
+            note = f"  (video request {time.perf_counter() - start:.2f} s, HTTP {response.status_code})"
+        stop.set()
+        pinger.join()
+        print(
+            f"/health {phase:>5}  {len(latencies):4d} pings  p50 {_percentile_ms(latencies, 50):7.2f} ms  "
+            f"p99 {_percentile_ms(latencies, 99):7.2f} ms  max {max(latencies) * 1000:7.2f} ms{note}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("quantum", help="quantum head latency and agreement")
+    p.add_argument("--weights", default=DEFAULT_WEIGHTS)
+    p.set_defaults(func=bench_quantum)
+
+    p = sub.add_parser("circuits", help="TFQ circuit preparation time (needs TFQ)")
+    p.add_argument("--weights", default=DEFAULT_WEIGHTS)
+    p.set_defaults(func=bench_circuits)
+
+    p = sub.add_parser("tfq-warm", help="model.predict vs warmed tf.function latency (needs TFQ)")
+    p.add_argument("--weights", default=DEFAULT_WEIGHTS)
+    p.set_defaults(func=bench_tfq_warm)
+
+    p = sub.add_parser("embed", help="per-face vs batched FaceNet embedding")
+    p.add_argument("--faces", type=int, default=20)
+    p.set_defaults(func=bench_embed)
+
+    p = sub.add_parser("preprocess", help="PIL vs cv2 face preprocessing")
+    p.add_argument("--faces", type=int, default=20)
+    p.set_defaults(func=bench_preprocess)
+
+    p = sub.add_parser("sampler", help="video frame sampling strategies on generated H.264 clips (needs PyAV)")
+    p.add_argument("--durations", type=int, nargs="+", default=[30, 300, 1800], help="clip lengths in seconds")
+    p.add_argument("--clip-dir", default=os.path.join(tempfile.gettempdir(), "entangl_clips"))
+    p.set_defaults(func=bench_sampler)
+
+    p = sub.add_parser("video-pipeline", help="sequential vs threaded decode/detect/embed on a 1080p clip")
+    p.add_argument("--video", help="local video (default: generated 10 s 1080p H.264 clip, needs PyAV)")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    p.add_argument("--max-faces", type=int, default=20)
+    p.add_argument("--clip-dir", default=os.path.join(tempfile.gettempdir(), "entangl_clips"))
+    p.set_defaults(func=bench_video_pipeline)
+
+    p = sub.add_parser("detect", help="Haar detection accuracy vs speed per working size")
+    p.add_argument("--images", required=True, help="directory of local images with faces")
+    p.add_argument("--labels", help='JSON {"image.jpg": [[x, y, w, h], ...]} (default: full-resolution detections)')
+    p.add_argument("--max-sides", type=int, nargs="+", default=[0, 320, 480, 640, 800, 960], help="0 = full resolution")
+    p.set_defaults(func=bench_detect)
+
+    p = sub.add_parser("detect-backends", help="latency per megapixel and recall of the face detector backends")
+    p.add_argument("--images", required=True)
+    p.add_argument("--labels", help="JSON {image name: [[x, y, w, h], ...]} in full-resolution pixels")
+    p.add_argument("--backends", nargs="+", default=["haar", "res10", "yunet"])
+    p.add_argument("--max-side", type=int, default=640)
+    p.add_argument("--iou", type=float, default=0.5, help="IoU for a detection to count as a reference face")
+    p.set_defaults(func=bench_detect_backends)
+
+    p = sub.add_parser("detect-pool", help="threaded detection throughput through the detector pool")
+    p.add_argument("--images", required=True)
+    p.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    p.add_argument("--repeat", type=int, default=10)
+    p.set_defaults(func=bench_detect_pool)
+
+    p = sub.add_parser("ranged-download", help="full vs tail-only ranged download from local servers (needs PyAV)")
+    p.add_argument("--seconds", type=int, default=300, help="generated clip length")
+    p.add_argument("--seconds-range", type=int, default=6)
+    p.add_argument("--clip-dir", default=os.path.join(tempfile.gettempdir(), "entangl_clips"))
+    p.set_defaults(func=bench_ranged_download)
+
+    p = sub.add_parser("early-exit", help="full-budget vs early-exit video scoring")
+    p.add_argument("--videos", required=True, help="directory of local videos")
+    p.add_argument("--max-faces", type=int, default=20)
+    p.add_argument("--delta", type=float, default=0.05)
+    p.add_argument("--scaler", default=os.path.join(BASE_DIR, "scaler.joblib"))
+    p.add_argument("--weights", default=DEFAULT_WEIGHTS)
+    p.set_defaults(func=bench_early_exit)
+
+    p = sub.add_parser("embedding-cache", help="perceptual-hash embedding cache hits and label changes on near-duplicate images")
+    p.add_argument("--images", required=True, help="directory of local images with faces")
+    p.add_argument("--distances", type=int, nargs="+", default=[0, 2, 4, 6, 8, 10], help="max Hamming distances in bits")
+    p.add_argument("--hashes", nargs="+", default=["dhash", "phash"])
+    p.add_argument("--capacity", type=int, default=8192)
+    p.add_argument("--max-faces", type=int, default=5)
+    p.add_argument("--scaler", default=os.path.join(BASE_DIR, "scaler.joblib"))
+    p.add_argument("--weights", default=DEFAULT_WEIGHTS)
+    p.set_defaults(func=bench_embedding_cache)
+
+    p = sub.add_parser("serve-load", help="concurrent image requests and /health latency against a running server")
+    p.add_argument("--url", default="http://127.0.0.1:8000")
+    p.add_argument("--images", required=True, help="directory of local images with faces")
+    p.add_argument("--video", required=True, help="local video posted to /predict during the /health probe")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--health-interval-ms", type=float, default=50)
+    p.add_argument("--idle-seconds", type=float, default=2)
+    p.set_defaults(func=bench_serve_load)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
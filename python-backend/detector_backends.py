@@ -0,0 +1,189 @@
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+# Detection runs on a copy whose longer side is at most DETECT_MAX_SIDE pixels
+# (0 = full resolution); boxes are mapped back
+DETECT_MAX_SIDE = 640
+# Training window of haarcascade_frontalface_default
+HAAR_WINDOW = 24
+
+HAAR_CASCADE_PATH = os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+
+# Locally stored DNN models (not downloaded at runtime):
+#   res10: deploy.prototxt + res10_300x300_ssd_iter_140000.caffemodel from the OpenCV face detector sample
+#   yunet: face_detection_yunet_2023mar.onnx from opencv_zoo
+DETECTOR_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+DETECTOR_BACKENDS = ("haar", "res10", "yunet")
+
+
+def adaptive_scale_factor(side, min_size, base=1.05, max_levels=72):
+    """Pyramid step for detectMultiScale: base, coarsened so large inputs never exceed max_levels levels."""
+    return max(base, (side / min_size) ** (1.0 / max_levels))
+
+
+class FaceDetector:
+    """
+    Shared interface of the face detection backends: detect(image) takes a
+    BGR image and returns [(x, y, w, h), ...] in its coordinates. The image
+    is downscaled so its longer side is at most max_side, but never so far
+    that a min_size face drops below the backend's min_window. Subclasses
+    implement _detect on the working image (and optionally _prepare, run
+    before downscaling).
+
+    Backends hold OpenCV objects that are not safe for concurrent use, so a
+    detector belongs to one thread at a time (see detector_pool.DetectorPool).
+    """
+
+    name = "base"
+    # Smallest face (px at working resolution) the backend finds reliably
+    min_window = 1
+
+    def __init__(self):
+        self.calls = 0
+        self.faces = 0
+        self.busy_s = 0.0
+
+    def _prepare(self, image):
+        """Conversion applied at full resolution, before downscaling."""
+        return image
+
+    def _detect(self, image, min_size):
+        """Boxes [(x, y, w, h), ...] in image coordinates, faces at least min_size pixels."""
+        raise NotImplementedError
+
+    def detect(self, image, min_size=80, max_side=DETECT_MAX_SIDE):
+        start = time.perf_counter()
+        image = self._prepare(image)
+        h, w = image.shape[:2]
+        scale = 1.0
+        if max_side and max(h, w) > max_side:
+            scale = min(1.0, max(max_side / max(h, w), self.min_window / min_size))
+        if scale < 1.0:
+            image = cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+
+        working_min = max(self.min_window, int(round(min_size * scale)))
+        faces = np.asarray(self._detect(image, working_min), dtype=np.float64).reshape(-1, 4)
+        faces = faces[np.minimum(faces[:, 2], faces[:, 3]) >= working_min]
+
+        faces = np.round(faces / scale).astype(int)
+        # Clip to the image (DNN boxes can start before 0 or end past the edge), keeping the far corner
+        x2 = np.minimum(faces[:, 0] + faces[:, 2], w)
+        y2 = np.minimum(faces[:, 1] + faces[:, 3], h)
+        faces[:, 0] = np.maximum(faces[:, 0], 0)
+        faces[:, 1] = np.maximum(faces[:, 1], 0)
+        faces[:, 2] = x2 - faces[:, 0]
+        faces[:, 3] = y2 - faces[:, 1]
+        faces = faces[(faces[:, 2] > 0) & (faces[:, 3] > 0)]
+
+        self.busy_s += time.perf_counter() - start
+        self.calls += 1
+        self.faces += len(faces)
+        return [tuple(int(v) for v in face) for face in faces]
+
+    def metrics(self):
+        return {
+            "backend": self.name,
+            "calls": self.calls,
+            "faces": self.faces,
+            "avg_ms": round(self.busy_s * 1000 / max(self.calls, 1), 3),
+            "calls_per_s": round(self.calls / self.busy_s, 2) if self.busy_s else 0.0,
+        }
+
+
+class HaarDetector(FaceDetector):
+    """Haar cascade with CLAHE + 3x3 blur to compensate for its sensitivity to lighting."""
+
+    name = "haar"
+    min_window = HAAR_WINDOW
+
+    def __init__(self, cascade_path=HAAR_CASCADE_PATH, min_neighbors=7, clip_limit=2.5, tile_grid_size=(8, 8)):
+        super().__init__()
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise ValueError(f"Could not load Haar cascade from {cascade_path}")
+        self.clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+        self.min_neighbors = min_neighbors
+
+    def _prepare(self, image):
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+    def _detect(self, gray, min_size):
+        gray = self.clahe.apply(gray)
+        gray = cv2.GaussianBlur(gray, (3, 3), 0)
+        return self.cascade.detectMultiScale(
+            gray,
+            scaleFactor=adaptive_scale_factor(max(gray.shape[:2]), min_size),
+            minNeighbors=self.min_neighbors,
+            minSize=(min_size, min_size),
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+
+
+class Res10SSDDetector(FaceDetector):
+    """OpenCV's ResNet-10 SSD face detector (Caffe, 300x300 input) on cv2.dnn, CPU."""
+
+    name = "res10"
+    min_window = 16
+
+    def __init__(self, model_path=None, config_path=None, score_threshold=0.6):
+        super().__init__()
+        model_path = model_path or os.path.join(DETECTOR_MODEL_DIR, "res10_300x300_ssd_iter_140000.caffemodel")
+        config_path = config_path or os.path.join(DETECTOR_MODEL_DIR, "deploy.prototxt")
+        for path in (model_path, config_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"res10 face detector file not found: {path}")
+        self.net = cv2.dnn.readNetFromCaffe(config_path, model_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.score_threshold = score_threshold
+
+    def _detect(self, image, min_size):
+        h, w = image.shape[:2]
+        self.net.setInput(cv2.dnn.blobFromImage(image, 1.0, (300, 300), (104.0, 177.0, 123.0)))
+        # (1, 1, N, 7): image id, label, score, x1, y1, x2, y2 (normalized)
+        detections = self.net.forward().reshape(-1, 7)
+        detections = detections[detections[:, 2] >= self.score_threshold]
+        x1, y1 = detections[:, 3] * w, detections[:, 4] * h
+        x2, y2 = detections[:, 5] * w, detections[:, 6] * h
+        return np.stack([x1, y1, x2 - x1, y2 - y1], axis=1)
+
+
+class YuNetDetector(FaceDetector):
+    """YuNet (cv2.FaceDetectorYN, ONNX) on cv2.dnn, CPU; input size follows the working image."""
+
+    name = "yunet"
+    min_window = 16
+
+    def __init__(self, model_path=None, score_threshold=0.8, nms_threshold=0.3, top_k=50):
+        super().__init__()
+        model_path = model_path or os.path.join(DETECTOR_MODEL_DIR, "face_detection_yunet_2023mar.onnx")
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"YuNet face detector model not found: {model_path}")
+        if not hasattr(cv2, "FaceDetectorYN"):
+            raise ValueError(f"OpenCV {cv2.__version__} has no FaceDetectorYN (needs 4.5.4+)")
+        self.model = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold, nms_threshold, top_k)
+
+    def _detect(self, image, min_size):
+        h, w = image.shape[:2]
+        self.model.setInputSize((w, h))
+        # (N, 15): x, y, w, h, five landmarks, score
+        _, faces = self.model.detect(image)
+        return [] if faces is None else faces[:, :4]
+
+
+def create_detector(backend="haar", model_path=None, config_path=None):
+    """Build a detector for one of DETECTOR_BACKENDS (model files default to DETECTOR_MODEL_DIR)."""
+    if backend == "haar":
+        return HaarDetector(cascade_path=model_path or HAAR_CASCADE_PATH)
+    if backend == "res10":
+        return Res10SSDDetector(model_path=model_path, config_path=config_path)
+    if backend == "yunet":
+        return YuNetDetector(model_path=model_path)
+    raise ValueError(f"Unknown face detector backend {backend!r}, expected one of {DETECTOR_BACKENDS}")
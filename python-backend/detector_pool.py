@@ -0,0 +1,89 @@
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from detector_backends import HaarDetector
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+
+class DetectorPool:
+    """
+    Pool of face detectors (detector_backends.FaceDetector) checked out with a context manager:
+
+        with pool.checkout() as detector:
+            faces = detector.detect(image, max_side=640)
+
+    Detectors are created on demand up to max_size; further checkouts wait
+    for one to be returned.
+    """
+
+    def __init__(self, max_size=None, factory=HaarDetector):
+        self.max_size = max_size or os.cpu_count() or 1
+        self.factory = factory
+        self._free = queue.LifoQueue()
+        self._detectors = []
+        self._lock = threading.Lock()
+        self._checkouts = 0
+        self._wait_s = 0.0
+
+    def configure(self, factory=None, max_size=None):
+        """
+        Switch the detector factory (e.g. another backend) and/or how many
+        detectors may be created. Detectors from the old factory are dropped,
+        including checked-out ones when they come back; meant for startup.
+        """
+        with self._lock:
+            if factory is not None:
+                self.factory = factory
+                self._detectors = []
+                self._free = queue.LifoQueue()
+            if max_size is not None:
+                self.max_size = max(1, max_size)
+
+    def _acquire(self, timeout):
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._detectors) < self.max_size:
+                detector = self.factory()
+                self._detectors.append(detector)
+                logger.info(f"Created face detector {len(self._detectors)}/{self.max_size}")
+                return detector
+        return self._free.get(timeout=timeout)
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        start = time.perf_counter()
+        detector = self._acquire(timeout)
+        with self._lock:
+            self._checkouts += 1
+            self._wait_s += time.perf_counter() - start
+        try:
+            yield detector
+        finally:
+            with self._lock:
+                current = detector in self._detectors
+            if current:
+                self._free.put(detector)
+
+    def metrics(self):
+        with self._lock:
+            detectors = list(self._detectors)
+            checkouts, wait_s = self._checkouts, self._wait_s
+        available = self._free.qsize()
+        return {
+            "max_size": self.max_size,
+            "created": len(detectors),
+            "in_use": len(detectors) - available,
+            "available": available,
+            "checkouts": checkouts,
+            "avg_wait_ms": round(wait_s * 1000 / max(checkouts, 1), 3),
+            "detectors": [detector.metrics() for detector in detectors],
+        }
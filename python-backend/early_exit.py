@@ -0,0 +1,69 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+# off: score the full face budget; hoeffding: distribution-free bound on probabilities
+# in [0, 1]; normal: CLT bound using the sample standard deviation
+EARLY_EXIT_METHODS = ("off", "hoeffding", "normal")
+
+
+class SequentialScorer:
+    """
+    Running mean of per-face fake probabilities with a stopping rule for the
+    real/fake decision the full budget of max_faces faces would reach.
+
+    After n faces with probability sum S, the full-budget mean is
+    (S + (N - n) * m_rest) / N, so the label can only flip if the mean of the
+    faces not seen yet, m_rest, crosses t = (N * threshold - S) / (N - n).
+    Scoring stops when t is outside [0, 1) (no remaining faces can flip the
+    label) or, once min_faces are scored and treating faces as i.i.d., when
+    |t - mean| exceeds the level-delta radius for the difference of the two means:
+
+        hoeffding: sqrt(ln(2 / delta) / 2 * (1/n + 1/(N - n)))
+        normal:    z(1 - delta/2) * s * sqrt(1/n + 1/(N - n))
+    """
+
+    def __init__(self, max_faces, method="normal", delta=0.05, min_faces=4, threshold=0.5):
+        if method not in EARLY_EXIT_METHODS:
+            raise ValueError(f"Unknown early exit method {method!r}, expected one of {EARLY_EXIT_METHODS}")
+        self.max_faces = max_faces
+        self.method = method
+        self.delta = delta
+        self.min_faces = min_faces
+        self.threshold = threshold
+        self.n = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def add(self, probs):
+        probs = np.asarray(probs, dtype=np.float64).ravel()
+        self.n += len(probs)
+        self.total += float(probs.sum())
+        self.total_sq += float(np.square(probs).sum())
+
+    @property
+    def mean(self):
+        return self.total / self.n if self.n else 0.0
+
+    def radius(self):
+        """Confidence radius for m_rest - mean at the current n."""
+        spread = 1.0 / self.n + 1.0 / (self.max_faces - self.n)
+        if self.method == "hoeffding":
+            return math.sqrt(math.log(2.0 / self.delta) / 2.0 * spread)
+        variance = max(self.total_sq / self.n - self.mean ** 2, 0.0) * self.n / max(self.n - 1, 1)
+        return NormalDist().inv_cdf(1.0 - self.delta / 2.0) * math.sqrt(variance * spread)
+
+    def decided(self):
+        """True once more faces are unlikely (or unable) to change the label."""
+        if self.method == "off" or self.n == 0:
+            return self.n >= self.max_faces
+        if self.n >= self.max_faces:
+            return True
+
+        flip_at = (self.max_faces * self.threshold - self.total) / (self.max_faces - self.n)
+        if flip_at < 0.0 or flip_at >= 1.0:
+            return True
+        if self.n < self.min_faces:
+            return False
+        return abs(flip_at - self.mean) > self.radius()
@@ -0,0 +1,201 @@
+import copy
+import logging
+import os
+
+import numpy as np
+import torch
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+# fp32: eager model as loaded; channels_last: NHWC layout; int8_dynamic: quantized
+# Linear layers; int8_static: FX-quantized convs + Linear (needs calibration data)
+EMBEDDER_MODES = ("fp32", "channels_last", "int8_dynamic", "int8_static")
+EMBEDDER_EXPORTS = ("none", "torchscript", "compile")
+
+
+class ChannelsLast(torch.nn.Module):
+    """Runs the wrapped model on channels-last inputs."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = copy.deepcopy(model).to(memory_format=torch.channels_last)
+
+    def forward(self, x):
+        return self.model(x.contiguous(memory_format=torch.channels_last))
+
+
+def quantize_dynamic_int8(model):
+    """int8 weights for the Linear layers, activations quantized on the fly."""
+    return torch.ao.quantization.quantize_dynamic(copy.deepcopy(model).eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static_int8(model, calibration_batches):
+    """FX graph-mode static int8 quantization calibrated on (N,3,160,160) face batches."""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    if not calibration_batches:
+        raise ValueError("int8_static needs calibration batches (see `python embedder_opt.py --help`)")
+
+    prepared = prepare_fx(
+        copy.deepcopy(model).eval(),
+        get_default_qconfig_mapping("x86"),
+        example_inputs=(calibration_batches[0],)
+    )
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def cache_path_for(cache_dir, mode):
+    return os.path.join(cache_dir, f"facenet_{mode}_torch{torch.__version__.split('+')[0]}.pt")
+
+
+def build_optimized_embedder(model, mode="fp32", export="none", cache_dir=None, calibration_batches=None):
+    """
+    Return a CPU-optimized version of the FaceNet embedder.
+
+    With export="torchscript" and a cache_dir, the frozen TorchScript module
+    is saved to disk and reloaded on later starts (so int8_static only needs
+    calibration once). export="compile" wraps the model in torch.compile.
+    """
+    if mode not in EMBEDDER_MODES:
+        raise ValueError(f"Unknown embedder mode {mode!r}, expected one of {EMBEDDER_MODES}")
+    if export not in EMBEDDER_EXPORTS:
+        raise ValueError(f"Unknown embedder export {export!r}, expected one of {EMBEDDER_EXPORTS}")
+
+    cache_path = cache_path_for(cache_dir, mode) if cache_dir and export == "torchscript" else None
+    if cache_path and os.path.exists(cache_path):
+        logger.info(f"Loading cached TorchScript embedder from {cache_path}")
+        return torch.jit.load(cache_path, map_location="cpu").eval()
+
+    model = model.eval()
+    if mode == "channels_last":
+        optimized = ChannelsLast(model)
+    elif mode == "int8_dynamic":
+        optimized = quantize_dynamic_int8(model)
+    elif mode == "int8_static":
+        optimized = quantize_static_int8(model, calibration_batches)
+    else:
+        optimized = model
+
+    if export == "torchscript":
+        example = calibration_batches[0] if calibration_batches else torch.randn(2, 3, 160, 160)
+        with torch.no_grad():
+            optimized = torch.jit.freeze(torch.jit.trace(optimized.eval(), example))
+        if cache_path:
+            os.makedirs(cache_dir, exist_ok=True)
+            torch.jit.save(optimized, cache_path)
+            logger.info(f"Saved TorchScript embedder to {cache_path}")
+    elif export == "compile":
+        optimized = torch.compile(optimized)
+
+    logger.info(f"Built embedder - mode: {mode}, export: {export}")
+    return optimized
+
+
+def embedding_drift(reference, optimized, batches):
+    """Cosine similarity between fp32 and optimized embeddings over batches."""
+    ref_feats, opt_feats = [], []
+    with torch.no_grad():
+        for batch in batches:
+            ref_feats.append(reference(batch))
+            opt_feats.append(optimized(batch))
+    cos = torch.nn.functional.cosine_similarity(torch.cat(ref_feats), torch.cat(opt_feats)).numpy()
+    return {
+        "faces": int(len(cos)),
+        "mean_cosine": float(np.mean(cos)),
+        "min_cosine": float(np.min(cos)),
+    }, torch.cat(ref_feats).numpy(), torch.cat(opt_feats).numpy()
+
+
+def probability_drift(ref_feats, opt_feats, scaler, quantum_head):
+    """End-to-end change of the per-face deepfake probability and label."""
+    ref_probs = quantum_head.predict(scaler.transform(ref_feats)).ravel()
+    opt_probs = quantum_head.predict(scaler.transform(opt_feats)).ravel()
+    diff = np.abs(ref_probs - opt_probs)
+    return {
+        "mean_abs_prob_change": float(np.mean(diff)),
+        "max_abs_prob_change": float(np.max(diff)),
+        "label_flips": int(np.sum((ref_probs > 0.5) != (opt_probs > 0.5))),
+    }
+
+
+def load_face_batches(samples_dir, batch_size=16, max_faces=256):
+    """
+    Detect faces in the images of samples_dir and preprocess them exactly like
+    serving (augment_face + facenet_preprocess_batch) into (N,3,160,160) batches.
+    """
+    import cv2
+    from predictimg import detect_faces_in_image, augment_face, facenet_preprocess_batch
+
+    faces = []
+    for name in sorted(os.listdir(samples_dir)):
+        image = cv2.imread(os.path.join(samples_dir, name))
+        if image is None:
+            continue
+        for (x, y, w, h) in detect_faces_in_image(image):
+            crop = image[y:y+h, x:x+w]
+            if crop.size:
+                faces.append(augment_face(crop))
+            if len(faces) >= max_faces:
+                break
+        if len(faces) >= max_faces:
+            break
+
+    if not faces:
+        raise ValueError(f"No faces found in {samples_dir}")
+    stacked = facenet_preprocess_batch(faces)
+    return [stacked[i:i + batch_size] for i in range(0, len(stacked), batch_size)]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    import joblib
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Calibrate/export an optimized FaceNet embedder and report its drift")
+    parser.add_argument("--samples-dir", required=True, help="local images with faces used for calibration")
+    parser.add_argument("--val-dir", help="local images with faces used for the drift report (default: samples-dir)")
+    parser.add_argument("--mode", choices=EMBEDDER_MODES, default="int8_static")
+    parser.add_argument("--export", choices=EMBEDDER_EXPORTS, default="torchscript")
+    parser.add_argument("--cache-dir", default=os.path.join(base_dir, "embedder_cache"))
+    parser.add_argument("--scaler", default=os.path.join(base_dir, "scaler.joblib"))
+    parser.add_argument("--weights", default=os.path.join(base_dir, "tfq_face_layers_weights.h5"))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from predictimg import get_facenet_feature_extractor
+    from quantum_numpy import NumpyQuantumHead
+
+    reference = get_facenet_feature_extractor()
+    calibration = load_face_batches(args.samples_dir)
+    validation = load_face_batches(args.val_dir) if args.val_dir else calibration
+
+    cache_path = cache_path_for(args.cache_dir, args.mode)
+    if args.export == "torchscript" and os.path.exists(cache_path):
+        os.remove(cache_path)  # recalibrate
+    optimized = build_optimized_embedder(reference, args.mode, args.export, args.cache_dir, calibration)
+
+    report, ref_feats, opt_feats = embedding_drift(reference, optimized, validation)
+    report.update(probability_drift(
+        ref_feats,
+        opt_feats,
+        joblib.load(args.scaler),
+        NumpyQuantumHead.from_h5(args.weights, n_qubits=8, n_layers=12)
+    ))
+
+    with torch.no_grad():
+        for name, model in (("fp32", reference), (args.mode, optimized)):
+            model(validation[0])
+            start = time.perf_counter()
+            for batch in validation:
+                model(batch)
+            report[f"{name}_ms_per_face"] = (time.perf_counter() - start) * 1000 / report["faces"]
+
+    for key, value in report.items():
+        print(f"{key}: {value}")
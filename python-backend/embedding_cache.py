@@ -0,0 +1,163 @@
+import logging
+import threading
+
+import cv2
+import numpy as np
+import torch
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_HASHES = ("dhash", "phash")
+
+# Set bits per byte value, for Hamming distances between 64-bit hashes
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _gray(face_t):
+    """(N,160,160) float32 luminance of a FaceNet input batch (N,3,160,160) in [-1, 1]."""
+    return face_t.detach().cpu().numpy().mean(axis=1, dtype=np.float32)
+
+
+def _pack(bits):
+    """(N,64) booleans -> (N,) uint64 hashes."""
+    return np.packbits(bits.reshape(len(bits), 64), axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def dhash(face_t):
+    """Difference hash per crop: signs of horizontal gradients on a 9x8 area-downscaled image."""
+    small = np.stack([cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA) for gray in _gray(face_t)])
+    return _pack(small[:, :, 1:] > small[:, :, :-1])
+
+
+def phash(face_t):
+    """Perceptual hash per crop: 8x8 lowest DCT frequencies of a 32x32 downscale against their median."""
+    low = np.stack([
+        cv2.dct(cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA))[:8, :8] for gray in _gray(face_t)
+    ]).reshape(-1, 64)
+    # The DC term only tracks overall brightness; leave it out of the median
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    return _pack(low > median)
+
+
+def hamming(a, b):
+    """Pairwise Hamming distances between uint64 hash arrays a (M,) and b (N,) -> (M,N)."""
+    xor = np.bitwise_xor(a[:, None], b[None, :])
+    if hasattr(np, "bitwise_count"):
+        # NumPy >= 2.0: hardware popcount
+        return np.bitwise_count(xor)
+    return _POPCOUNT[xor.view(np.uint8)].reshape(len(a), len(b), 8).sum(axis=2, dtype=np.int32)
+
+
+class EmbeddingCache:
+    """
+    Bounded cache of FaceNet embeddings keyed by a 64-bit perceptual hash of
+    the normalized 160x160 crop, so re-encoded, rescaled or slightly
+    re-cropped copies of a face reuse the embedding computed for the first.
+
+    Embeddings are stored as float16 in one preallocated (capacity, dim)
+    array (1 KB per 512-D entry); the least recently used entry is replaced
+    when it is full. A crop hits an entry whose hash is at most max_distance
+    bits away (0 = identical hash only; near matches scan all entries).
+    """
+
+    def __init__(self, capacity=8192, max_distance=0, hash="dhash", dim=512):
+        if hash not in EMBEDDING_CACHE_HASHES:
+            raise ValueError(f"Unknown embedding cache hash {hash!r}, expected one of {EMBEDDING_CACHE_HASHES}")
+        if not 0 <= max_distance <= 64:
+            raise ValueError(f"max_distance must be between 0 and 64 bits, got {max_distance}")
+        self.capacity = capacity
+        self.max_distance = max_distance
+        self.hash_name = hash
+        self._hash = dhash if hash == "dhash" else phash
+        self._hashes = np.zeros(capacity, dtype=np.uint64)
+        self._embeddings = np.zeros((capacity, dim), dtype=np.float16)
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._slots = {}
+        self._size = 0
+        self._clock = 0
+        self._lock = threading.Lock()
+        self._counters = {"lookups": 0, "hits": 0, "near_hits": 0, "evictions": 0}
+
+    def hash(self, face_t):
+        return self._hash(face_t)
+
+    def lookup(self, hashes):
+        """
+        (N,dim) float32 embeddings for the hashes and an (N,) hit mask; rows
+        of misses are zero.
+        """
+        found = np.zeros((len(hashes), self._embeddings.shape[1]), dtype=np.float32)
+        with self._lock:
+            self._clock += 1
+            slots = np.array([self._slots.get(int(h), -1) for h in hashes], dtype=np.int64)
+            if self.max_distance > 0 and self._size and (slots < 0).any():
+                pending = np.flatnonzero(slots < 0)
+                distances = hamming(hashes[pending], self._hashes[:self._size])
+                nearest = distances.argmin(axis=1)
+                close = distances[np.arange(len(pending)), nearest] <= self.max_distance
+                slots[pending[close]] = nearest[close]
+                self._counters["near_hits"] += int(close.sum())
+            hit = slots >= 0
+            if hit.any():
+                found[hit] = self._embeddings[slots[hit]]
+                self._last_used[slots[hit]] = self._clock
+            self._counters["lookups"] += len(hashes)
+            self._counters["hits"] += int(hit.sum())
+        return found, hit
+
+    def insert(self, hashes, embeddings):
+        with self._lock:
+            self._clock += 1
+            for h, embedding in zip(hashes, embeddings):
+                h = int(h)
+                slot = self._slots.get(h)
+                if slot is None:
+                    if self._size < self.capacity:
+                        slot = self._size
+                        self._size += 1
+                    else:
+                        slot = int(self._last_used.argmin())
+                        del self._slots[int(self._hashes[slot])]
+                        self._counters["evictions"] += 1
+                    self._slots[h] = slot
+                    self._hashes[slot] = h
+                self._embeddings[slot] = embedding
+                self._last_used[slot] = self._clock
+
+    def metrics(self):
+        with self._lock:
+            counters = dict(self._counters)
+            size = self._size
+        return {
+            **counters,
+            "hit_ratio": round(counters["hits"] / counters["lookups"], 4) if counters["lookups"] else None,
+            "size": size,
+            "capacity": self.capacity,
+            "hash": self.hash_name,
+            "max_distance": self.max_distance
+        }
+
+
+class CachedEmbedder:
+    """
+    Drop-in for the FaceNet module (also in front of a BatchedEmbedder):
+    embedder(face_t) runs the wrapped embedder only on the crops the cache
+    misses, and skips the forward pass entirely when every crop hits.
+    """
+
+    def __init__(self, embedder, cache):
+        self.embedder = embedder
+        self.cache = cache
+
+    def __call__(self, face_t):
+        hashes = self.cache.hash(face_t)
+        embeddings, hit = self.cache.lookup(hashes)
+        if not hit.all():
+            miss = np.flatnonzero(~hit)
+            with torch.no_grad():
+                computed = self.embedder(face_t[torch.from_numpy(miss).to(face_t.device)])
+            computed = computed.detach().cpu().float().numpy()
+            self.cache.insert(hashes[miss], computed)
+            embeddings[miss] = computed
+        return torch.from_numpy(embeddings)
@@ -0,0 +1,79 @@
+import logging
+
+import cv2
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+# Templates are matched at most this many pixels wide/high
+TRACK_TEMPLATE_SIZE = 64
+
+
+class FaceTracker:
+    """
+    Detect once, then follow the face through later sampled frames.
+
+    Wraps a per-frame detector returning [(x, y, w, h), ...] (best face
+    first). After a detection, the face is located in the next frames by
+    normalized template matching over a search region around its last box.
+    Full detection runs again every redetect_every frames, when matching
+    confidence drops below min_score, or when nothing is being tracked.
+    """
+
+    def __init__(self, detect_fn, redetect_every=5, min_score=0.6, search_margin=0.5):
+        self.detect_fn = detect_fn
+        self.redetect_every = redetect_every
+        self.min_score = min_score
+        self.search_margin = search_margin
+        self.template = None
+        self.box = None
+        self.since_detect = 0
+        self.stats = {"detections_run": 0, "frames_tracked": 0, "track_lost": 0}
+
+    def __call__(self, frame):
+        if self.box is not None and self.since_detect < self.redetect_every:
+            box = self._track(frame)
+            if box is not None:
+                self.box = box
+                self.since_detect += 1
+                self.stats["frames_tracked"] += 1
+                return [box]
+            self.stats["track_lost"] += 1
+
+        faces = self.detect_fn(frame)
+        self.stats["detections_run"] += 1
+        self.since_detect = 0
+        if faces:
+            self._set_template(frame, faces[0])
+        else:
+            self.box, self.template = None, None
+        return faces
+
+    def _gray(self, image):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if self.scale < 1.0:
+            gray = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return gray
+
+    def _set_template(self, frame, box):
+        x, y, w, h = (int(v) for v in box)
+        self.box = (x, y, w, h)
+        self.scale = min(1.0, TRACK_TEMPLATE_SIZE / max(w, h))
+        self.template = self._gray(frame[y:y+h, x:x+w])
+
+    def _track(self, frame):
+        """New box for the tracked face, or None when the match is not confident."""
+        x, y, w, h = self.box
+        margin_x, margin_y = int(w * self.search_margin), int(h * self.search_margin)
+        x0, y0 = max(0, x - margin_x), max(0, y - margin_y)
+        x1, y1 = min(frame.shape[1], x + w + margin_x), min(frame.shape[0], y + h + margin_y)
+        region = self._gray(frame[y0:y1, x0:x1])
+        if region.shape[0] < self.template.shape[0] or region.shape[1] < self.template.shape[1]:
+            return None
+
+        scores = cv2.matchTemplate(region, self.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (dx, dy) = cv2.minMaxLoc(scores)
+        if score < self.min_score:
+            logger.debug(f"Track lost (score {score:.2f}) - re-detecting")
+            return None
+        return (x0 + int(round(dx / self.scale)), y0 + int(round(dy / self.scale)), w, h)
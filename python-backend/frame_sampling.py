@@ -0,0 +1,179 @@
+import logging
+
+import cv2
+import numpy as np
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+# Optional PyAV for keyframe-only decoding of long inputs
+try:
+    import av
+    PYAV_AVAILABLE = True
+except ImportError:
+    av = None
+    PYAV_AVAILABLE = False
+
+# seek: cap.set per sampled frame (original loop); grab: seek once, grab() through
+# the range and retrieve() only sampled frames; keyframes: PyAV, decode keyframes only
+FRAME_SAMPLERS = ("seek", "grab", "keyframes")
+
+# Gaps longer than this are crossed with a seek instead of grab() calls; a seek
+# decodes on average half a GOP (x264's default keyint is 250)
+MAX_GRAB_GAP = 120
+
+# Near-duplicate gate: frames are compared as DEDUP_THUMB_SIZE x DEDUP_THUMB_SIZE
+# grayscale thumbnails (area averaging also smooths out sensor/compression noise)
+DEDUP_THUMB_SIZE = 32
+
+
+def frame_thumbnail(frame):
+    """Grayscale DEDUP_THUMB_SIZE thumbnail; large frames are strided first (~8 samples per thumbnail pixel per axis)."""
+    stride = max(1, min(frame.shape[:2]) // (DEDUP_THUMB_SIZE * 8))
+    thumb = cv2.resize(frame[::stride, ::stride], (DEDUP_THUMB_SIZE, DEDUP_THUMB_SIZE), interpolation=cv2.INTER_AREA)
+    if thumb.ndim == 3:
+        thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+    return thumb.astype(np.float32)
+
+
+def thumbnail_difference(a, b):
+    """Mean absolute difference of two frame thumbnails, 0-255 scale."""
+    return float(np.abs(a - b).mean())
+
+
+def seek_frames(cap, start_frame, end_frame, step):
+    """
+    One cap.set(CAP_PROP_POS_FRAMES) per sampled frame. Most codecs seek back
+    to the previous keyframe and decode forward on every call.
+    """
+    for frame_no in range(start_frame, end_frame, step):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_no)
+        ret, frame = cap.read()
+        if ret:
+            yield frame_no, frame
+
+
+def grab_frames(cap, start_frame, end_frame, step, max_gap=MAX_GRAB_GAP):
+    """
+    Seek once to start_frame, then grab() every frame and retrieve() (colour
+    conversion + copy) only the sampled ones. When step exceeds max_gap the
+    reader re-seeks to the next sample instead of grabbing through the gap.
+    """
+    position = None
+    for frame_no in range(start_frame, end_frame, step):
+        if position is None or frame_no - position > max_gap:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_no)
+            position = frame_no
+        while position < frame_no:
+            if not cap.grab():
+                return
+            position += 1
+        if not cap.grab():
+            return
+        position += 1
+        ret, frame = cap.retrieve()
+        if ret:
+            yield frame_no, frame
+
+
+def keyframe_frames(video_path, start_frame, end_frame, step, fps):
+    """
+    Decode keyframes only (PyAV, skip_frame="NONKEY") and yield the first
+    keyframe at or after each sampled position. Frame numbers are derived
+    from presentation timestamps, relative to the stream's start_time (which
+    is not 0 in e.g. MPEG-TS or trimmed MP4s).
+    """
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        stream.codec_context.skip_frame = "NONKEY"
+        stream.thread_type = "AUTO"
+        start_pts = stream.start_time or 0
+        if start_frame > 0:
+            container.seek(start_pts + int(start_frame / fps / stream.time_base), stream=stream)
+
+        next_frame = start_frame
+        for frame in container.decode(stream):
+            if frame.pts is None:
+                continue
+            frame_no = int(round((frame.pts - start_pts) * stream.time_base * fps))
+            if frame_no >= end_frame:
+                break
+            if frame_no < next_frame:
+                continue
+            yield frame_no, frame.to_ndarray(format="bgr24")
+            next_frame = frame_no + step
+
+
+def _keyframes_or_grab(video_path, cap, start_frame, end_frame, step, fps):
+    """Keyframe sampling, falling back to grab when the range holds no keyframe (short tails)."""
+    found = False
+    for item in keyframe_frames(video_path, start_frame, end_frame, step, fps):
+        found = True
+        yield item
+    if not found:
+        logger.info(f"No keyframe in frames {start_frame}-{end_frame} - falling back to grab")
+        yield from grab_frames(cap, start_frame, end_frame, step)
+
+
+def iter_sampled_frames(video_path, cap, start_frame, end_frame, step, sampler="grab"):
+    """
+    Yield (frame_no, BGR frame) for frames start_frame, start_frame + step, ...
+    below end_frame using the given sampler. "keyframes" falls back to "grab"
+    when PyAV is not installed or no keyframe falls inside the range.
+    """
+    if sampler not in FRAME_SAMPLERS:
+        raise ValueError(f"Unknown frame sampler {sampler!r}, expected one of {FRAME_SAMPLERS}")
+
+    if sampler == "keyframes":
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        if PYAV_AVAILABLE and fps > 0:
+            return _keyframes_or_grab(video_path, cap, start_frame, end_frame, step, fps)
+        logger.warning("PyAV not installed - keyframe sampling falls back to grab")
+        sampler = "grab"
+
+    if sampler == "seek":
+        return seek_frames(cap, start_frame, end_frame, step)
+    return grab_frames(cap, start_frame, end_frame, step)
+
+
+def skip_near_duplicates(frames, threshold, stats=None):
+    """
+    Drop frames too similar to the last accepted one before detection.
+
+    Similarity is the mean absolute difference of grayscale thumbnails on a
+    0-255 scale; frames below threshold are skipped (0 disables the gate).
+    Comparing against the last accepted frame (not the previous one) lets
+    slow drift through once it adds up. If a stats dict is given,
+    frames_gated and frames_skipped are counted in it.
+    """
+    stats = {} if stats is None else stats
+    stats.setdefault("frames_gated", 0)
+    stats.setdefault("frames_skipped", 0)
+    last = None
+    try:
+        for frame_no, frame in frames:
+            stats["frames_gated"] += 1
+            if threshold > 0:
+                thumb = frame_thumbnail(frame)
+                if last is not None and thumbnail_difference(thumb, last) < threshold:
+                    stats["frames_skipped"] += 1
+                    logger.debug(f"Skipping near-duplicate frame {frame_no}")
+                    continue
+                last = thumb
+            yield frame_no, frame
+    finally:
+        close = getattr(frames, "close", None)
+        if close:
+            close()
+
+
+def count_frames(frames, on_frame):
+    """Pass (frame_no, frame) pairs through, calling on_frame() for each (e.g. progress reporting)."""
+    try:
+        for item in frames:
+            on_frame()
+            yield item
+    finally:
+        close = getattr(frames, "close", None)
+        if close:
+            close()
@@ -0,0 +1,312 @@
+import json
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import requests
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ("queued", "running", "done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress TEXT,
+    result TEXT,
+    status_code INTEGER,
+    error TEXT,
+    callback_url TEXT,
+    callback_status TEXT,
+    owner TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class JobQueue:
+    """
+    Persistent job queue on a local SQLite file, worked off by a pool of
+    threads - no external broker. submit() stores a job and returns its id
+    at once; a worker claims it and calls
+
+        handler(job_id, kind, params, job_dir, progress) -> (status_code, payload)
+
+    where job_dir is a directory owned by the job (e.g. for its upload,
+    removed when the job finishes) and progress(dict) records live
+    progress. Status code < 400 marks the job done, anything else or an
+    exception marks it failed. If the job has a callback_url, the outcome is
+    POSTed there as JSON.
+
+    Running jobs are leased: the owning process refreshes heartbeat_at every
+    few seconds. On start and while idle, jobs whose owner process on this
+    host is gone (a restart) or whose heartbeat is older than lease_s are
+    put back in the queue, up to max_attempts runs in total. Several
+    processes (see serve.py) can share one database file; claims are
+    serialised by SQLite.
+    """
+
+    def __init__(self, db_path, handler, workers=1, work_dir=None, max_attempts=2, lease_s=60.0,
+                 poll_interval_s=1.0, retention_s=7 * 24 * 3600, callback_timeout_s=10.0, callback_retries=3):
+        self.db_path = db_path
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.work_dir = work_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), "job_files")
+        self.max_attempts = max_attempts
+        self.lease_s = lease_s
+        self.poll_interval_s = poll_interval_s
+        self.retention_s = retention_s
+        self.callback_timeout_s = callback_timeout_s
+        self.callback_retries = callback_retries
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._wake = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._running = set()
+        self._running_lock = threading.Lock()
+        self._progress_written = {}
+        self._progress_latest = {}
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        os.makedirs(self.work_dir, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation keeps worker threads independent;
+        # autocommit, with explicit BEGIN IMMEDIATE where a read-then-write must be atomic
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def job_dir(self, job_id):
+        """Directory for a job's files (created on demand, removed when the job finishes)."""
+        path = os.path.join(self.work_dir, job_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex
+
+    # --- Lifecycle ---
+
+    def start(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop.clear()
+        self.recover()
+        self.prune()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        logger.info(f"Job queue started - {self.workers} workers, database {self.db_path}")
+
+    def stop(self, timeout=None):
+        """Stop claiming jobs; running ones finish unless timeout runs out (they are recovered on restart)."""
+        self._stop.set()
+        with self._wake:
+            self._wake.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    # --- Public API ---
+
+    def submit(self, kind, params, callback_url=None, job_id=None):
+        job_id = job_id or self.new_id()
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO jobs (id, kind, params, status, progress, callback_url, created_at) VALUES (?, ?, ?, 'queued', '{}', ?, ?)",
+                (job_id, kind, json.dumps(params), callback_url, time.time())
+            )
+        with self._wake:
+            self._wake.notify()
+        return job_id
+
+    def get(self, job_id):
+        """The job as a dict (params, progress and result decoded), or None."""
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for key in ("params", "progress", "result"):
+            job[key] = json.loads(job[key]) if job[key] else None
+        if job["status"] == "queued":
+            with self._connect() as db:
+                job["queue_position"] = db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at <= ?", (job["created_at"],)
+                ).fetchone()[0]
+        return job
+
+    def metrics(self):
+        with self._connect() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {"workers": self.workers, **{state: counts.get(state, 0) for state in JOB_STATES}}
+
+    # --- Maintenance ---
+
+    def recover(self):
+        """Requeue (or fail, after max_attempts) running jobs whose owner is gone or whose lease expired."""
+        now = time.time()
+        host = socket.gethostname()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            rows = db.execute("SELECT id, owner, attempts, heartbeat_at FROM jobs WHERE status = 'running'").fetchall()
+            for row in rows:
+                if row["owner"] == self.owner or not self._orphaned(row, host, now):
+                    continue
+                if row["attempts"] >= self.max_attempts:
+                    db.execute(
+                        "UPDATE jobs SET status = 'failed', status_code = 500, error = ?, finished_at = ? WHERE id = ?",
+                        (f"abandoned after {row['attempts']} attempts", now, row["id"])
+                    )
+                    logger.warning(f"Job {row['id']} failed - owner {row['owner']} gone after {row['attempts']} attempts")
+                    shutil.rmtree(os.path.join(self.work_dir, row["id"]), ignore_errors=True)
+                else:
+                    db.execute("UPDATE jobs SET status = 'queued', owner = NULL WHERE id = ?", (row["id"],))
+                    logger.info(f"Job {row['id']} recovered from {row['owner']} - requeued")
+            db.execute("COMMIT")
+
+    def _orphaned(self, row, host, now):
+        if row["heartbeat_at"] is None or now - row["heartbeat_at"] > self.lease_s:
+            return True
+        owner_host, _, owner_pid = (row["owner"] or "").rpartition(":")
+        if owner_host != host or not owner_pid.isdigit():
+            return False
+        try:
+            os.kill(int(owner_pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def prune(self):
+        """Delete finished jobs older than retention_s."""
+        with self._connect() as db:
+            removed = db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (time.time() - self.retention_s,)
+            ).rowcount
+        if removed:
+            logger.info(f"Pruned {removed} finished jobs")
+
+    # --- Workers ---
+
+    def _claim(self):
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+            if row is not None:
+                db.execute(
+                    "UPDATE jobs SET status = 'running', owner = ?, attempts = attempts + 1, started_at = ?, heartbeat_at = ? WHERE id = ?",
+                    (self.owner, now, now, row["id"])
+                )
+            db.execute("COMMIT")
+        return row
+
+    def _worker(self):
+        idle_checks = 0
+        while not self._stop.is_set():
+            row = self._claim()
+            if row is None:
+                # Idle: now and then pick up jobs orphaned by other processes
+                idle_checks += 1
+                if idle_checks % 30 == 0:
+                    self.recover()
+                with self._wake:
+                    self._wake.wait(self.poll_interval_s)
+                continue
+            self._run(row)
+
+    def _run(self, row):
+        job_id = row["id"]
+        with self._running_lock:
+            self._running.add(job_id)
+        start = time.perf_counter()
+        logger.info(f"Job {job_id} ({row['kind']}) started, attempt {row['attempts'] + 1}")
+        try:
+            status_code, payload = self.handler(
+                job_id, row["kind"], json.loads(row["params"]), self.job_dir(job_id),
+                lambda progress: self._progress(job_id, progress)
+            )
+            error = None if status_code < 400 else str(payload.get("error", payload))
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed")
+            status_code, payload, error = 500, {"error": str(e), "status": "error"}, str(e)
+        finally:
+            shutil.rmtree(os.path.join(self.work_dir, job_id), ignore_errors=True)
+            with self._running_lock:
+                self._running.discard(job_id)
+            self._progress_written.pop(job_id, None)
+            progress = self._progress_latest.pop(job_id, None)
+
+        status = "done" if status_code < 400 else "failed"
+        with self._connect() as db:
+            # Final counts too, in case the last progress report was throttled
+            db.execute(
+                "UPDATE jobs SET status = ?, progress = COALESCE(?, progress), result = ?, status_code = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(progress) if progress else None, json.dumps(payload), status_code, error, time.time(), job_id)
+            )
+        logger.info(f"Job {job_id} {status} in {time.perf_counter() - start:.1f} s")
+        if row["callback_url"]:
+            self._notify(job_id, row["callback_url"], status, status_code, payload)
+
+    def _progress(self, job_id, progress, min_interval_s=0.5):
+        # Throttled: progress can be reported per frame from several pipeline threads
+        self._progress_latest[job_id] = progress
+        now = time.monotonic()
+        if now - self._progress_written.get(job_id, 0.0) < min_interval_s:
+            return
+        self._progress_written[job_id] = now
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET progress = ?, heartbeat_at = ? WHERE id = ?", (json.dumps(progress), time.time(), job_id))
+
+    def _heartbeat(self):
+        while not self._stop.wait(min(self.lease_s / 3, 10.0)):
+            with self._running_lock:
+                running = list(self._running)
+            if running:
+                with self._connect() as db:
+                    db.executemany("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", [(time.time(), job_id) for job_id in running])
+
+    def _notify(self, job_id, url, status, status_code, payload):
+        body = {"job_id": job_id, "status": status, "status_code": status_code, "result": payload}
+        callback_status = "failed"
+        for attempt in range(self.callback_retries):
+            try:
+                response = requests.post(url, json=body, timeout=self.callback_timeout_s)
+                response.raise_for_status()
+                callback_status = f"sent ({response.status_code})"
+                break
+            except requests.exceptions.RequestException as e:
+                callback_status = f"failed: {e}"
+                logger.warning(f"Callback for job {job_id} to {url} failed (attempt {attempt + 1}): {e}")
+                time.sleep(2 ** attempt)
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET callback_status = ? WHERE id = ?", (callback_status, job_id))
@@ -1,8 +1,8 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import json
 import requests
 import tempfile
@@ -12,10 +12,12 @@ import logging
 import time
 
 from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import asyncio
+import threading
 from dotenv import load_dotenv
 import os
-import joblib
 import torch
 
 # Configure logging
@@ -34,45 +36,578 @@ load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
+# Quantum head backend: "numpy" (statevector simulation, no TFQ needed) or "tfq"
+QUANTUM_BACKEND = os.getenv("QUANTUM_BACKEND", "numpy").lower()
+# Optional compiled head exported with `python quantum_numpy.py --out quantum_head.npz`
+QUANTUM_HEAD_ARTIFACT = os.getenv("QUANTUM_HEAD_ARTIFACT")
+
+# Cross-request micro-batching of FaceNet and quantum head calls
+MICRO_BATCHING = os.getenv("MICRO_BATCHING", "1") == "1"
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "64"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+BATCH_MAX_QUEUE = int(os.getenv("BATCH_MAX_QUEUE", "1024"))
+
+# Max face crops per FaceNet forward pass within a request
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+
+# Optional CPU-optimized FaceNet (see embedder_opt.py): mode, export and on-disk cache
+EMBEDDER_MODE = os.getenv("EMBEDDER_MODE", "fp32")
+EMBEDDER_EXPORT = os.getenv("EMBEDDER_EXPORT", "none")
+EMBEDDER_CACHE_DIR = os.getenv("EMBEDDER_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedder_cache"))
+
+# Default face augmentation per request (random | none | deterministic | tta:K) and the TTA view cap
+AUGMENT_MODE = os.getenv("AUGMENT_MODE", "random")
+TTA_MAX_K = int(os.getenv("TTA_MAX_K", "16"))
+
+# Video frame sampler: seek (per-frame cap.set), grab (seek once + grab/retrieve) or keyframes (PyAV)
+FRAME_SAMPLER = os.getenv("FRAME_SAMPLER", "grab")
+
+# Threaded video pipeline (decoder -> detector workers -> embed pool); 0 detect workers = single loop
+VIDEO_DETECT_WORKERS = int(os.getenv("VIDEO_DETECT_WORKERS", str(min(4, os.cpu_count() or 1))))
+VIDEO_EMBED_WORKERS = int(os.getenv("VIDEO_EMBED_WORKERS", "1"))
+VIDEO_QUEUE_SIZE = int(os.getenv("VIDEO_QUEUE_SIZE", "16"))
+
+# Longest side of the image Haar detection runs on (0 = full resolution), see `python benchmark.py detect`
+DETECT_MAX_SIDE = int(os.getenv("DETECT_MAX_SIDE", "640"))
+
+# Haar cascade + CLAHE instances detection may use concurrently (one per detecting thread)
+DETECTOR_POOL_SIZE = int(os.getenv("DETECTOR_POOL_SIZE", str(max(VIDEO_DETECT_WORKERS, os.cpu_count() or 1))))
+
+# Face detector backend (haar | res10 | yunet) and its local model files (defaults under models/),
+# see `python benchmark.py detect-backends`
+FACE_DETECTOR = os.getenv("FACE_DETECTOR", "haar")
+FACE_DETECTOR_MODEL = os.getenv("FACE_DETECTOR_MODEL")
+FACE_DETECTOR_CONFIG = os.getenv("FACE_DETECTOR_CONFIG")
+
+# Follow detected faces across sampled video frames, full detection every N frames or when tracking is lost.
+# Off by default: tracked boxes differ slightly from detected ones, which changes the crops scored
+FACE_TRACKING = os.getenv("FACE_TRACKING", "0") == "1"
+TRACK_REDETECT_EVERY = int(os.getenv("TRACK_REDETECT_EVERY", "5"))
+
+# Default early-exit scoring for videos (off | hoeffding | normal), its level and scoring batch size
+EARLY_EXIT = os.getenv("EARLY_EXIT", "off")
+EARLY_EXIT_DELTA = float(os.getenv("EARLY_EXIT_DELTA", "0.05"))
+EARLY_EXIT_BATCH = int(os.getenv("EARLY_EXIT_BATCH", "4"))
+
+# Skip sampled video frames whose 32x32 thumbnail differs from the last kept one by less than
+# this mean absolute difference (0-255 scale, 0 = off); static shots score ~0, slow motion ~2.
+# Off by default: skipped frames are not replaced, so static videos score fewer faces than max_faces
+FRAME_DEDUP_THRESHOLD = float(os.getenv("FRAME_DEDUP_THRESHOLD", "0"))
+
+# /predict-url: fetch only the MP4 index and the analysed tail with HTTP Range requests when the
+# server supports them (full download otherwise), see `python benchmark.py ranged-download`
+RANGED_DOWNLOAD = os.getenv("RANGED_DOWNLOAD", "1") == "1"
+
+# Whole-video timeline mode (mode=timeline on the video endpoints): default segment length
+# and faces scored per segment
+TIMELINE_SEGMENT_SECONDS = float(os.getenv("TIMELINE_SEGMENT_SECONDS", "10"))
+TIMELINE_FACES_PER_SEGMENT = int(os.getenv("TIMELINE_FACES_PER_SEGMENT", "5"))
+
+# Threads for blocking I/O in request handlers (saving uploads, URL downloads)
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8"))
+# Threads running predictions (one per in-flight request) off the event loop; further requests
+# queue until one is free. More than one lets micro-batching merge concurrent requests
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "4"))
+
+# Most files accepted by /predict-batch and /predict/image-batch
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "10"))
+
+# Asynchronous video jobs (/jobs/*): SQLite queue file, worker threads per process, runs per
+# job before a job interrupted by restarts is failed, and how long finished jobs are kept.
+# Job workers download on their own thread but run inference on the INFERENCE_WORKERS executor
+JOBS_DB = os.getenv("JOBS_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs", "jobs.db"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "168"))
+
+# Perceptual-hash cache in front of FaceNet (see embedding_cache.py): entries per process (float16
+# embeddings, 1 KB each, 0 = off), crop hash (dhash | phash) and the Hamming distance in bits up to
+# which a crop reuses a stored embedding (0 = same hash only). Off by default: a re-encoded copy then
+# gets the original's embedding, which can change labels - measure with `python benchmark.py embedding-cache`
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "0"))
+EMBEDDING_CACHE_HASH = os.getenv("EMBEDDING_CACHE_HASH", "dhash")
+EMBEDDING_CACHE_MAX_DISTANCE = int(os.getenv("EMBEDDING_CACHE_MAX_DISTANCE", "0"))
+
+# Content-addressed result cache for /predict, /predict/image and the URL endpoints: in-memory
+# LRU entries, on-disk tier directory ("" = memory only), its size cap and the entry lifetime.
+# Keys include a fingerprint of the loaded weights unless MODEL_VERSION is set. Off by default:
+# random augmentation (the default AUGMENT_MODE) is never cached, so enable it together with
+# AUGMENT_MODE=none, deterministic or tta:K
+RESULT_CACHE = os.getenv("RESULT_CACHE", "0") == "1"
+RESULT_CACHE_MEMORY_ITEMS = int(os.getenv("RESULT_CACHE_MEMORY_ITEMS", "1024"))
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "results"))
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "512"))
+RESULT_CACHE_TTL_HOURS = float(os.getenv("RESULT_CACHE_TTL_HOURS", "168"))
+MODEL_VERSION = os.getenv("MODEL_VERSION")
+
 # Import your prediction modules
 from predictimg import (
     predict_video_consistent,
     get_facenet_feature_extractor,
-    create_tfq_model_layers,
+    load_scaler,
+    load_quantum_head,
+    SCALER_PATH,
+    QUANTUM_WEIGHTS_PATH,
     TFQ_AVAILABLE,
     device,
-    predict_image_deepfake_single
+    predict_image_deepfake_single,
+    predict_image_deepfake_batch,
+    TFQTemplateHead,
+    warmup_quantum_head,
+    parse_augment_mode,
+    face_detectors,
+    predict_video_timeline,
+    TIMELINE_SEGMENTERS
 )
+from quantum_numpy import NumpyQuantumHead
+from batching import BatchedEmbedder, BatchedQuantumHead
+from embedder_opt import build_optimized_embedder
+from frame_sampling import FRAME_SAMPLERS, PYAV_AVAILABLE
+from early_exit import EARLY_EXIT_METHODS
+from detector_backends import DETECTOR_BACKENDS, create_detector
+from ranged_download import download_video_tail, TailDownloadUnsupported
+from serve import process_memory
+from jobs import JobQueue
+from result_cache import ResultCache, HashingFile, file_fingerprint
+from embedding_cache import EmbeddingCache, CachedEmbedder, EMBEDDING_CACHE_HASHES
 
 # Global variables for models
 scaler = None
 embedder_model = None
-tfq_model = None
+quantum_model = None
+quantum_warmup_ms = None
+model_version = None
+# Embedder mode/export that actually took effect (load_models falls back to fp32)
+embedder_variant = None
+
+# Executors for blocking work, created on startup (see run_blocking)
+io_executor = None
+inference_executor = None
+job_queue = None
+result_cache = None
+executor_metrics = {"io": {"in_flight": 0, "completed": 0}, "inference": {"in_flight": 0, "completed": 0}}
+
+# Per-video detection counters summed over requests (see /metrics); updated from worker threads
+video_metrics = {"videos": 0, "frames_sampled": 0, "frames_skipped": 0, "detections_run": 0, "frames_tracked": 0}
+video_metrics_lock = threading.Lock()
+
+def record_video_stats(stats):
+    with video_metrics_lock:
+        video_metrics["videos"] += 1
+        for key in ("frames_sampled", "frames_skipped", "detections_run", "frames_tracked"):
+            video_metrics[key] += stats.get(key, 0)
+
+async def run_blocking(kind, func, *args, **kwargs):
+    """Run a blocking call on the io or inference executor, leaving the event loop free."""
+    executor = io_executor if kind == "io" else inference_executor
+    counters = executor_metrics[kind]
+    counters["in_flight"] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, partial(func, *args, **kwargs))
+    finally:
+        counters["in_flight"] -= 1
+        counters["completed"] += 1
+
+def run_inference(func, *args, **kwargs):
+    """Blocking call on the inference executor from a thread off the event loop (job workers)."""
+    return inference_executor.submit(func, *args, **kwargs).result()
+
+async def iterate_blocking(kind, iterator):
+    """Async iteration over a blocking iterator, each step run on an executor (see run_blocking)."""
+    done = object()
+    try:
+        while True:
+            item = await run_blocking(kind, next, iterator, done)
+            if item is done:
+                break
+            yield item
+    finally:
+        # Client gone mid-stream: close the generator on the executor (if a step is still
+        # running there, it is closed when garbage collected instead)
+        (io_executor if kind == "io" else inference_executor).submit(getattr(iterator, "close", lambda: None))
+
+def validate_augment(augment):
+    """Reject an unknown augment spec with a 400 before any work is done."""
+    try:
+        parse_augment_mode(augment, max_k=TTA_MAX_K)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return augment
+
+def validate_batch_size(files):
+    """Reject batches over BATCH_MAX_FILES with a 400."""
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files. Maximum {BATCH_MAX_FILES} files per batch."
+        )
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')
+
+def validate_early_exit(early_exit):
+    """Reject an unknown early-exit method with a 400."""
+    if early_exit not in EARLY_EXIT_METHODS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown early exit method {early_exit!r}, expected one of {', '.join(EARLY_EXIT_METHODS)}"
+        )
+    return early_exit
+
+# tail: one verdict from the last seconds_range seconds; timeline: streamed per-segment verdicts
+VIDEO_MODES = ("tail", "timeline")
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def validate_timeline(mode, segmenter, stream, segment_seconds, faces_per_segment):
+    """Reject unknown video mode / timeline options with a 400."""
+    if mode not in VIDEO_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode {mode!r}, expected one of {', '.join(VIDEO_MODES)}")
+    if mode == "timeline":
+        if segmenter not in TIMELINE_SEGMENTERS:
+            raise HTTPException(status_code=400, detail=f"Unknown segmenter {segmenter!r}, expected one of {', '.join(TIMELINE_SEGMENTERS)}")
+        if stream not in STREAM_MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unknown stream format {stream!r}, expected one of {', '.join(STREAM_MEDIA_TYPES)}")
+        if segment_seconds <= 0 or faces_per_segment < 1:
+            raise HTTPException(status_code=400, detail="segment_seconds must be positive and faces_per_segment at least 1")
+
+def run_video_prediction(video_path, max_faces, seconds_range, augment, early_exit, stats, progress=None):
+    """Tail-mode predict_video_consistent with the server's video settings (blocking)."""
+    return predict_video_consistent(
+        video_path=video_path,
+        model=quantum_model,
+        scaler=scaler,
+        embedder_model=embedder_model,
+        n_qubits=8,
+        max_faces_per_video=max_faces,
+        seconds_range=seconds_range,
+        device=device,
+        embed_batch_size=EMBED_BATCH_SIZE,
+        augment=augment,
+        frame_sampler=FRAME_SAMPLER,
+        detect_workers=VIDEO_DETECT_WORKERS,
+        embed_workers=VIDEO_EMBED_WORKERS,
+        pipeline_queue_size=VIDEO_QUEUE_SIZE,
+        detect_max_side=DETECT_MAX_SIDE,
+        track_faces=FACE_TRACKING,
+        redetect_every=TRACK_REDETECT_EVERY,
+        early_exit=early_exit,
+        early_exit_delta=EARLY_EXIT_DELTA,
+        early_exit_batch=EARLY_EXIT_BATCH,
+        dedup_threshold=FRAME_DEDUP_THRESHOLD,
+        progress=progress,
+        stats=stats
+    )
+
+def video_prediction_response(prob, label, video_stats, max_faces, seconds_range, augment, early_exit):
+    """Prediction, analysis parameters and stats of a tail-mode video response."""
+    return {
+        "prediction": {
+            "label": label,
+            "is_deepfake": label == "fake",
+            "deepfake_probability": round(prob, 4) if label == "real" else round(1 - prob, 4)
+        },
+        "analysis_parameters": {
+            "max_faces_analyzed": max_faces,
+            "faces_used": video_stats["faces_used"],
+            "seconds_analyzed": seconds_range,
+            "augment": augment,
+            "early_exit": early_exit,
+            "quantum_enhanced": True,
+            "device_used": device
+        },
+        "video_stats": video_stats
+    }
+
+def image_prediction_response(prob, label, faces_found, max_faces, augment):
+    """Prediction and analysis parameters of a single-image response."""
+    return {
+        "prediction": {
+            "label": label,
+            "is_deepfake": label == "fake",
+            "deepfake_probability": round(prob, 4) if label == "real" else round(1 - prob, 4)
+        },
+        "analysis_parameters": {
+            "faces_found": faces_found,
+            "max_faces_analyzed": max_faces,
+            "augment": augment,
+            "quantum_enhanced": True,
+            "device_used": device
+        }
+    }
+
+def result_cache_key(kind, digest, params):
+    """
+    Result cache key for media with SHA-256 digest analysed with params, or
+    None when the cache is off or the result is not reproducible (random
+    augmentation draws new views on every run).
+    """
+    if result_cache is None or not digest or parse_augment_mode(params["augment"])[0] == "random":
+        return None
+    settings = {
+        "frame_sampler": FRAME_SAMPLER,
+        "detector": FACE_DETECTOR,
+        "detect_max_side": DETECT_MAX_SIDE,
+        "face_tracking": FACE_TRACKING and TRACK_REDETECT_EVERY,
+        "dedup_threshold": FRAME_DEDUP_THRESHOLD,
+        "early_exit": (EARLY_EXIT_DELTA, EARLY_EXIT_BATCH),
+        # Near-duplicate embedding reuse can shift results slightly
+        "embedding_cache": (EMBEDDING_CACHE_HASH, EMBEDDING_CACHE_MAX_DISTANCE) if EMBEDDING_CACHE_SIZE > 0 else None
+    }
+    return ResultCache.key(kind, digest, params, settings, model_version)
+
+async def cache_lookup(key):
+    """Cached result for key (None on a miss); a failing disk tier only costs the hit."""
+    if not key:
+        return None
+    try:
+        return await run_blocking("io", result_cache.get, key)
+    except OSError as e:
+        logger.warning(f"Result cache lookup failed: {e}")
+        return None
+
+async def cache_store(key, result):
+    if not key:
+        return
+    try:
+        await run_blocking("io", result_cache.put, key, result)
+    except OSError as e:
+        logger.warning(f"Result cache store failed: {e}")
+
+def stream_timeline(video_path, temp_dir, source, stream, segment_seconds, faces_per_segment, segmenter, augment):
+    """
+    Stream predict_video_timeline as NDJSON lines or Server-Sent Events: a start
+    event, one segment event per scored segment, then a summary (or an error).
+    temp_dir is removed once the stream ends.
+    """
+    def event(kind, payload):
+        if stream == "sse":
+            return f"event: {kind}\ndata: {json.dumps(payload)}\n\n"
+        return json.dumps({"type": kind, **payload}) + "\n"
+
+    def generate():
+        started = time.time()
+        video_stats = {}
+        fake_segments, faces, prob_sum = [], 0, 0.0
+        try:
+            yield event("start", {
+                "source": source,
+                "segmenter": segmenter,
+                "segment_seconds": segment_seconds,
+                "faces_per_segment": faces_per_segment,
+                "augment": augment
+            })
+            for segment in predict_video_timeline(
+                video_path=video_path,
+                model=quantum_model,
+                scaler=scaler,
+                embedder_model=embedder_model,
+                n_qubits=8,
+                segment_seconds=segment_seconds,
+                faces_per_segment=faces_per_segment,
+                segmenter=segmenter,
+                device=device,
+                embed_batch_size=EMBED_BATCH_SIZE,
+                augment=augment,
+                frame_sampler=FRAME_SAMPLER,
+                detect_max_side=DETECT_MAX_SIDE,
+                track_faces=FACE_TRACKING,
+                redetect_every=TRACK_REDETECT_EVERY,
+                dedup_threshold=FRAME_DEDUP_THRESHOLD,
+                stats=video_stats
+            ):
+                if segment["label"] is not None:
+                    faces += segment["faces_used"]
+                    prob_sum += segment["probability"] * segment["faces_used"]
+                    if segment["label"] == "fake":
+                        fake_segments.append(segment["segment"])
+                yield event("segment", {**segment, "elapsed_s": round(time.time() - started, 3)})
+            record_video_stats(video_stats)
+
+            avg_prob = prob_sum / faces if faces else None
+            yield event("summary", {
+                "label": None if avg_prob is None else ("fake" if avg_prob > 0.5 else "real"),
+                "average_probability": None if avg_prob is None else round(avg_prob, 4),
+                "fake_segments": fake_segments,
+                "faces_used": faces,
+                "video_stats": video_stats,
+                "analysis_time_s": round(time.time() - started, 3),
+                "status": "success" if faces else "no_face_detected"
+            })
+        except Exception as e:
+            logger.error(f"Error during timeline analysis: {e}")
+            yield event("error", {"error": str(e), "status": "error"})
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return StreamingResponse(iterate_blocking("inference", generate()), media_type=STREAM_MEDIA_TYPES[stream])
+
+def load_models(fork_safe=False):
+    """
+    Validate the settings and load the scaler, FaceNet embedder and quantum
+    head into the module globals, keeping whatever is already loaded.
+    serve.py calls this in its parent process (fork_safe=True) so the forked
+    workers share the weights copy-on-write; each worker's lifespan then
+    only loads what is missing.
+    """
+    global scaler, embedder_model, quantum_model, model_version, embedder_variant
+    
+    # Fail fast on a bad default augmentation
+    parse_augment_mode(AUGMENT_MODE, max_k=TTA_MAX_K)
+    if EARLY_EXIT not in EARLY_EXIT_METHODS:
+        raise ValueError(f"Unknown EARLY_EXIT {EARLY_EXIT!r}, expected one of {EARLY_EXIT_METHODS}")
+    if FACE_DETECTOR not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown FACE_DETECTOR {FACE_DETECTOR!r}, expected one of {DETECTOR_BACKENDS}")
+    if FRAME_SAMPLER not in FRAME_SAMPLERS:
+        raise ValueError(f"Unknown FRAME_SAMPLER {FRAME_SAMPLER!r}, expected one of {FRAME_SAMPLERS}")
+    if EMBEDDING_CACHE_HASH not in EMBEDDING_CACHE_HASHES:
+        raise ValueError(f"Unknown EMBEDDING_CACHE_HASH {EMBEDDING_CACHE_HASH!r}, expected one of {EMBEDDING_CACHE_HASHES}")
+    if FRAME_SAMPLER == "keyframes" and not PYAV_AVAILABLE:
+        print("⚠ PyAV not installed - keyframe sampling falls back to grab")
+    
+    # Load scaler
+    if scaler is None:
+        scaler = load_scaler(SCALER_PATH)
+        print("✓ Scaler loaded successfully")
+    
+    # Load FaceNet embedder
+    if embedder_model is None:
+        embedder_model = get_facenet_feature_extractor().to(device)
+        embedder_variant = "fp32/none"
+        print("✓ FaceNet embedder loaded successfully")
+    
+        # Opt-in quantized / compiled CPU embedder
+        if EMBEDDER_MODE != "fp32" or EMBEDDER_EXPORT != "none":
+            if device != "cpu":
+                print(f"⚠ Embedder mode {EMBEDDER_MODE} is CPU-only - keeping fp32 on {device}")
+            else:
+                try:
+                    embedder_model = build_optimized_embedder(
+                        embedder_model,
+                        mode=EMBEDDER_MODE,
+                        export=EMBEDDER_EXPORT,
+                        cache_dir=EMBEDDER_CACHE_DIR
+                    )
+                    embedder_variant = f"{EMBEDDER_MODE}/{EMBEDDER_EXPORT}"
+                    print(f"✓ Optimized embedder ready - mode: {EMBEDDER_MODE}, export: {EMBEDDER_EXPORT}")
+                except ValueError as e:
+                    print(f"⚠ Could not build optimized embedder ({e}) - keeping fp32")
+    
+    # Load quantum head (NumPy statevector by default, TFQ on request)
+    if quantum_model is None:
+        if QUANTUM_BACKEND == "tfq" and TFQ_AVAILABLE and fork_safe:
+            # TensorFlow's runtime threads do not survive fork()
+            print("⚠ TFQ model is not fork-safe - each worker loads its own")
+        else:
+            if QUANTUM_BACKEND == "tfq" and not TFQ_AVAILABLE:
+                print("⚠ TensorFlow Quantum not available - falling back to NumPy quantum head")
+            quantum_model = load_quantum_head(
+                QUANTUM_WEIGHTS_PATH,
+                use_tfq=QUANTUM_BACKEND == "tfq",
+                artifact=QUANTUM_HEAD_ARTIFACT
+            )
+            if isinstance(quantum_model, TFQTemplateHead):
+                print("✓ TFQ model loaded successfully")
+            else:
+                print("✓ NumPy quantum head loaded successfully")
+    
+    # Part of every result cache key, so new weights never serve old results
+    if model_version is None:
+        # The backends that run, not the ones requested (TFQ falls back to NumPy when not installed)
+        quantum_backend = "tfq" if QUANTUM_BACKEND == "tfq" and TFQ_AVAILABLE else "numpy"
+        head_path = QUANTUM_WEIGHTS_PATH
+        if quantum_backend == "numpy" and QUANTUM_HEAD_ARTIFACT and os.path.exists(QUANTUM_HEAD_ARTIFACT):
+            head_path = QUANTUM_HEAD_ARTIFACT
+        model_version = MODEL_VERSION or file_fingerprint([SCALER_PATH, head_path], extra=(quantum_backend, embedder_variant))
+        print(f"✓ Model version: {model_version}")
+
+def uncached_embedder():
+    """The embedder behind the embedding cache (the micro-batched or plain FaceNet module)."""
+    return embedder_model.embedder if isinstance(embedder_model, CachedEmbedder) else embedder_model
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Load models on startup and cleanup on shutdown"""
-    global scaler, embedder_model, tfq_model
+    global embedder_model, quantum_model, quantum_warmup_ms, io_executor, inference_executor, job_queue, result_cache
     
     # Startup
     try:
-        # Load scaler
-        scaler = joblib.load("/Users/arunkaul/Desktop/MyFiles/Entangl/python-backend/scaler.joblib")
-        print("✓ Scaler loaded successfully")
+        io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+        inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+        print(f"✓ Executors ready - {IO_WORKERS} I/O threads, {INFERENCE_WORKERS} inference threads")
         
-        # Load FaceNet embedder
-        embedder_model = get_facenet_feature_extractor().to(device)
-        print("✓ FaceNet embedder loaded successfully")
+        # Scaler, embedder and quantum head (no-op for models preloaded by serve.py)
+        load_models()
         
-        # Load TFQ model if available
-        if TFQ_AVAILABLE:
-            tfq_model = create_tfq_model_layers(n_qubits=8, n_layers=12, learning_rate=1e-3)
-            tfq_model.load_weights("/Users/arunkaul/Desktop/MyFiles/Entangl/python-backend/tfq_face_layers_weights.h5")
-            print("✓ TFQ model loaded successfully")
-        else:
-            print("⚠ TensorFlow Quantum not available - quantum features disabled")
+        # Face detector backend; a missing model file falls back to the Haar cascade
+        face_detectors.configure(
+            partial(create_detector, FACE_DETECTOR, FACE_DETECTOR_MODEL, FACE_DETECTOR_CONFIG),
+            max_size=DETECTOR_POOL_SIZE
+        )
+        try:
+            with face_detectors.checkout() as detector:
+                print(f"✓ Face detector ready: {detector.name} (pool size {DETECTOR_POOL_SIZE})")
+        except (FileNotFoundError, ValueError) as e:
+            if FACE_DETECTOR == "haar":
+                raise
+            print(f"⚠ Face detector {FACE_DETECTOR} unavailable ({e}) - using haar")
+            face_detectors.configure(partial(create_detector, "haar"))
         
-        print(f"✓ All models loaded. Using device: {device}")
+        # Trace/warm the quantum head so the first request doesn't pay for it
+        first_ms, steady_ms = warmup_quantum_head(quantum_model)
+        quantum_warmup_ms = {"first_call": round(first_ms, 2), "steady_state": round(steady_ms, 2)}
+        print(f"✓ Quantum head warmed up - first call {first_ms:.1f} ms, steady state {steady_ms:.1f} ms")
+        
+        # Share embedding and quantum head batches across in-flight requests
+        if MICRO_BATCHING:
+            batch_kwargs = dict(max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, max_queue=BATCH_MAX_QUEUE)
+            embedder_model = BatchedEmbedder(embedder_model, **batch_kwargs)
+            if isinstance(quantum_model, (NumpyQuantumHead, TFQTemplateHead)):
+                quantum_model = BatchedQuantumHead(quantum_model, **batch_kwargs)
+            else:
+                print("⚠ Micro-batching skipped for the quantum head (raw Keras model)")
+            print(f"✓ Micro-batching enabled - max batch {BATCH_MAX_SIZE}, max wait {BATCH_MAX_WAIT_MS} ms")
+        
+        # Reuse embeddings of visually identical face crops across requests; hits skip
+        # the FaceNet pass and the micro-batching queue
+        if EMBEDDING_CACHE_SIZE > 0:
+            embedder_model = CachedEmbedder(
+                embedder_model,
+                EmbeddingCache(
+                    capacity=EMBEDDING_CACHE_SIZE,
+                    max_distance=EMBEDDING_CACHE_MAX_DISTANCE,
+                    hash=EMBEDDING_CACHE_HASH
+                )
+            )
+            print(
+                f"✓ Embedding cache ready - {EMBEDDING_CACHE_SIZE} entries, {EMBEDDING_CACHE_HASH}, "
+                f"max distance {EMBEDDING_CACHE_MAX_DISTANCE} bits"
+            )
+        
+        # Results of repeated submissions of the same media
+        if RESULT_CACHE:
+            result_cache = ResultCache(
+                memory_items=RESULT_CACHE_MEMORY_ITEMS,
+                disk_dir=RESULT_CACHE_DIR or None,
+                max_disk_bytes=int(RESULT_CACHE_MAX_MB * 1024 * 1024),
+                ttl_s=RESULT_CACHE_TTL_HOURS * 3600
+            )
+            print(f"✓ Result cache ready - {RESULT_CACHE_MEMORY_ITEMS} entries in memory, disk: {RESULT_CACHE_DIR or 'off'}")
+            if parse_augment_mode(AUGMENT_MODE, max_k=TTA_MAX_K)[0] == "random":
+                logger.warning(
+                    "RESULT_CACHE is on but AUGMENT_MODE is random: requests using the default augment are not cached"
+                )
+        
+        # Asynchronous video jobs; jobs interrupted by a restart are picked up again
+        job_queue = JobQueue(
+            JOBS_DB,
+            run_video_job,
+            workers=JOB_WORKERS,
+            max_attempts=JOB_MAX_ATTEMPTS,
+            retention_s=JOB_RETENTION_HOURS * 3600
+        )
+        job_queue.start()
+        print(f"✓ Job queue ready - {JOB_WORKERS} workers, {job_queue.metrics()['queued']} queued jobs")
+        
+        print(f"✓ All models loaded. Using device: {device}, default augment: {AUGMENT_MODE}")
         
     except Exception as e:
         print(f"❌ Error loading models: {e}")
@@ -82,6 +617,15 @@ async def lifespan(app: FastAPI):
     
     # Shutdown (cleanup if needed)
     print("🔄 Shutting down...")
+    if job_queue is not None:
+        # Jobs still running are requeued on the next start
+        job_queue.stop(timeout=5)
+    for batched in (uncached_embedder(), quantum_model):
+        if isinstance(batched, (BatchedEmbedder, BatchedQuantumHead)):
+            batched.batcher.stop()
+    for executor in (io_executor, inference_executor):
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
 
 # Create a FastAPI app instance with lifespan
 app = FastAPI(
@@ -116,17 +660,57 @@ async def health_check():
         "models_loaded": {
             "scaler": scaler is not None,
             "embedder": embedder_model is not None,
-            "tfq_model": tfq_model is not None
+            "quantum_model": quantum_model is not None
         },
         "tfq_available": TFQ_AVAILABLE,
+        "quantum_backend": "numpy" if isinstance(getattr(quantum_model, "head", quantum_model), NumpyQuantumHead) else "tfq",
+        "quantum_warmup_ms": quantum_warmup_ms,
         "device": device
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Serving metrics of this worker process (memory, executors, micro-batching queues, embedding and result caches, face detector pool, jobs, video face detection)"""
+    with video_metrics_lock:
+        videos = dict(video_metrics)
+    # Counting jobs reads the SQLite queue
+    jobs = await run_blocking("io", job_queue.metrics) if job_queue else None
+    return {
+        "process": {"pid": os.getpid(), "memory": process_memory()},
+        "executors": {
+            name: {**counters, "max_workers": IO_WORKERS if name == "io" else INFERENCE_WORKERS}
+            for name, counters in executor_metrics.items()
+        },
+        "micro_batching": {
+            name: model.batcher.metrics()
+            for name, model in (("embedder", uncached_embedder()), ("quantum_head", quantum_model))
+            if isinstance(model, (BatchedEmbedder, BatchedQuantumHead))
+        },
+        "embedding_cache": embedder_model.cache.metrics() if isinstance(embedder_model, CachedEmbedder) else None,
+        "detector_pool": face_detectors.metrics(),
+        "jobs": jobs,
+        "result_cache": result_cache.metrics() if result_cache else None,
+        "video": {
+            **videos,
+            "tracked_share": round(videos["frames_tracked"] / max(videos["frames_sampled"], 1), 4),
+            "skipped_share": round(
+                videos["frames_skipped"] / max(videos["frames_sampled"] + videos["frames_skipped"], 1), 4
+            )
+        }
+    }
+
 @app.post("/predict")
 async def predict_deepfake(
     file: UploadFile = File(...),
     max_faces: int = 20,
-    seconds_range: int = 6
+    seconds_range: int = 6,
+    augment: str = AUGMENT_MODE,
+    early_exit: str = EARLY_EXIT,
+    mode: str = "tail",
+    segment_seconds: float = TIMELINE_SEGMENT_SECONDS,
+    faces_per_segment: int = TIMELINE_FACES_PER_SEGMENT,
+    segmenter: str = "fixed",
+    stream: str = "ndjson"
 ) -> Dict[str, Any]:
     """
     Analyze uploaded video for deepfake detection
@@ -135,9 +719,13 @@ async def predict_deepfake(
         file: MP4 video file
         max_faces: Maximum number of faces to analyze per video (default: 20)
         seconds_range: Seconds from end of video to analyze (default: 6)
+        augment: Face augmentation - random, none, deterministic or tta:K (default: AUGMENT_MODE)
+        early_exit: Stop scoring once the label is settled - off, hoeffding or normal (default: EARLY_EXIT)
+        mode: tail (one verdict for the last seconds_range seconds) or timeline (whole video, streamed per segment)
+        segment_seconds, faces_per_segment, segmenter (fixed or scene), stream (ndjson or sse): timeline options
     
     Returns:
-        JSON response with prediction results
+        JSON response with prediction results, or a stream of segment results in timeline mode
     """
     
     # Validate file type
@@ -147,6 +735,10 @@ async def predict_deepfake(
             detail="Invalid file type. Please upload a video file (mp4, avi, mov, mkv)."
         )
     
+    validate_augment(augment)
+    validate_early_exit(early_exit)
+    validate_timeline(mode, segmenter, stream, segment_seconds, faces_per_segment)
+    
     # Check if models are loaded
     if not all([scaler, embedder_model]):
         raise HTTPException(
@@ -154,50 +746,51 @@ async def predict_deepfake(
             detail="Models not loaded. Please try again later."
         )
     
-    if not TFQ_AVAILABLE or tfq_model is None:
+    if quantum_model is None:
         raise HTTPException(
             status_code=503,
-            detail="TensorFlow Quantum not available. Quantum prediction disabled."
+            detail="Quantum model not loaded. Quantum prediction disabled."
         )
     
     # Create temporary file
     temp_dir = tempfile.mkdtemp()
     temp_file_path = None
+    streaming = False
     
     try:
         # Save uploaded file temporarily
         temp_file_path = os.path.join(temp_dir, f"temp_video_{file.filename}")
         
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        digest = await run_blocking("io", save_upload, file, temp_file_path)
+        
+        if mode == "timeline":
+            streaming = True
+            return stream_timeline(temp_file_path, temp_dir, file.filename, stream, segment_seconds, faces_per_segment, segmenter, augment)
+        
+        # Same video, parameters and model as an earlier request
+        cache_key = result_cache_key(
+            "video", digest,
+            {"max_faces": max_faces, "seconds_range": seconds_range, "augment": augment, "early_exit": early_exit}
+        )
+        cached = await cache_lookup(cache_key)
+        if cached is not None:
+            return JSONResponse(content={"filename": file.filename, **cached, "status": "success", "cache": "hit"})
         
         # Run prediction
-        prob, label = predict_video_consistent(
-            video_path=temp_file_path,
-            model=tfq_model,
-            scaler=scaler,
-            embedder_model=embedder_model,
-            n_qubits=8,
-            max_faces_per_video=max_faces,
-            seconds_range=seconds_range,
-            device=device
+        video_stats = {}
+        prob, label = await run_blocking(
+            "inference", run_video_prediction, temp_file_path, max_faces, seconds_range, augment, early_exit, video_stats
         )
+        record_video_stats(video_stats)
+        result = video_prediction_response(prob, label, video_stats, max_faces, seconds_range, augment, early_exit)
+        await cache_store(cache_key, result)
         
         # Prepare response
         response = {
             "filename": file.filename,
-            "prediction": {
-                "label": label,
-                "is_deepfake": label == "fake",
-                "deepfake_probability": round(prob, 4) if label == "real" else round(1 - prob, 4)
-            },
-            "analysis_parameters": {
-                "max_faces_analyzed": max_faces,
-                "seconds_analyzed": seconds_range,
-                "quantum_enhanced": True,
-                "device_used": device
-            },
-            "status": "success"
+            **result,
+            "status": "success",
+            "cache": "miss" if cache_key else "bypass"
         }
         
         return JSONResponse(content=response)
@@ -231,11 +824,11 @@ async def predict_deepfake(
             )
     
     finally:
-        # Cleanup temporary files
+        # Cleanup temporary files (a timeline stream removes them when it ends)
         try:
-            if temp_file_path and os.path.exists(temp_file_path):
+            if not streaming and temp_file_path and os.path.exists(temp_file_path):
                 os.remove(temp_file_path)
-            if os.path.exists(temp_dir):
+            if not streaming and os.path.exists(temp_dir):
                 os.rmdir(temp_dir)
         except Exception as cleanup_error:
             print(f"Warning: Failed to cleanup temporary files: {cleanup_error}")
@@ -244,26 +837,25 @@ async def predict_deepfake(
 async def predict_batch(files: List[UploadFile] = File(...)):
     """
     Analyze multiple videos for deepfake detection
-    """
-    if len(files) > 10:  # Limit batch size
-        raise HTTPException(
-            status_code=400,
-            detail="Too many files. Maximum 10 files per batch."
-        )
     
-    results = []
+    Videos are analysed concurrently (as many at a time as the inference executor
+    allows); with micro-batching their face crops share embedding and quantum head
+    batches. Results are in upload order.
+    """
+    validate_batch_size(files)
     
-    for file in files:
+    async def predict_one(file):
         try:
-            # Call single prediction for each file
-            result = await predict_deepfake(file)
-            results.append(result)
+            response = await predict_deepfake(file)
+            return json.loads(response.body)
         except Exception as e:
-            results.append({
+            return {
                 "filename": file.filename,
-                "error": str(e),
+                "error": getattr(e, "detail", str(e)),
                 "status": "error"
-            })
+            }
+    
+    results = await asyncio.gather(*(predict_one(file) for file in files))
     
     return {
         "batch_results": results,
@@ -279,10 +871,26 @@ class VideoPredictionRequest(BaseModel):
     url: str
     max_faces: int = 20
     seconds_range: int = 6
+    augment: str = AUGMENT_MODE
+    early_exit: str = EARLY_EXIT
+    mode: str = "tail"
+    segment_seconds: float = TIMELINE_SEGMENT_SECONDS
+    faces_per_segment: int = TIMELINE_FACES_PER_SEGMENT
+    segmenter: str = "fixed"
+    stream: str = "ndjson"
+
+class VideoJobRequest(BaseModel):
+    url: str
+    max_faces: int = 20
+    seconds_range: int = 6
+    augment: str = AUGMENT_MODE
+    early_exit: str = EARLY_EXIT
+    callback_url: Optional[str] = None
 
 class ImagePredictionRequest(BaseModel):
     url: str
     max_faces: int = 5
+    augment: str = AUGMENT_MODE
 
 @app.post("/predict/text")
 async def predict_text_authenticity(request: TextPredictionRequest) -> Dict[str, Any]:
@@ -358,7 +966,8 @@ def simple_text_analysis(content: str) -> Dict[str, Any]:
 @app.post("/predict/image")
 async def predict_image_deepfake(
     file: UploadFile = File(...),
-    max_faces: int = 5
+    max_faces: int = 5,
+    augment: str = AUGMENT_MODE
 ) -> Dict[str, Any]:
     """
     Analyze uploaded image for deepfake detection
@@ -366,18 +975,21 @@ async def predict_image_deepfake(
     Args:
         file: Image file (jpg, png, etc.)
         max_faces: Maximum number of faces to analyze (default: 5)
+        augment: Face augmentation - random, none, deterministic or tta:K (default: AUGMENT_MODE)
     
     Returns:
         JSON response with prediction results
     """
     
     # Validate file type
-    if not file.filename.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')):
+    if not file.filename.lower().endswith(IMAGE_EXTENSIONS):
         raise HTTPException(
             status_code=400, 
             detail="Invalid file type. Please upload an image file (jpg, png, etc.)."
         )
     
+    validate_augment(augment)
+    
     # Check if models are loaded
     if not all([scaler, embedder_model]):
         raise HTTPException(
@@ -385,10 +997,10 @@ async def predict_image_deepfake(
             detail="Models not loaded. Please try again later."
         )
     
-    if not TFQ_AVAILABLE or tfq_model is None:
+    if quantum_model is None:
         raise HTTPException(
             status_code=503,
-            detail="TensorFlow Quantum not available. Quantum prediction disabled."
+            detail="Quantum model not loaded. Quantum prediction disabled."
         )
     
     # Create temporary file
@@ -399,35 +1011,38 @@ async def predict_image_deepfake(
         # Save uploaded file temporarily
         temp_file_path = os.path.join(temp_dir, f"temp_image_{file.filename}")
         
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        digest = await run_blocking("io", save_upload, file, temp_file_path)
+        
+        # Same image, parameters and model as an earlier request
+        cache_key = result_cache_key("image", digest, {"max_faces": max_faces, "augment": augment})
+        cached = await cache_lookup(cache_key)
+        if cached is not None:
+            return JSONResponse(content={"filename": file.filename, **cached, "status": "success", "cache": "hit"})
         
         # Run prediction
-        prob, label, faces_found = predict_image_deepfake_single(
+        prob, label, faces_found = await run_blocking(
+            "inference",
+            predict_image_deepfake_single,
             image_path=temp_file_path,
-            model=tfq_model,
+            model=quantum_model,
             scaler=scaler,
             embedder_model=embedder_model,
             n_qubits=8,
             max_faces=max_faces,
-            device=device
+            device=device,
+            embed_batch_size=EMBED_BATCH_SIZE,
+            augment=augment,
+            detect_max_side=DETECT_MAX_SIDE
         )
+        result = image_prediction_response(prob, label, faces_found, max_faces, augment)
+        await cache_store(cache_key, result)
         
         # Prepare response
         response = {
             "filename": file.filename,
-            "prediction": {
-                "label": label,
-                "is_deepfake": label == "fake",
-                "deepfake_probability": round(prob, 4) if label == "real" else round(1 - prob, 4)
-            },
-            "analysis_parameters": {
-                "faces_found": faces_found,
-                "max_faces_analyzed": max_faces,
-                "quantum_enhanced": True,
-                "device_used": device
-            },
-            "status": "success"
+            **result,
+            "status": "success",
+            "cache": "miss" if cache_key else "bypass"
         }
         
         return JSONResponse(content=response)
@@ -471,29 +1086,104 @@ async def predict_image_deepfake(
             print(f"Warning: Failed to cleanup temporary files: {cleanup_error}")
 
 @app.post("/predict/image-batch")
-async def predict_image_batch(files: List[UploadFile] = File(...)):
+async def predict_image_batch(
+    files: List[UploadFile] = File(...),
+    max_faces: int = 5,
+    augment: str = AUGMENT_MODE
+):
     """
     Analyze multiple images for deepfake detection
+    
+    All images are decoded and searched for faces concurrently, then the faces of
+    every image share one embedding and one quantum head batch (see
+    predict_image_deepfake_batch). Results are in upload order, each with the
+    /predict/image schema; images already in the result cache are not re-analysed.
     """
-    if len(files) > 10:  # Limit batch size
+    validate_batch_size(files)
+    validate_augment(augment)
+    
+    # Check if models are loaded
+    if not all([scaler, embedder_model]) or quantum_model is None:
         raise HTTPException(
-            status_code=400,
-            detail="Too many files. Maximum 10 files per batch."
+            status_code=503,
+            detail="Models not loaded. Please try again later."
         )
     
-    results = []
+    results = [None] * len(files)
+    temp_dir = tempfile.mkdtemp()
     
-    for file in files:
-        try:
-            # Call single prediction for each file
-            result = await predict_image_deepfake(file)
-            results.append(result)
-        except Exception as e:
-            results.append({
-                "filename": file.filename,
-                "error": str(e),
-                "status": "error"
-            })
+    try:
+        # Save the valid uploads concurrently (index prefix: filenames may repeat)
+        paths = {}
+        for index, file in enumerate(files):
+            if file.filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths[index] = os.path.join(temp_dir, f"temp_image_{index}_{os.path.basename(file.filename)}")
+            else:
+                results[index] = {
+                    "filename": file.filename,
+                    "error": "Invalid file type. Please upload an image file (jpg, png, etc.).",
+                    "status": "error"
+                }
+        digests = await asyncio.gather(*(run_blocking("io", save_upload, files[index], path) for index, path in paths.items()))
+        
+        # Images (with these parameters and model) answered before
+        cache_keys = {
+            index: result_cache_key("image", digest, {"max_faces": max_faces, "augment": augment})
+            for index, digest in zip(paths, digests)
+        }
+        cached = await asyncio.gather(*(cache_lookup(cache_keys[index]) for index in paths))
+        for index, hit in zip(list(paths), cached):
+            if hit is not None:
+                results[index] = {"filename": files[index].filename, **hit, "status": "success", "cache": "hit"}
+                del paths[index]
+        
+        # Run prediction over all remaining images at once
+        predictions = await run_blocking(
+            "inference",
+            predict_image_deepfake_batch,
+            image_paths=list(paths.values()),
+            model=quantum_model,
+            scaler=scaler,
+            embedder_model=embedder_model,
+            n_qubits=8,
+            max_faces=max_faces,
+            device=device,
+            embed_batch_size=EMBED_BATCH_SIZE,
+            augment=augment,
+            detect_max_side=DETECT_MAX_SIDE,
+            detect_workers=DETECTOR_POOL_SIZE
+        )
+        
+        for index, prediction in zip(paths, predictions):
+            filename = files[index].filename
+            if isinstance(prediction, Exception):
+                error = "No faces detected in the image" if str(prediction) == "no_face_detected" else str(prediction)
+                results[index] = {"filename": filename, "error": error, "status": "error"}
+                continue
+            result = image_prediction_response(*prediction, max_faces, augment)
+            await cache_store(cache_keys[index], result)
+            results[index] = {
+                "filename": filename,
+                **result,
+                "status": "success",
+                "cache": "miss" if cache_keys[index] else "bypass"
+            }
+        
+    except Exception as e:
+        print(f"Error during batch image prediction: {e}")
+        if str(e) == "tfq_unavailable":
+            return JSONResponse(
+                status_code=503,
+                content={"error": "TensorFlow Quantum unavailable", "status": "error"}
+            )
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error during batch prediction: {str(e)}"
+        )
+    
+    finally:
+        # Cleanup temporary files
+        shutil.rmtree(temp_dir, ignore_errors=True)
     
     return {
         "batch_results": results,
@@ -501,8 +1191,15 @@ async def predict_image_batch(files: List[UploadFile] = File(...)):
         "successful_predictions": len([r for r in results if r.get("status") == "success"])
     }
 
-def download_file_from_url(url, temp_dir):
-    """Download file from URL to temporary directory with detailed logging"""
+def save_upload(file, path):
+    """Copy an uploaded file to path and return its SHA-256, hashed on the way (blocking - run on the I/O executor)."""
+    with open(path, "wb") as buffer:
+        hashing = HashingFile(buffer)
+        shutil.copyfileobj(file.file, hashing)
+    return hashing.hexdigest()
+
+def download_file_from_url(url, temp_dir, stats=None):
+    """Download file from URL to temporary directory with detailed logging (bytes and SHA-256 recorded in stats if given)"""
     try:
         logger.info(f"Starting download from URL: {url}")
         start_time = time.time()
@@ -533,7 +1230,8 @@ def download_file_from_url(url, temp_dir):
         
         # Download with progress tracking
         downloaded_bytes = 0
-        with open(temp_file_path, 'wb') as f:
+        with open(temp_file_path, 'wb') as buffer:
+            f = HashingFile(buffer)
             for chunk in response.iter_content(chunk_size=8192):
                 if chunk:
                     f.write(chunk)
@@ -550,6 +1248,13 @@ def download_file_from_url(url, temp_dir):
         logger.info(f"Download time: {download_time:.2f} seconds")
         logger.info(f"Download speed: {file_size_mb / download_time:.2f} MB/s")
         
+        if stats is not None:
+            stats["mode"] = "full"
+            stats["requests"] = stats.get("requests", 0) + 1
+            stats["bytes_transferred"] = stats.get("bytes_transferred", 0) + downloaded_bytes
+            stats["file_size"] = downloaded_bytes
+            stats["download_ms"] = stats.get("download_ms", 0) + round(download_time * 1000, 2)
+            stats["sha256"] = f.hexdigest()
         return temp_file_path
         
     except requests.exceptions.Timeout:
@@ -565,6 +1270,27 @@ def download_file_from_url(url, temp_dir):
         logger.error(f"Unexpected error downloading from {url}: {e}")
         raise Exception(f"Failed to download file from URL: {str(e)}")
 
+def download_video_from_url(url, temp_dir, seconds_range, stats):
+    """Tail-only ranged download of a video when possible (see ranged_download.py), full download otherwise"""
+    if RANGED_DOWNLOAD:
+        from urllib.parse import urlparse
+        temp_file_path = os.path.join(temp_dir, f"downloaded_file{Path(urlparse(url).path).suffix or '.mp4'}")
+        try:
+            return download_video_tail(url, temp_file_path, seconds_range, stats=stats)
+        except TailDownloadUnsupported as e:
+            logger.info(f"Tail-only download not possible ({e}) - downloading the full file")
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Ranged download failed ({e}) - retrying as a full download")
+        except Exception:
+            # Callers only clean up the path they get back
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+            raise
+        # The full download names its file after the Content-Type, so it may not replace the partial one
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+    return download_file_from_url(url, temp_dir, stats=stats)
+
 @app.post("/predict-url")
 async def predict_deepfake_from_url(
     request: VideoPredictionRequest
@@ -579,7 +1305,10 @@ async def predict_deepfake_from_url(
         JSON response with prediction results
     """
     logger.info(f"Video prediction request received for URL: {request.url}")
-    logger.info(f"Parameters - max_faces: {request.max_faces}, seconds_range: {request.seconds_range}")
+    logger.info(f"Parameters - max_faces: {request.max_faces}, seconds_range: {request.seconds_range}, augment: {request.augment}, early_exit: {request.early_exit}")
+    validate_augment(request.augment)
+    validate_early_exit(request.early_exit)
+    validate_timeline(request.mode, request.segmenter, request.stream, request.segment_seconds, request.faces_per_segment)
     
     # Check if models are loaded
     if not all([scaler, embedder_model]):
@@ -589,58 +1318,77 @@ async def predict_deepfake_from_url(
             detail="Models not loaded. Please try again later."
         )
     
-    if not TFQ_AVAILABLE or tfq_model is None:
-        logger.error("TensorFlow Quantum not available or model not loaded")
+    if quantum_model is None:
+        logger.error("Quantum model not loaded")
         raise HTTPException(
             status_code=503,
-            detail="TensorFlow Quantum not available. Quantum prediction disabled."
+            detail="Quantum model not loaded. Quantum prediction disabled."
         )
     
     # Create temporary directory
     temp_dir = tempfile.mkdtemp()
     temp_file_path = None
+    streaming = False
     logger.info(f"Created temporary directory: {temp_dir}")
     
     try:
-        # Download file from URL
+        # Download file from URL (only the analysed tail when the server supports Range requests)
         logger.info("Starting file download...")
-        temp_file_path = download_file_from_url(request.url, temp_dir)
-        logger.info(f"File downloaded successfully to: {temp_file_path}")
+        download_stats = {}
+        if request.mode == "timeline":
+            temp_file_path = await run_blocking("io", download_file_from_url, request.url, temp_dir, stats=download_stats)
+            streaming = True
+            return stream_timeline(
+                temp_file_path, temp_dir, request.url, request.stream,
+                request.segment_seconds, request.faces_per_segment, request.segmenter, request.augment
+            )
+        temp_file_path = await run_blocking("io", download_video_from_url, request.url, temp_dir, request.seconds_range, download_stats)
+        logger.info(f"File downloaded successfully to: {temp_file_path} ({download_stats})")
+        
+        # Same video bytes, parameters and model as an earlier request
+        cache_key = result_cache_key(
+            "video", download_stats.get("sha256"),
+            {
+                "max_faces": request.max_faces,
+                "seconds_range": request.seconds_range,
+                "augment": request.augment,
+                "early_exit": request.early_exit
+            }
+        )
+        cached = await cache_lookup(cache_key)
+        if cached is not None:
+            logger.info("Returning cached video prediction")
+            return JSONResponse(
+                content={"url": request.url, **cached, "download": download_stats, "status": "success", "cache": "hit"}
+            )
         
         # Run prediction
         logger.info("Starting video analysis...")
         analysis_start_time = time.time()
         
-        prob, label = predict_video_consistent(
-            video_path=temp_file_path,
-            model=tfq_model,
-            scaler=scaler,
-            embedder_model=embedder_model,
-            n_qubits=8,
-            max_faces_per_video=request.max_faces,
-            seconds_range=request.seconds_range,
-            device=device
+        video_stats = {}
+        prob, label = await run_blocking(
+            "inference", run_video_prediction, temp_file_path,
+            request.max_faces, request.seconds_range, request.augment, request.early_exit, video_stats
         )
+        record_video_stats(video_stats)
         
         analysis_time = time.time() - analysis_start_time
         logger.info(f"Video analysis completed in {analysis_time:.2f} seconds")
         logger.info(f"Analysis result - probability: {prob:.4f}, label: {label}")
         
+        result = video_prediction_response(
+            prob, label, video_stats, request.max_faces, request.seconds_range, request.augment, request.early_exit
+        )
+        await cache_store(cache_key, result)
+        
         # Prepare response
         response = {
             "url": request.url,
-            "prediction": {
-                "label": label,
-                "is_deepfake": label == "fake",
-                "deepfake_probability": round(prob, 4) if label == "real" else round(1 - prob, 4)
-            },
-            "analysis_parameters": {
-                "max_faces_analyzed": request.max_faces,
-                "seconds_analyzed": request.seconds_range,
-                "quantum_enhanced": True,
-                "device_used": device
-            },
-            "status": "success"
+            **result,
+            "download": download_stats,
+            "status": "success",
+            "cache": "miss" if cache_key else "bypass"
         }
         
         logger.info("Video prediction completed successfully")
@@ -678,12 +1426,12 @@ async def predict_deepfake_from_url(
             )
     
     finally:
-        # Cleanup temporary files
+        # Cleanup temporary files (a timeline stream removes them when it ends)
         try:
-            if temp_file_path and os.path.exists(temp_file_path):
+            if not streaming and temp_file_path and os.path.exists(temp_file_path):
                 os.remove(temp_file_path)
                 logger.info(f"Cleaned up temporary file: {temp_file_path}")
-            if os.path.exists(temp_dir):
+            if not streaming and os.path.exists(temp_dir):
                 os.rmdir(temp_dir)
                 logger.info(f"Cleaned up temporary directory: {temp_dir}")
         except Exception as cleanup_error:
@@ -703,7 +1451,8 @@ async def predict_image_deepfake_from_url(
         JSON response with prediction results
     """
     logger.info(f"Image prediction request received for URL: {request.url}")
-    logger.info(f"Parameters - max_faces: {request.max_faces}")
+    logger.info(f"Parameters - max_faces: {request.max_faces}, augment: {request.augment}")
+    validate_augment(request.augment)
     
     # Check if models are loaded
     if not all([scaler, embedder_model]):
@@ -713,11 +1462,11 @@ async def predict_image_deepfake_from_url(
             detail="Models not loaded. Please try again later."
         )
     
-    if not TFQ_AVAILABLE or tfq_model is None:
-        logger.error("TensorFlow Quantum not available or model not loaded")
+    if quantum_model is None:
+        logger.error("Quantum model not loaded")
         raise HTTPException(
             status_code=503,
-            detail="TensorFlow Quantum not available. Quantum prediction disabled."
+            detail="Quantum model not loaded. Quantum prediction disabled."
         )
     
     # Create temporary directory
@@ -728,42 +1477,50 @@ async def predict_image_deepfake_from_url(
     try:
         # Download file from URL
         logger.info("Starting file download...")
-        temp_file_path = download_file_from_url(request.url, temp_dir)
+        download_stats = {}
+        temp_file_path = await run_blocking("io", download_file_from_url, request.url, temp_dir, stats=download_stats)
         logger.info(f"File downloaded successfully to: {temp_file_path}")
         
+        # Same image bytes, parameters and model as an earlier request
+        cache_key = result_cache_key(
+            "image", download_stats.get("sha256"), {"max_faces": request.max_faces, "augment": request.augment}
+        )
+        cached = await cache_lookup(cache_key)
+        if cached is not None:
+            logger.info("Returning cached image prediction")
+            return JSONResponse(content={"url": request.url, **cached, "status": "success", "cache": "hit"})
+        
         # Run prediction
         logger.info("Starting image analysis...")
         analysis_start_time = time.time()
         
-        prob, label, faces_found = predict_image_deepfake_single(
+        prob, label, faces_found = await run_blocking(
+            "inference",
+            predict_image_deepfake_single,
             image_path=temp_file_path,
-            model=tfq_model,
+            model=quantum_model,
             scaler=scaler,
             embedder_model=embedder_model,
             n_qubits=8,
             max_faces=request.max_faces,
-            device=device
+            device=device,
+            embed_batch_size=EMBED_BATCH_SIZE,
+            augment=request.augment,
+            detect_max_side=DETECT_MAX_SIDE
         )
         
         analysis_time = time.time() - analysis_start_time
         logger.info(f"Image analysis completed in {analysis_time:.2f} seconds")
         logger.info(f"Analysis result - probability: {prob:.4f}, label: {label}, faces_found: {faces_found}")
+        result = image_prediction_response(prob, label, faces_found, request.max_faces, request.augment)
+        await cache_store(cache_key, result)
         
         # Prepare response
         response = {
             "url": request.url,
-            "prediction": {
-                "label": label,
-                "is_deepfake": label == "fake",
-                "deepfake_probability": round(prob, 4) if label == "real" else round(1 - prob, 4)
-            },
-            "analysis_parameters": {
-                "faces_found": faces_found,
-                "max_faces_analyzed": request.max_faces,
-                "quantum_enhanced": True,
-                "device_used": device
-            },
-            "status": "success"
+            **result,
+            "status": "success",
+            "cache": "miss" if cache_key else "bypass"
         }
         
         logger.info("Image prediction completed successfully")
@@ -812,6 +1569,167 @@ async def predict_image_deepfake_from_url(
         except Exception as cleanup_error:
             logger.warning(f"Failed to cleanup temporary files: {cleanup_error}")
 
+# --- Asynchronous video jobs ---
+
+def run_video_job(job_id, kind, params, job_dir, progress):
+    """
+    JobQueue handler: tail-mode analysis of an uploaded video ("upload", stored
+    in job_dir) or of a URL ("url", downloaded into job_dir). Returns the
+    status code and body /predict or /predict-url would have answered with.
+    """
+    source_key = "url" if kind == "url" else "filename"
+    source = params[source_key]
+    download_stats = None
+    
+    try:
+        if kind == "url":
+            progress({"stage": "downloading"})
+            download_stats = {}
+            video_path = download_video_from_url(params["url"], job_dir, params["seconds_range"], download_stats)
+        else:
+            video_path = os.path.join(job_dir, params["stored_as"])
+        
+        progress({"stage": "analysing", "frames_decoded": 0, "faces_embedded": 0, "max_faces": params["max_faces"]})
+        video_stats = {}
+        # Shares the INFERENCE_WORKERS bound with the synchronous endpoints
+        prob, label = run_inference(
+            run_video_prediction,
+            video_path, params["max_faces"], params["seconds_range"], params["augment"], params["early_exit"], video_stats,
+            progress=lambda counts: progress({"stage": "analysing", **counts, "max_faces": params["max_faces"]})
+        )
+        record_video_stats(video_stats)
+    except Exception as e:
+        if str(e) == "no_face_detected":
+            return 422, {"error": "No faces detected in the video", source_key: source, "status": "error"}
+        if str(e) == "tfq_unavailable":
+            return 503, {"error": "TensorFlow Quantum unavailable", source_key: source, "status": "error"}
+        raise
+    
+    response = {
+        source_key: source,
+        **video_prediction_response(
+            prob, label, video_stats, params["max_faces"], params["seconds_range"], params["augment"], params["early_exit"]
+        ),
+        "status": "success"
+    }
+    if download_stats is not None:
+        response["download"] = download_stats
+    return 200, response
+
+def validate_job_request(augment, early_exit, callback_url):
+    """Reject bad job parameters with a 400 and a missing model / queue with a 503."""
+    validate_augment(augment)
+    validate_early_exit(early_exit)
+    if callback_url and not callback_url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail="callback_url must be an http(s) URL")
+    if not all([scaler, embedder_model]) or quantum_model is None or job_queue is None:
+        raise HTTPException(status_code=503, detail="Models not loaded. Please try again later.")
+
+def job_accepted(job_id):
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/jobs/{job_id}",
+            "result_url": f"/jobs/{job_id}/result"
+        }
+    )
+
+@app.post("/jobs/predict")
+async def submit_video_job(
+    file: UploadFile = File(...),
+    max_faces: int = 20,
+    seconds_range: int = 6,
+    augment: str = AUGMENT_MODE,
+    early_exit: str = EARLY_EXIT,
+    callback_url: Optional[str] = None
+):
+    """
+    Queue an uploaded video for analysis and return its job id at once (202).
+    Same parameters as /predict in tail mode; poll /jobs/{job_id} for progress and
+    fetch /jobs/{job_id}/result when done, or pass callback_url to be POSTed
+    {"job_id", "status", "status_code", "result"} on completion.
+    """
+    if not file.filename.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid file type. Please upload a video file (mp4, avi, mov, mkv)."
+        )
+    validate_job_request(augment, early_exit, callback_url)
+    
+    job_id = JobQueue.new_id()
+    stored_as = f"video{Path(file.filename).suffix.lower()}"
+    job_dir = job_queue.job_dir(job_id)
+    try:
+        await run_blocking("io", save_upload, file, os.path.join(job_dir, stored_as))
+        await run_blocking(
+            "io",
+            job_queue.submit,
+            "upload",
+            {
+                "filename": file.filename,
+                "stored_as": stored_as,
+                "max_faces": max_faces,
+                "seconds_range": seconds_range,
+                "augment": augment,
+                "early_exit": early_exit
+            },
+            callback_url=callback_url,
+            job_id=job_id
+        )
+    except Exception:
+        # No job row owns the directory yet
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+    logger.info(f"Queued video job {job_id} for upload {file.filename}")
+    return job_accepted(job_id)
+
+@app.post("/jobs/predict-url")
+async def submit_video_url_job(request: VideoJobRequest):
+    """Queue a video URL for analysis (parameters as /predict-url in tail mode); see /jobs/predict."""
+    validate_job_request(request.augment, request.early_exit, request.callback_url)
+    
+    params = request.dict()
+    callback_url = params.pop("callback_url")
+    job_id = await run_blocking("io", job_queue.submit, "url", params, callback_url=callback_url)
+    logger.info(f"Queued video job {job_id} for URL {request.url}")
+    return job_accepted(job_id)
+
+async def get_job_or_404(job_id):
+    job = await run_blocking("io", job_queue.get, job_id) if job_queue else None
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Job state (queued, running, done or failed) with live progress: stage, frames decoded, faces embedded"""
+    job = await get_job_or_404(job_id)
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "queue_position": job.get("queue_position"),
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "error": job["error"],
+        "callback_status": job["callback_status"],
+        "result_url": f"/jobs/{job_id}/result"
+    }
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """The finished job's response (with the status code the synchronous endpoint would have used), else 202"""
+    job = await get_job_or_404(job_id)
+    if job["status"] in ("queued", "running"):
+        return JSONResponse(status_code=202, content={"job_id": job_id, "status": job["status"], "progress": job["progress"]})
+    return JSONResponse(status_code=job["status_code"], content=job["result"])
+
+# Development server with auto-reload; in production run serve.py (preloaded models, forked workers)
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -2,31 +2,53 @@ import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 import os
-import tensorflow as tf
+import importlib.util
+from functools import lru_cache
 import requests  # Add this import
 import logging
-print(f"TensorFlow version: {tf.__version__}")
+import time
 
 # Configure logging for this module
 logger = logging.getLogger(__name__)
 
 try:
     import cirq
+except ImportError:
+    cirq = None
+
+# TensorFlow and TFQ are imported on first use by the TFQ paths (see _import_tfq): the NumPy
+# quantum head serves without them, and importing this module starts no TensorFlow runtime
+TFQ_AVAILABLE = cirq is not None and importlib.util.find_spec("tensorflow_quantum") is not None
+if not TFQ_AVAILABLE:
+    logger.info("TensorFlow Quantum not installed - only the NumPy quantum head is available")
+
+@lru_cache(maxsize=None)
+def _import_tfq():
+    """(tensorflow, tensorflow_quantum), imported on the first TFQ call."""
+    import tensorflow as tf
     import tensorflow_quantum as tfq
-    TFQ_AVAILABLE = True
-    print("TensorFlow Quantum loaded successfully")
-except ImportError as e:
-    print(f"TensorFlow Quantum not available: {e}")
-    print("Falling back to classical model...")
-    TFQ_AVAILABLE = False
+    logger.info(f"TensorFlow {tf.__version__} and TensorFlow Quantum loaded")
+    return tf, tfq
 
 import joblib
 import torch
 import torchvision.transforms as T
 from facenet_pytorch import InceptionResnetV1
 import random
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 import sympy
 
+from quantum_numpy import NumpyQuantumHead
+from batching import BatchedQuantumHead
+from frame_sampling import iter_sampled_frames, skip_near_duplicates, count_frames, frame_thumbnail, thumbnail_difference
+from video_pipeline import VideoFacePipeline
+from face_tracking import FaceTracker
+from early_exit import SequentialScorer
+from detector_pool import DetectorPool
+from detector_backends import DETECT_MAX_SIDE
+
 def feature_vector_to_circuit_layers(features, qubits):
     circuit = cirq.Circuit()
     n_qubits = len(qubits)
@@ -58,7 +80,128 @@ def batch_features_to_circuits_layers(X, n_qubits=8):
         circuits.append(circuit)
     return circuits, qubits
 
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+def build_encoding_template(n_qubits=8, n_features=512):
+    """
+    Symbolic version of feature_vector_to_circuit_layers: the same RX+CZ
+    layers, with one sympy symbol x_{layer}_{qubit} per feature instead of a
+    fixed angle. Built once and resolved with a batched angle tensor.
+    """
+    qubits = cirq.GridQubit.rect(1, n_qubits)
+    circuit = cirq.Circuit()
+    symbols = []
+    for layer_idx in range(n_features // n_qubits):
+        for i in range(n_qubits):
+            x = sympy.Symbol(f'x_{layer_idx}_{i}')
+            circuit.append(cirq.rx(x)(qubits[i]))
+            symbols.append(x)
+        for i in range(n_qubits - 1):
+            circuit.append(cirq.CZ(qubits[i], qubits[i+1]))
+    return circuit, symbols, qubits
+
+class TFQTemplateHead:
+    """
+    TFQ inference on scaled embeddings without building a cirq circuit per face.
+
+    The encoding template and the trained ansatz are serialized once; each
+    request only feeds the mod-2π angles (plus the fixed thetas) as a float
+    tensor to tfq.layers.Expectation, then applies the trained Dense sigmoid.
+    The forward pass is a tf.function with a fixed [None, n_symbols] input
+    signature, so it is traced once (see warmup_quantum_head) and reused for
+    every batch size.
+    """
+
+    def __init__(self, keras_model, n_qubits=8, n_features=512):
+        tf, tfq = _import_tfq()
+        pqc_layer = next(layer for layer in keras_model.layers if isinstance(layer, tfq.layers.PQC))
+        dense_layer = keras_model.layers[-1]
+        theta_values = {str(name): value for name, value in pqc_layer.symbol_values().items()}
+        n_layers = len(theta_values) // n_qubits
+
+        encoding, enc_symbols, qubits = build_encoding_template(n_qubits, n_features)
+        ansatz, theta_symbols = build_pqc_circuit_layers(qubits, n_layers)
+
+        self.n_qubits = n_qubits
+        self.n_features = n_features
+        self._symbol_names = tf.constant([str(s) for s in enc_symbols + theta_symbols])
+        self._thetas = tf.constant([[float(theta_values[str(s)]) for s in theta_symbols]], dtype=tf.float32)
+        self._circuit = tfq.convert_to_tensor([encoding + ansatz])
+        self._readout = tfq.convert_to_tensor([[cirq.Z(qubits[0])]])
+        self._expectation = tfq.layers.Expectation()
+        kernel, bias = dense_layer.get_weights()
+        self._kernel = tf.constant(kernel, dtype=tf.float32)
+        self._bias = tf.constant(bias, dtype=tf.float32)
+        self._forward = tf.function(
+            self._forward_graph,
+            input_signature=[tf.TensorSpec(shape=[None, len(enc_symbols) + len(theta_symbols)], dtype=tf.float32)]
+        )
+
+    def encode_angles(self, X_scaled):
+        """Scaled features -> (B, n_symbols) float32 symbol values."""
+        tf, _ = _import_tfq()
+        angles = np.mod(np.asarray(X_scaled, dtype=np.float64)[:, :self.n_features], 2 * np.pi)
+        thetas = tf.tile(self._thetas, [angles.shape[0], 1])
+        return tf.concat([tf.constant(angles, dtype=tf.float32), thetas], axis=1)
+
+    def _forward_graph(self, values):
+        tf, _ = _import_tfq()
+        batch = tf.shape(values)[0]
+        z = self._expectation(
+            tf.tile(self._circuit, [batch]),
+            symbol_names=self._symbol_names,
+            symbol_values=values,
+            operators=tf.tile(self._readout, [batch, 1])
+        )
+        return tf.sigmoid(tf.matmul(z, self._kernel) + self._bias)
+
+    def predict(self, X_scaled):
+        """Sigmoid probabilities, shape (B, 1) like the Keras model output."""
+        return self._forward(self.encode_angles(X_scaled)).numpy()
+
+def requires_tfq(model):
+    """True for the raw Keras/TFQ model; heads taking scaled features run without it."""
+    return not isinstance(model, (NumpyQuantumHead, TFQTemplateHead, BatchedQuantumHead))
+
+def predict_quantum_probs(model, X_scaled, n_qubits=8):
+    """
+    Run the quantum head on scaled embeddings and return one probability per face.
+    Accepts the TFQ Keras model, a TFQTemplateHead, a NumpyQuantumHead (no TFQ
+    needed) or a BatchedQuantumHead wrapping either head.
+    """
+    if not requires_tfq(model):
+        return model.predict(X_scaled).flatten()
+
+    if not TFQ_AVAILABLE:
+        logger.error("TensorFlow Quantum not available")
+        raise Exception("tfq_unavailable")
+
+    _, tfq = _import_tfq()
+    circuits, _ = batch_features_to_circuits_layers(X_scaled, n_qubits)
+    tfq_tensor = tfq.convert_to_tensor(circuits)
+    return model.predict(tfq_tensor, verbose=0).flatten()
+
+def warmup_quantum_head(model, n_features=512, batch_size=20, repeats=3):
+    """
+    Run the quantum head on a dummy batch so tracing and first-call setup
+    happen at startup instead of on a user's request.
+    Returns (first_call_ms, steady_state_ms).
+    """
+    dummy = np.zeros((batch_size, n_features), dtype=np.float64)
+    start = time.perf_counter()
+    predict_quantum_probs(model, dummy)
+    first_ms = (time.perf_counter() - start) * 1000
+
+    steady_ms = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict_quantum_probs(model, dummy)
+        steady_ms = min(steady_ms, (time.perf_counter() - start) * 1000)
+
+    logger.info(f"Quantum head warm-up (batch {batch_size}) - first call: {first_ms:.1f} ms, steady state: {steady_ms:.1f} ms")
+    return first_ms, steady_ms
+
+# Detector backends (Haar cascade + CLAHE by default, see detector_backends) are not
+# safe to share between threads, so detection checks one out of this pool per call
+face_detectors = DetectorPool()
 
 def get_facenet_feature_extractor():
     """Load pretrained FaceNet model (512-D embeddings)."""
@@ -73,19 +216,65 @@ facenet_transform = T.Compose([
     T.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
 ])
 
+def facenet_preprocess_batch(face_crops, size=160):
+    """
+    Vectorized equivalent of facenet_transform for a list of HxWx3 crops.
+
+    Crops are resized with cv2 one axis at a time (INTER_AREA when that axis
+    shrinks, like PIL's antialiased bilinear; INTER_LINEAR when it grows)
+    into one preallocated (N,3,size,size) float32 buffer, normalized to
+    [-1, 1] in place and shared with torch via torch.from_numpy.
+    Channel order is left as is: facenet_transform never swapped cv2's BGR
+    to RGB, and the scaler / quantum head were trained on that.
+    Matches facenet_transform within 1-3 uint8 steps per pixel.
+    """
+    batch = np.empty((len(face_crops), 3, size, size), dtype=np.float32)
+    for i, face in enumerate(face_crops):
+        if face.dtype != np.uint8:
+            # ToPILImage truncates float [0,1] images to uint8 the same way
+            face = (face * 255).astype(np.uint8)
+        h, w = face.shape[:2]
+        resized = cv2.resize(face, (size, h), interpolation=cv2.INTER_AREA if w > size else cv2.INTER_LINEAR)
+        resized = cv2.resize(resized, (size, size), interpolation=cv2.INTER_AREA if h > size else cv2.INTER_LINEAR)
+        batch[i] = resized.transpose(2, 0, 1)
+    batch *= 2.0 / 255.0
+    batch -= 1.0
+    return torch.from_numpy(batch)
+
+def embed_faces(face_crops, embedder_model, device="cpu", max_batch=32):
+    """
+    Embed a list of (augmented) face crops with batched FaceNet passes.
+    Crops are stacked into one tensor and run in chunks of max_batch.
+    Returns an (N, 512) float32 array in the order of face_crops.
+    """
+    if not face_crops:
+        return np.empty((0, 512), dtype=np.float32)
+
+    faces_t = facenet_preprocess_batch(face_crops)
+    feats = []
+    with torch.no_grad():
+        for start in range(0, len(faces_t), max_batch):
+            chunk = faces_t[start:start + max_batch].to(device)
+            feats.append(embedder_model(chunk).cpu().numpy())
+    return np.concatenate(feats).reshape(len(face_crops), -1)
+
 def preprocess_face_color(face, brightness=10, contrast=1.2):
     """Keep face in color, enhance brightness/contrast only."""
     adjusted = cv2.convertScaleAbs(face, alpha=contrast, beta=brightness)
     return adjusted
 
+def jpeg_round_trip(image, quality=30):
+    """JPEG encode/decode pass of augment_face; returns float32 in [0, 1]."""
+    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+    _, enc_img = cv2.imencode('.jpg', (image * 255).astype("uint8"), encode_param)
+    return cv2.imdecode(enc_img, 1).astype("float32") / 255.0
+
 def augment_face(image):
     """Deepfake-specific augmentation: compression artifacts, blur, color shift, warping."""
     aug = image.copy()
 
     # --- 1. JPEG Compression Artifacts ---
-    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY),30]
-    _, enc_img = cv2.imencode('.jpg', (aug * 255).astype("uint8"), encode_param)
-    aug = cv2.imdecode(enc_img, 1).astype("float32") / 255.0
+    aug = jpeg_round_trip(aug)
 
     # --- 2. Slight Random Blur OR Sharpen ---
     if random.random() < 0.3:
@@ -116,28 +305,96 @@ def augment_face(image):
 
     return aug
 
+# Inference-time augmentation per request: "random" (augment_face, the original
+# behaviour), "none", "deterministic" (JPEG-30 pass only) or "tta:K"
+AUGMENT_MODES = ("random", "none", "deterministic", "tta")
+
+def parse_augment_mode(spec, max_k=None):
+    """Parse an augment spec ("random", "none", "deterministic", "tta:K") into (mode, views_per_face)."""
+    mode, _, k = str(spec).strip().lower().partition(":")
+    if mode not in AUGMENT_MODES or (mode == "tta") != bool(k):
+        raise ValueError(f"Unknown augment mode {spec!r}, expected one of random, none, deterministic, tta:K")
+    if mode != "tta":
+        return mode, 1
+    if not k.isdigit() or int(k) < 1 or (max_k is not None and int(k) > max_k):
+        limit = f" <= {max_k}" if max_k is not None else ""
+        raise ValueError(f"Invalid TTA view count in {spec!r}, expected 1 <= K{limit}")
+    return mode, int(k)
+
+def tta_augment_face(image, k, seed=0):
+    """
+    K augment_face-style views of one crop in a single vectorized pass.
+
+    The JPEG pass and each blur/sharpen filter run at most once per crop,
+    the color jitter of all K views is one stacked HSV round trip, and all
+    random draws come from a seeded generator so the views are reproducible.
+    Returns a (K,H,W,3) float32 array in [0, 1].
+    """
+    rng = np.random.default_rng(seed)
+    base = jpeg_round_trip(image)
+    rows, cols = base.shape[:2]
+
+    # --- Blur OR sharpen, same odds as augment_face: 0 none, 3/5 blur, -1 sharpen ---
+    blur = rng.random(k) < 0.3
+    sharpen = ~blur & (rng.random(k) < 0.3)
+    choice = np.where(blur, rng.choice([3, 5], size=k), np.where(sharpen, -1, 0))
+    filtered = {0: base}
+    for c in set(choice.tolist()) - {0}:
+        if c == -1:
+            kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
+            filtered[c] = cv2.filter2D(base, -1, kernel)
+        else:
+            filtered[c] = cv2.GaussianBlur(base, (c, c), 0)
+    views = np.stack([filtered[c] for c in choice.tolist()])
+
+    # --- Color jitter, views stacked along rows for one cvtColor call each way ---
+    hsv = cv2.cvtColor((views * 255).astype("uint8").reshape(k * rows, cols, 3), cv2.COLOR_BGR2HSV)
+    hsv = hsv.astype("float32").reshape(k, rows, cols, 3)
+    hsv[..., 0] += rng.uniform(-5, 5, size=(k, 1, 1))
+    hsv[..., 1] *= rng.uniform(0.9, 1.1, size=(k, 1, 1))
+    hsv = np.clip(hsv, 0, 255).astype("uint8").reshape(k * rows, cols, 3)
+    views = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR).astype("float32").reshape(k, rows, cols, 3) / 255.0
+
+    # --- Small affine warp on ~30% of the views ---
+    warp = rng.random(k) < 0.3
+    offsets = rng.uniform(-5, 5, size=(k, 3, 2)).astype(np.float32)
+    pts1 = np.float32([[0, 0], [cols-1, 0], [0, rows-1]])
+    for i in np.flatnonzero(warp):
+        M = cv2.getAffineTransform(pts1, pts1 + offsets[i])
+        views[i] = cv2.warpAffine(views[i], M, (cols, rows), borderMode=cv2.BORDER_REFLECT_101)
+
+    return views
+
+def augment_face_crops(face_crops, augment="random", seed=0):
+    """
+    Apply the per-request augmentation to raw face crops.
+    Returns (crops, views_per_face); with tta:K each face contributes K
+    consecutive crops whose probabilities are averaged afterwards.
+    """
+    mode, k = parse_augment_mode(augment)
+    if mode == "none":
+        return list(face_crops), 1
+    if mode == "deterministic":
+        return [jpeg_round_trip(face) for face in face_crops], 1
+    if mode == "tta":
+        return [view for face in face_crops for view in tta_augment_face(face, k, seed)], k
+    return [augment_face(face) for face in face_crops], 1
+
 
 
 # -------------------
 # Face detection (upper-half)
 # -------------------
-def detect_faces_upper_half(frame):
-    """Detect faces only in the upper half of the frame."""
+def detect_faces_upper_half(frame, detector=None, max_side=DETECT_MAX_SIDE):
+    """Detect faces only in the upper half of the frame (checking a detector out of face_detectors unless one is given)."""
+    if detector is None:
+        with face_detectors.checkout() as detector:
+            return detect_faces_upper_half(frame, detector, max_side)
+
     h, w = frame.shape[:2]
     upper_half = frame[0:h//2, :]
-    gray = cv2.cvtColor(upper_half, cv2.COLOR_BGR2GRAY)
-
-    clahe = cv2.createCLAHE(clipLimit=2.5, tileGridSize=(8, 8))
-    gray = clahe.apply(gray)
-    gray = cv2.GaussianBlur(gray, (3, 3), 0)
-
-    faces = face_cascade.detectMultiScale(
-        gray,
-        scaleFactor=1.05,
-        minNeighbors=7,
-        minSize=(80, 80),
-        flags=cv2.CASCADE_SCALE_IMAGE
-    )
+
+    faces = detector.detect(upper_half, max_side=max_side)
 
     if len(faces) == 0:
         return []
@@ -167,16 +424,49 @@ def predict_video_consistent(
     n_qubits=8,
     max_faces_per_video=5,
     seconds_range=6,
-    device="cpu"
+    device="cpu",
+    embed_batch_size=32,
+    augment="random",
+    frame_sampler="grab",
+    detect_workers=0,
+    embed_workers=1,
+    pipeline_queue_size=16,
+    detect_max_side=DETECT_MAX_SIDE,
+    track_faces=False,
+    redetect_every=5,
+    early_exit="off",
+    early_exit_delta=0.05,
+    early_exit_batch=4,
+    dedup_threshold=0.0,
+    progress=None,
+    stats=None
 ):
     """
     Predict deepfake probability for a video using FaceNet embeddings + TFQ layered encoding.
-    Matches training encoding exactly.
+    Matches training encoding exactly. Face crops are collected first and embedded
+    together in batches of embed_batch_size. augment is one of "random", "none",
+    "deterministic" or "tta:K" (see augment_face_crops); frame_sampler is one of
+    "seek", "grab" or "keyframes" (see frame_sampling.py).
+    With detect_workers > 0, decoding, detection and embedding run as a
+    threaded pipeline (see video_pipeline.py) instead of one loop.
+    Face detection runs at detect_max_side (see detector_backends.FaceDetector.detect),
+    on detectors checked out of a DetectorPool. With track_faces, detected faces are followed by template matching and full
+    detection reruns every redetect_every frames or when tracking is lost
+    (see face_tracking.py). With early_exit ("hoeffding" or "normal"), faces
+    are scored in batches of early_exit_batch as they arrive and collection
+    stops once the label is unlikely to change at level early_exit_delta
+    (see early_exit.py). With dedup_threshold > 0, sampled frames too similar
+    to the last accepted one are skipped before detection (see
+    frame_sampling.skip_near_duplicates). If a stats dict is given it is
+    filled with per-video counters (frames sampled, skipped as near
+    duplicates, detections run, frames tracked, faces used). progress, if
+    given, is called with {"frames_decoded", "faces_embedded"} as the video
+    is analysed, possibly from pipeline threads.
     """
     logger.info(f"Starting video analysis for: {video_path}")
-    logger.info(f"Parameters - max_faces: {max_faces_per_video}, seconds_range: {seconds_range}, device: {device}")
+    logger.info(f"Parameters - max_faces: {max_faces_per_video}, seconds_range: {seconds_range}, device: {device}, augment: {augment}")
     
-    if not TFQ_AVAILABLE:
+    if not TFQ_AVAILABLE and requires_tfq(model):
         logger.error("TensorFlow Quantum not available")
         raise Exception("tfq_unavailable")
     
@@ -195,22 +485,81 @@ def predict_video_consistent(
     end_frame = frame_count
     step = max(1, int((end_frame - start_frame) / (max_faces_per_video * 2)))
     
-    logger.info(f"Analysis range - frames {start_frame} to {end_frame}, step: {step}")
+    logger.info(f"Analysis range - frames {start_frame} to {end_frame}, step: {step}, sampler: {frame_sampler}")
 
-    face_embeddings = []
-    faces_collected = 0
+    frames = iter_sampled_frames(video_path, cap, start_frame, end_frame, step, frame_sampler)
+    stats = {} if stats is None else stats
+    gate_stats = {}
+    progress_counts = {"frames_decoded": 0, "faces_embedded": 0}
+    progress_lock = threading.Lock()
 
-    with torch.no_grad():
-        for frame_no in range(start_frame, end_frame, step):
+    def report(key, n):
+        with progress_lock:
+            progress_counts[key] += n
+            snapshot = dict(progress_counts)
+        progress(snapshot)
+
+    if progress is not None:
+        frames = count_frames(frames, lambda: report("frames_decoded", 1))
+    if dedup_threshold > 0:
+        frames = skip_near_duplicates(frames, dedup_threshold, gate_stats)
+    trackers = []
+    scorer = SequentialScorer(max_faces_per_video, early_exit, early_exit_delta) if early_exit != "off" else None
+    chunk_size = early_exit_batch if scorer else embed_batch_size
+    stopped_early = False
+
+    def make_detector():
+        # Each call checks a detector out of face_detectors, so workers never share a cascade
+        detect = partial(detect_faces_upper_half, max_side=detect_max_side)
+        if track_faces:
+            detect = FaceTracker(detect, redetect_every=redetect_every)
+            trackers.append(detect)
+        return detect
+
+    def score_chunk(crops):
+        """Augment, embed and score face crops - one probability per face."""
+        n_faces = len(crops)
+        crops, views_per_face = augment_face_crops(crops, augment)
+        face_embeddings = embed_faces(crops, embedder_model, device=device, max_batch=embed_batch_size)
+        if progress is not None:
+            report("faces_embedded", n_faces)
+        return _face_probs(face_embeddings, views_per_face, model, scaler, n_qubits)
+
+    def decided(chunk_probs):
+        scorer.add(chunk_probs)
+        return scorer.decided()
+
+    if detect_workers > 0:
+        if track_faces and detect_workers > 1:
+            # Tracking follows frames in order, so it needs a single detector stage
+            logger.info("Face tracking enabled - using one detector worker")
+        pipeline = VideoFacePipeline(
+            detector_factory=make_detector,
+            embed_fn=score_chunk,
+            detect_workers=1 if track_faces else detect_workers,
+            embed_workers=embed_workers,
+            queue_size=pipeline_queue_size,
+            embed_chunk=chunk_size
+        )
+        probs, faces_collected, pipeline_stats = pipeline.run(frames, max_faces_per_video, stop_when=decided if scorer else None)
+        cap.release()
+        stopped_early = pipeline_stats["stopped_early"] and faces_collected < max_faces_per_video
+        _detection_stats(stats, pipeline_stats["frames_detected"], trackers)
+        logger.info(f"Pipeline finished - {faces_collected} faces, stats: {pipeline_stats}, detection: {stats}")
+    else:
+        face_crops = []
+        prob_chunks = []
+        faces_collected = 0
+        faces_scored = 0
+        frames_sampled = 0
+        detect = make_detector()
+
+        for frame_no, frame in frames:
             if faces_collected >= max_faces_per_video:
                 break
 
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_no)
-            ret, frame = cap.read()
-            if not ret:
-                continue
-
-            faces = detect_faces_upper_half(frame)
+            faces = detect(frame)
+            frames_sampled += 1
             if len(faces) > 0:
                 logger.debug(f"Found {len(faces)} face(s) in frame {frame_no}")
                 
@@ -219,36 +568,208 @@ def predict_video_consistent(
                 if face_crop.size == 0:
                     continue
 
-                # --- Face augmentation ---
-                face_aug = augment_face(face_crop)
-
-                # --- FaceNet embedding ---
-                face_t = facenet_transform(face_aug).unsqueeze(0).to(device)
-                feat = embedder_model(face_t)
-                feat = feat.view(-1).cpu().numpy()  # shape (512,)
-                face_embeddings.append(feat)
+                face_crops.append(face_crop)
                 faces_collected += 1
                 
-                logger.debug(f"Processed face {faces_collected}/{max_faces_per_video}")
+                logger.debug(f"Collected face {faces_collected}/{max_faces_per_video}")
 
                 if faces_collected >= max_faces_per_video:
                     break
 
-    cap.release()
-    logger.info(f"Face extraction completed - collected {faces_collected} faces")
+            # --- Incremental scoring: stop once more faces cannot change the label ---
+            if scorer and faces_collected - faces_scored >= chunk_size:
+                prob_chunks.append(score_chunk(face_crops[faces_scored:]))
+                faces_scored = faces_collected
+                if decided(prob_chunks[-1]):
+                    stopped_early = faces_collected < max_faces_per_video
+                    break
+
+        cap.release()
+        _detection_stats(stats, frames_sampled, trackers)
+        logger.info(f"Face extraction completed - collected {faces_collected} faces, detection: {stats}")
+
+        # --- Augmentation, FaceNet embedding and scoring of the remaining faces (batched) ---
+        if faces_scored < faces_collected:
+            prob_chunks.append(score_chunk(face_crops[faces_scored:]))
+        probs = np.concatenate(prob_chunks) if prob_chunks else np.empty(0)
 
-    if not face_embeddings:
+    if faces_collected == 0:
         logger.warning("No faces detected in video")
         raise Exception("no_face_detected")
 
-    logger.info("Scaling features and preparing quantum circuits...")
-    X_scaled = scaler.transform(face_embeddings)
+    if dedup_threshold > 0:
+        stats["frames_skipped"] = gate_stats["frames_skipped"]
+        stats["skipped_share"] = round(gate_stats["frames_skipped"] / max(gate_stats["frames_gated"], 1), 4)
+    stats["faces_used"] = int(len(probs))
+    stats["early_exit"] = early_exit
+    stats["stopped_early"] = stopped_early
+    if stopped_early:
+        logger.info(f"Early exit ({early_exit}) after {len(probs)}/{max_faces_per_video} faces")
 
-    circuits, _ = batch_features_to_circuits_layers(X_scaled, n_qubits)
-    tfq_tensor = tfq.convert_to_tensor(circuits)
+    return _decide(probs)
+
+# Timeline windows: fixed length, or cut early at scene changes
+TIMELINE_SEGMENTERS = ("fixed", "scene")
+# Thumbnail difference (0-255, see frame_sampling.thumbnail_difference) between
+# consecutive sampled frames treated as a cut; scene segments last at least MIN_SCENE_SECONDS
+SCENE_CUT_THRESHOLD = 30.0
+MIN_SCENE_SECONDS = 1.0
 
-    logger.info("Running quantum model prediction...")
-    probs = model.predict(tfq_tensor, verbose=0).flatten()
+def predict_video_timeline(
+    video_path,
+    model,
+    scaler,
+    embedder_model,
+    n_qubits=8,
+    segment_seconds=10,
+    faces_per_segment=5,
+    segmenter="fixed",
+    device="cpu",
+    embed_batch_size=32,
+    augment="random",
+    frame_sampler="grab",
+    detect_max_side=DETECT_MAX_SIDE,
+    track_faces=False,
+    redetect_every=5,
+    dedup_threshold=0.0,
+    scene_threshold=SCENE_CUT_THRESHOLD,
+    stats=None
+):
+    """
+    Whole-video analysis, yielding one result per segment as soon as it is scored.
+
+    Segments are windows of segment_seconds ("fixed") or windows cut early at
+    scene changes, but never shorter than MIN_SCENE_SECONDS ("scene").
+    Frames are decoded in one forward pass (frame_sampler over the whole video). Up to
+    faces_per_segment faces per segment go through the same detect / augment /
+    embed / quantum steps as predict_video_consistent. Only the open segment's
+    crops are held, so memory does not grow with video length.
+
+    Each result is a dict with segment, start_s, end_s, frames_sampled,
+    faces_used, probability and label (both None when no face was found).
+    If a stats dict is given it is filled with the detection counters of
+    predict_video_consistent plus segments.
+    """
+    if segmenter not in TIMELINE_SEGMENTERS:
+        raise ValueError(f"Unknown segmenter {segmenter!r}, expected one of {TIMELINE_SEGMENTERS}")
+    if not TFQ_AVAILABLE and requires_tfq(model):
+        logger.error("TensorFlow Quantum not available")
+        raise Exception("tfq_unavailable")
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        logger.error(f"Could not open video file: {video_path}")
+        raise Exception("Could not open video file")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    segment_frames = max(1, int(round(segment_seconds * fps)))
+    min_scene_frames = max(1, int(round(MIN_SCENE_SECONDS * fps)))
+    step = max(1, int(segment_frames / (faces_per_segment * 2)))
+    logger.info(f"Timeline analysis - {frame_count} frames at {fps:.2f} fps, {segmenter} segments of {segment_frames} frames, step: {step}")
+
+    frames = iter_sampled_frames(video_path, cap, 0, frame_count, step, frame_sampler)
+    stats = {} if stats is None else stats
+    gate_stats = {}
+    if dedup_threshold > 0:
+        frames = skip_near_duplicates(frames, dedup_threshold, gate_stats)
+    detect = partial(detect_faces_upper_half, max_side=detect_max_side)
+    trackers = []
+    if track_faces:
+        detect = FaceTracker(detect, redetect_every=redetect_every)
+        trackers.append(detect)
+
+    def close_segment(index, start_frame, end_frame, crops, frames_sampled):
+        result = {
+            "segment": index,
+            "start_s": round(start_frame / fps, 3),
+            "end_s": round(end_frame / fps, 3),
+            "frames_sampled": frames_sampled,
+            "faces_used": len(crops),
+            "probability": None,
+            "label": None
+        }
+        if crops:
+            crops, views_per_face = augment_face_crops(crops, augment)
+            face_embeddings = embed_faces(crops, embedder_model, device=device, max_batch=embed_batch_size)
+            prob, label = _decide(_face_probs(face_embeddings, views_per_face, model, scaler, n_qubits))
+            result.update(probability=round(prob, 4), label=label)
+        logger.info(f"Segment {index} ({result['start_s']}-{result['end_s']} s): {result['faces_used']} faces, label: {result['label']}")
+        return result
+
+    index, segment_start, crops, segment_sampled = 0, 0, [], 0
+    frames_sampled, last_thumb = 0, None
+    try:
+        for frame_no, frame in frames:
+            if segmenter == "scene":
+                thumb = frame_thumbnail(frame)
+                cut = last_thumb is not None and thumbnail_difference(thumb, last_thumb) > scene_threshold
+                last_thumb = thumb
+                boundary = (cut and frame_no - segment_start >= min_scene_frames) or frame_no - segment_start >= segment_frames
+                next_start = frame_no
+            else:
+                boundary = frame_no - segment_start >= segment_frames
+                next_start = frame_no // segment_frames * segment_frames
+            if boundary:
+                end = next_start if segmenter == "scene" else segment_start + segment_frames
+                yield close_segment(index, segment_start, end, crops, segment_sampled)
+                index, crops, segment_sampled = index + 1, [], 0
+                # Fixed windows without a sampled frame are still reported
+                while end < next_start:
+                    yield close_segment(index, end, end + segment_frames, [], 0)
+                    index, end = index + 1, end + segment_frames
+                segment_start = next_start
+
+            if len(crops) >= faces_per_segment:
+                continue
+            faces = detect(frame)
+            frames_sampled += 1
+            segment_sampled += 1
+            for (x, y, w, h) in faces[:faces_per_segment - len(crops)]:
+                face_crop = frame[y:y+h, x:x+w]
+                if face_crop.size:
+                    crops.append(face_crop)
+
+        end = frame_count if segmenter == "scene" else min(segment_start + segment_frames, frame_count)
+        yield close_segment(index, segment_start, end, crops, segment_sampled)
+        index += 1
+        while end < frame_count:
+            yield close_segment(index, end, min(end + segment_frames, frame_count), [], 0)
+            index, end = index + 1, end + segment_frames
+    finally:
+        close = getattr(frames, "close", None)
+        if close:
+            close()
+        cap.release()
+        _detection_stats(stats, frames_sampled, trackers)
+        if dedup_threshold > 0:
+            stats["frames_skipped"] = gate_stats["frames_skipped"]
+            stats["skipped_share"] = round(gate_stats["frames_skipped"] / max(gate_stats["frames_gated"], 1), 4)
+        stats["segments"] = index
+
+def _detection_stats(stats, frames_sampled, trackers):
+    """Detections run vs frames tracked for one video."""
+    stats["frames_sampled"] = frames_sampled
+    if trackers:
+        stats["detections_run"] = sum(t.stats["detections_run"] for t in trackers)
+        stats["frames_tracked"] = sum(t.stats["frames_tracked"] for t in trackers)
+        stats["track_lost"] = sum(t.stats["track_lost"] for t in trackers)
+    else:
+        stats["detections_run"] = frames_sampled
+        stats["frames_tracked"] = 0
+
+def _face_probs(face_embeddings, views_per_face, model, scaler, n_qubits=8):
+    """Quantum head probability per face (TTA views averaged)."""
+    logger.info("Scaling features and running quantum model prediction...")
+    X_scaled = scaler.transform(face_embeddings)
+    probs = predict_quantum_probs(model, X_scaled, n_qubits)
+    if views_per_face > 1:
+        # TTA: one probability per face, averaged over its views
+        probs = probs.reshape(-1, views_per_face).mean(axis=1)
+    return probs
+
+def _decide(probs):
+    """Average probability and label for the faces of one video or image."""
     logger.info(f"Probabilities per face: {probs}")
     avg_prob = float(np.mean(probs))
 
@@ -287,6 +808,7 @@ def create_tfq_model_layers(n_qubits=8, n_layers=64, learning_rate=1e-3):
     """
     Rebuild the same architecture as in training (for inference).
     """
+    tf, tfq = _import_tfq()
     # Qubit layout
     qubits = [cirq.GridQubit(0, i) for i in range(n_qubits)]
     pqc_circuit, symbols = build_pqc_circuit_layers(qubits, n_layers)
@@ -312,24 +834,28 @@ def create_tfq_model_layers(n_qubits=8, n_layers=64, learning_rate=1e-3):
     )
     return model
 
-try:
-    scaler = joblib.load("/Users/arunkaul/Desktop/MyFiles/Entangl/python-backend/scaler.joblib")
-    embedder_model = get_facenet_feature_extractor().to(device)
-    
-    if TFQ_AVAILABLE:
-        model = create_tfq_model_layers(n_qubits=8, n_layers=12, learning_rate=1e-3)
-        model.load_weights("/Users/arunkaul/Desktop/MyFiles/Entangl/python-backend/tfq_face_layers_weights.h5")
-        print("TFQ model loaded successfully")
-    else:
-        model = None
-        print("Skipping TFQ model loading due to compatibility issues")
-    
-    print("Models loaded successfully")
-except Exception as e:
-    print(f"Error loading models: {e}")
-    if TFQ_AVAILABLE:
-        print("Try installing compatible versions: pip install tensorflow==2.8.0 tensorflow-quantum==0.7.2")
-    exit(1)
+# Model files
+SCALER_PATH = "/Users/arunkaul/Desktop/MyFiles/Entangl/python-backend/scaler.joblib"
+QUANTUM_WEIGHTS_PATH = "/Users/arunkaul/Desktop/MyFiles/Entangl/python-backend/tfq_face_layers_weights.h5"
+
+def load_scaler(path=SCALER_PATH):
+    """Feature scaler fitted on the FaceNet embeddings the quantum head was trained on."""
+    return joblib.load(path)
+
+def load_quantum_head(weights_path=QUANTUM_WEIGHTS_PATH, use_tfq=False, artifact=None, n_qubits=8, n_layers=12):
+    """
+    Trained quantum head: a TFQTemplateHead over the Keras weights when
+    use_tfq and TensorFlow Quantum is installed, otherwise the NumPy
+    statevector head (from the exported artifact when it exists). Called
+    from main.load_models; importing this module loads no models.
+    """
+    if use_tfq and TFQ_AVAILABLE:
+        keras_model = create_tfq_model_layers(n_qubits=n_qubits, n_layers=n_layers, learning_rate=1e-3)
+        keras_model.load_weights(weights_path)
+        return TFQTemplateHead(keras_model, n_qubits=n_qubits)
+    if artifact and os.path.exists(artifact):
+        return NumpyQuantumHead.from_npz(artifact)
+    return NumpyQuantumHead.from_h5(weights_path, n_qubits=n_qubits, n_layers=n_layers)
 
 """if TFQ_AVAILABLE and model is not None:
     video_path = "/Users/arunkaul/Desktop/MyFiles/Entangl/python-backend/01__hugging_happy.mp4"
@@ -349,22 +875,10 @@ except Exception as e:
 else:
     print("Cannot run prediction without TensorFlow Quantum. Please fix compatibility issues.")"""
 
-def detect_faces_in_image(image):
-    """Detect faces in a single image."""
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # Apply CLAHE and blur for better detection
-    clahe = cv2.createCLAHE(clipLimit=2.5, tileGridSize=(8, 8))
-    gray = clahe.apply(gray)
-    gray = cv2.GaussianBlur(gray, (3, 3), 0)
-    
-    faces = face_cascade.detectMultiScale(
-        gray,
-        scaleFactor=1.05,
-        minNeighbors=7,
-        minSize=(80, 80),
-        flags=cv2.CASCADE_SCALE_IMAGE
-    )
+def detect_faces_in_image(image, max_side=DETECT_MAX_SIDE):
+    """Detect faces in a single image (downscaled to max_side for detection, see detector_backends.FaceDetector)."""
+    with face_detectors.checkout() as detector:
+        faces = detector.detect(image, max_side=max_side)
     
     if len(faces) == 0:
         return []
@@ -373,25 +887,11 @@ def detect_faces_in_image(image):
     faces_sorted = sorted(faces, key=lambda face: face[2] * face[3], reverse=True)
     return faces_sorted
 
-def predict_image_deepfake_single(
-    image_path,
-    model,
-    scaler,
-    embedder_model,
-    n_qubits=8,
-    max_faces=5,
-    device="cpu"
-):
+def extract_image_faces(image_path, max_faces=5, detect_max_side=DETECT_MAX_SIDE):
     """
-    Predict deepfake probability for a single image using FaceNet embeddings + TFQ layered encoding.
+    Load an image and crop its largest faces (at most max_faces).
+    Raises Exception("no_face_detected") when there are none.
     """
-    logger.info(f"Starting image analysis for: {image_path}")
-    logger.info(f"Parameters - max_faces: {max_faces}, device: {device}")
-    
-    if not TFQ_AVAILABLE:
-        logger.error("TensorFlow Quantum not available")
-        raise Exception("tfq_unavailable")
-    
     # Load image
     image = cv2.imread(image_path)
     if image is None:
@@ -402,7 +902,7 @@ def predict_image_deepfake_single(
     
     # Detect faces
     logger.info("Detecting faces in image...")
-    faces = detect_faces_in_image(image)
+    faces = detect_faces_in_image(image, max_side=detect_max_side)
     
     if not faces:
         logger.warning("No faces detected in image")
@@ -410,50 +910,125 @@ def predict_image_deepfake_single(
     
     logger.info(f"Found {len(faces)} face(s) in image")
     
-    face_embeddings = []
-    faces_processed = 0
+    face_crops = []
     
-    with torch.no_grad():
-        for i, (x, y, w, h) in enumerate(faces[:max_faces]):  # Limit to max_faces
-            logger.debug(f"Processing face {i+1}/{min(len(faces), max_faces)} - size: {w}x{h}")
-            
-            face_crop = image[y:y+h, x:x+w]
-            if face_crop.size == 0:
-                continue
-            
-            # --- Face augmentation ---
-            face_aug = augment_face(face_crop)
-            
-            # --- FaceNet embedding ---
-            face_t = facenet_transform(face_aug).unsqueeze(0).to(device)
-            feat = embedder_model(face_t)
-            feat = feat.view(-1).cpu().numpy()  # shape (512,)
-            face_embeddings.append(feat)
-            faces_processed += 1
+    for i, (x, y, w, h) in enumerate(faces[:max_faces]):  # Limit to max_faces
+        logger.debug(f"Processing face {i+1}/{min(len(faces), max_faces)} - size: {w}x{h}")
+        
+        face_crop = image[y:y+h, x:x+w]
+        if face_crop.size == 0:
+            continue
+        
+        face_crops.append(face_crop)
     
+    faces_processed = len(face_crops)
     logger.info(f"Face processing completed - processed {faces_processed} faces")
     
-    if not face_embeddings:
+    if not face_crops:
         logger.warning("No valid faces processed")
         raise Exception("no_face_detected")
     
-    # Scale features
-    logger.info("Scaling features and preparing quantum circuits...")
-    X_scaled = scaler.transform(face_embeddings)
+    return face_crops
+
+def predict_image_deepfake_single(
+    image_path,
+    model,
+    scaler,
+    embedder_model,
+    n_qubits=8,
+    max_faces=5,
+    device="cpu",
+    embed_batch_size=32,
+    augment="random",
+    detect_max_side=DETECT_MAX_SIDE
+):
+    """
+    Predict deepfake probability for a single image using FaceNet embeddings + TFQ layered encoding.
+    augment is one of "random", "none", "deterministic" or "tta:K" (see augment_face_crops).
+    Face detection runs at detect_max_side (see detector_backends.FaceDetector.detect
+    and DetectorPool).
+    """
+    logger.info(f"Starting image analysis for: {image_path}")
+    logger.info(f"Parameters - max_faces: {max_faces}, device: {device}, augment: {augment}")
     
-    # Convert to quantum circuits
-    circuits, _ = batch_features_to_circuits_layers(X_scaled, n_qubits)
-    tfq_tensor = tfq.convert_to_tensor(circuits)
+    if not TFQ_AVAILABLE and requires_tfq(model):
+        logger.error("TensorFlow Quantum not available")
+        raise Exception("tfq_unavailable")
     
-    # Predict
-    logger.info("Running quantum model prediction...")
-    probs = model.predict(tfq_tensor, verbose=0).flatten()
-    logger.info(f"Probabilities per face: {probs}")
-    avg_prob = float(np.mean(probs))
+    face_crops = extract_image_faces(image_path, max_faces=max_faces, detect_max_side=detect_max_side)
+    faces_processed = len(face_crops)
     
-    # Determine label
-    label = "fake" if avg_prob > 0.5 else "real"
+    # --- Face augmentation ---
+    face_crops, views_per_face = augment_face_crops(face_crops, augment)
     
-    logger.info(f"Final result - average probability: {avg_prob:.4f}, label: {label}")
+    # --- FaceNet embedding (one batched pass) ---
+    face_embeddings = embed_faces(face_crops, embedder_model, device=device, max_batch=embed_batch_size)
+    
+    # --- Scale + quantum head (TFQ circuits or NumPy statevector, depending on the model) ---
+    probs = _face_probs(face_embeddings, views_per_face, model, scaler, n_qubits)
+    avg_prob, label = _decide(probs)
+    
+    return avg_prob, label, faces_processed
+
+def predict_image_deepfake_batch(
+    image_paths,
+    model,
+    scaler,
+    embedder_model,
+    n_qubits=8,
+    max_faces=5,
+    device="cpu",
+    embed_batch_size=32,
+    augment="random",
+    detect_max_side=DETECT_MAX_SIDE,
+    detect_workers=4
+):
+    """
+    predict_image_deepfake_single for several images with shared batches.
+    Images are decoded and their faces detected concurrently (detect_workers
+    threads), then the face crops of all images go through one augmentation
+    pass, one embed_faces call and one quantum head call, and the
+    probabilities are scattered back per image.
+
+    Returns a list in the order of image_paths with, per image, either
+    (avg_prob, label, faces_processed) or the Exception it failed with
+    (e.g. no_face_detected), so one bad file doesn't fail the batch.
+    """
+    logger.info(f"Starting batch image analysis for {len(image_paths)} images")
+    logger.info(f"Parameters - max_faces: {max_faces}, device: {device}, augment: {augment}")
+    
+    if not TFQ_AVAILABLE and requires_tfq(model):
+        logger.error("TensorFlow Quantum not available")
+        raise Exception("tfq_unavailable")
+    
+    # --- Decode + detect, one task per image ---
+    with ThreadPoolExecutor(max_workers=max(1, min(detect_workers, len(image_paths)))) as executor:
+        futures = [executor.submit(extract_image_faces, path, max_faces, detect_max_side) for path in image_paths]
+    
+    results = []
+    face_crops, owners = [], []
+    for index, future in enumerate(futures):
+        try:
+            crops = future.result()
+        except Exception as e:
+            results.append(e)
+            continue
+        results.append(None)
+        face_crops.extend(crops)
+        owners.extend([index] * len(crops))
+    
+    if not face_crops:
+        return results
+    
+    # --- Shared augmentation, embedding and quantum head batches ---
+    face_crops, views_per_face = augment_face_crops(face_crops, augment)
+    face_embeddings = embed_faces(face_crops, embedder_model, device=device, max_batch=embed_batch_size)
+    probs = _face_probs(face_embeddings, views_per_face, model, scaler, n_qubits)
+    
+    owners = np.asarray(owners)
+    for index in np.unique(owners):
+        image_probs = probs[owners == index]
+        results[index] = (*_decide(image_probs), len(image_probs))
+    logger.info(f"Batch analysis completed - {len(owners)} faces from {len(np.unique(owners))} images")
     
-    return avg_prob, label, faces_processed
\ No newline at end of file
+    return results
\ No newline at end of file
@@ -0,0 +1,323 @@
+import logging
+from functools import lru_cache
+
+import h5py
+import numpy as np
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+
+def _split(n_qubits):
+    """
+    The statevector is kept as a (B, 2**n_hi, 2**n_lo) matrix whose rows index
+    qubits [0, n_hi) and columns qubits [n_hi, n_qubits) (cirq big-endian order),
+    so a layer of single-qubit gates becomes U_hi @ S @ U_lo^T.
+    """
+    n_hi = n_qubits // 2
+    return n_hi, n_qubits - n_hi
+
+
+def _bit_parity(values):
+    """Parity of the popcount of each integer in values."""
+    values = np.asarray(values)
+    parity = np.zeros_like(values)
+    while np.any(values):
+        parity ^= values & 1
+        values = values >> 1
+    return parity
+
+
+def _cz_chain_phases(n_qubits):
+    """Diagonal of the CZ(q0,q1)...CZ(q[n-2],q[n-1]) chain, shaped like the state matrix."""
+    idx = np.arange(2 ** n_qubits)
+    bits = (idx[:, None] >> (n_qubits - 1 - np.arange(n_qubits))) & 1
+    parity = np.sum(bits[:, :-1] & bits[:, 1:], axis=1) & 1
+    n_hi, n_lo = _split(n_qubits)
+    return np.where(parity == 1, -1.0, 1.0).reshape(2 ** n_hi, 2 ** n_lo)
+
+
+def _z0_diagonal(n_qubits):
+    """Diagonal of Z on qubit 0 (the readout of create_tfq_model_layers), shaped like the state matrix."""
+    idx = np.arange(2 ** n_qubits)
+    msb = (idx >> (n_qubits - 1)) & 1
+    n_hi, n_lo = _split(n_qubits)
+    return np.where(msb == 1, -1.0, 1.0).reshape(2 ** n_hi, 2 ** n_lo)
+
+
+def rotation_blocks(angles):
+    """
+    Kronecker product of R(a_0) x R(a_1) x ... over the last axis of angles,
+    with R(a) = [[cos(a/2), sin(a/2)], [-sin(a/2), cos(a/2)]].
+    Returns shape angles.shape[:-1] + (2**k, 2**k).
+
+    R(a) = D^-1 RX(a) D with D = diag(1, i). D commutes with CZ and Z and
+    leaves |0...0> unchanged, so the whole circuit can be simulated with
+    these real rotations and gives the same probabilities as the complex RX
+    circuit. Entry [r, c] of the product is sign(r, c) * m[r ^ c], where
+    m[x] multiplies sin for the set bits of x and cos for the others.
+    """
+    angles = np.asarray(angles, dtype=np.float64)
+    k = angles.shape[-1]
+    cos = np.cos(angles / 2.0)
+    sin = np.sin(angles / 2.0)
+    mags = np.ones(angles.shape[:-1] + (1,))
+    for j in range(k):
+        pair = np.stack([cos[..., j], sin[..., j]], axis=-1)
+        mags = (mags[..., :, None] * pair[..., None, :]).reshape(angles.shape[:-1] + (-1,))
+
+    xor, sign = _block_tables(k)
+    blocks = np.take(mags, xor, axis=-1)
+    blocks *= sign
+    return blocks
+
+
+@lru_cache(maxsize=None)
+def _block_tables(k):
+    """r ^ c index table and sign(r, c) table used by rotation_blocks."""
+    idx = np.arange(2 ** k)
+    xor = idx[:, None] ^ idx[None, :]
+    sign = np.where(_bit_parity(idx[:, None] & ~idx[None, :]) == 1, -1.0, 1.0)
+    return xor, sign
+
+
+def initial_state(batch, n_qubits=8):
+    """|0...0> for a batch, in the (B, 2**n_hi, 2**n_lo) layout."""
+    n_hi, n_lo = _split(n_qubits)
+    state = np.zeros((batch, 2 ** n_hi, 2 ** n_lo))
+    state[:, 0, 0] = 1.0
+    return state
+
+
+def encode_features(X, n_qubits=8):
+    """
+    Simulate the layered RX+CZ encoding of feature_vector_to_circuit_layers
+    for a whole batch, starting from |0...0>. Memory is about 0.3 MB per face,
+    so callers should chunk very large batches.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    batch, n_features = X.shape
+    n_layers = n_features // n_qubits
+    angles = np.mod(X[:, :n_layers * n_qubits], 2 * np.pi).reshape(batch, n_layers, n_qubits)
+
+    # Build every layer's blocks in one vectorized pass, then only matmuls remain
+    n_hi, _ = _split(n_qubits)
+    hi_blocks = rotation_blocks(angles[..., :n_hi])
+    lo_blocks_t = np.swapaxes(rotation_blocks(angles[..., n_hi:]), -1, -2)
+
+    cz = _cz_chain_phases(n_qubits)
+    state = initial_state(batch, n_qubits)
+    for layer_idx in range(n_layers):
+        state = hi_blocks[:, layer_idx] @ state @ lo_blocks_t[:, layer_idx]
+        state *= cz
+    return state
+
+
+def pqc_blocks(thetas):
+    """Per-layer (hi, lo^T) rotation blocks of the ansatz for thetas of shape (n_layers, n_qubits)."""
+    n_hi, _ = _split(thetas.shape[1])
+    hi = rotation_blocks(thetas[:, :n_hi])
+    lo_t = np.swapaxes(rotation_blocks(thetas[:, n_hi:]), -1, -2)
+    return hi, lo_t
+
+
+def apply_pqc_layers(state, thetas, blocks=None):
+    """
+    Apply the build_pqc_circuit_layers ansatz with fixed thetas of shape
+    (n_layers, n_qubits). blocks may carry precomputed pqc_blocks(thetas).
+    """
+    n_layers, n_qubits = thetas.shape
+    hi, lo_t = blocks if blocks is not None else pqc_blocks(thetas)
+    cz = _cz_chain_phases(n_qubits)
+    for l in range(n_layers):
+        state = hi[l] @ state @ lo_t[l]
+        state = state * cz
+    return state
+
+
+def load_quantum_head_weights(weights_path, n_qubits=8, n_layers=12):
+    """
+    Read the trained PQC thetas and Dense(1) weights from the Keras .h5 file
+    written by create_tfq_model_layers(...).save_weights.
+
+    tfq.layers.PQC stores its parameters in sorted symbol-name order
+    ('theta_0_0', 'theta_0_1', ..., 'theta_10_0', ...), so they are mapped back
+    to a (n_layers, n_qubits) grid here.
+    """
+    with h5py.File(weights_path, "r") as f:
+        root = f["model_weights"] if "model_weights" in f else f
+        params = kernel = bias = None
+        for layer_name in root.attrs["layer_names"]:
+            layer_name = layer_name.decode() if isinstance(layer_name, bytes) else layer_name
+            group = root[layer_name]
+            for weight_name in group.attrs["weight_names"]:
+                weight_name = weight_name.decode() if isinstance(weight_name, bytes) else weight_name
+                value = np.asarray(group[weight_name])
+                if weight_name.endswith("parameters:0"):
+                    params = value
+                elif weight_name.endswith("kernel:0"):
+                    kernel = value
+                elif weight_name.endswith("bias:0"):
+                    bias = value
+
+    if params is None or kernel is None or bias is None:
+        raise ValueError(f"Could not find PQC/Dense weights in {weights_path}")
+    if params.size != n_qubits * n_layers:
+        raise ValueError(
+            f"Expected {n_qubits * n_layers} PQC parameters, found {params.size} in {weights_path}"
+        )
+
+    names = [f"theta_{l}_{i}" for l in range(n_layers) for i in range(n_qubits)]
+    by_name = dict(zip(sorted(names), params.astype(np.float64)))
+    thetas = np.array([by_name[name] for name in names]).reshape(n_layers, n_qubits)
+    return thetas, float(kernel.reshape(-1)[0]), float(bias.reshape(-1)[0])
+
+
+def compile_observable(thetas):
+    """
+    Fold the frozen ansatz and the Z0 readout into one real symmetric
+    observable O = U^T Z0 U of shape (2**n, 2**n), in the same real basis
+    as encode_features, so that <Z0> = psi^T O psi for an encoded state psi.
+    """
+    thetas = np.asarray(thetas, dtype=np.float64)
+    n_qubits = thetas.shape[1]
+    dim = 2 ** n_qubits
+    n_hi, n_lo = _split(n_qubits)
+
+    # Row k of columns is U e_k, i.e. columns = U^T
+    basis = np.eye(dim).reshape(dim, 2 ** n_hi, 2 ** n_lo)
+    columns = apply_pqc_layers(basis, thetas).reshape(dim, dim)
+    z0 = _z0_diagonal(n_qubits).reshape(-1)
+    observable = (columns * z0) @ columns.T
+    return (observable + observable.T) / 2.0
+
+
+class NumpyQuantumHead:
+    """
+    Pure-NumPy replacement for the TFQ model built by create_tfq_model_layers.
+    Takes scaled 512-D embeddings directly (no cirq circuits, no TFQ) and
+    returns the same sigmoid probabilities.
+
+    The trained ansatz is compiled into a single observable at load time, so
+    scoring a face is the encoding simulation plus one quadratic form.
+    """
+
+    def __init__(self, observable, kernel, bias, n_qubits=8, thetas=None):
+        self.observable = np.asarray(observable, dtype=np.float64)
+        self.kernel = float(kernel)
+        self.bias = float(bias)
+        self.n_qubits = n_qubits
+        self.thetas = None if thetas is None else np.asarray(thetas, dtype=np.float64)
+
+    @classmethod
+    def from_weights(cls, thetas, kernel, bias):
+        """Compile a head from PQC thetas of shape (n_layers, n_qubits) and Dense(1) weights."""
+        thetas = np.asarray(thetas, dtype=np.float64)
+        return cls(compile_observable(thetas), kernel, bias, n_qubits=thetas.shape[1], thetas=thetas)
+
+    @classmethod
+    def from_h5(cls, weights_path, n_qubits=8, n_layers=12):
+        thetas, kernel, bias = load_quantum_head_weights(weights_path, n_qubits, n_layers)
+        logger.info(f"Compiled NumPy quantum head from {weights_path} ({n_layers} layers, {n_qubits} qubits)")
+        return cls.from_weights(thetas, kernel, bias)
+
+    @classmethod
+    def from_npz(cls, artifact_path):
+        """Load a head exported with save_npz (no Keras, TFQ or h5 file needed)."""
+        with np.load(artifact_path) as data:
+            thetas = data["thetas"] if "thetas" in data.files else None
+            head = cls(
+                data["observable"],
+                data["kernel"],
+                data["bias"],
+                n_qubits=int(data["n_qubits"]),
+                thetas=thetas
+            )
+        logger.info(f"Loaded compiled NumPy quantum head from {artifact_path}")
+        return head
+
+    def save_npz(self, artifact_path):
+        """Export the compiled observable and Dense weights as a small .npz artifact."""
+        payload = {
+            "observable": self.observable,
+            "kernel": np.float64(self.kernel),
+            "bias": np.float64(self.bias),
+            "n_qubits": np.int64(self.n_qubits),
+        }
+        if self.thetas is not None:
+            payload["thetas"] = self.thetas
+        np.savez_compressed(artifact_path, **payload)
+        logger.info(f"Saved compiled NumPy quantum head to {artifact_path}")
+
+    def expectation(self, X_scaled, chunk_size=32):
+        """<Z0> after encoding + ansatz, one value per row of X_scaled."""
+        X_scaled = np.asarray(X_scaled, dtype=np.float64)
+        dim = self.observable.shape[0]
+        out = np.empty(len(X_scaled))
+        for start in range(0, len(X_scaled), chunk_size):
+            state = encode_features(X_scaled[start:start + chunk_size], self.n_qubits).reshape(-1, dim)
+            out[start:start + chunk_size] = np.sum((state @ self.observable) * state, axis=1)
+        return out
+
+    def predict(self, X_scaled):
+        """Sigmoid probabilities, shape (B, 1) like the Keras model output."""
+        z = self.expectation(X_scaled)
+        logits = self.kernel * z + self.bias
+        return (1.0 / (1.0 + np.exp(-logits)))[:, None]
+
+
+def check_head(head, n_samples=64, weights_path=None, n_layers=12, atol=1e-5, seed=0):
+    """
+    Compare a compiled head on random scaled embeddings against the
+    uncompiled gate-by-gate simulation and, when TFQ is installed and
+    weights_path is given, against the Keras/TFQ model.
+    Returns a dict of max absolute probability differences.
+    """
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_samples, 512))
+    probs = head.predict(X).ravel()
+    report = {}
+
+    if head.thetas is not None:
+        state = encode_features(X, head.n_qubits)
+        state = apply_pqc_layers(state, head.thetas)
+        z = np.sum(state ** 2 * _z0_diagonal(head.n_qubits), axis=(1, 2))
+        direct = 1.0 / (1.0 + np.exp(-(head.kernel * z + head.bias)))
+        report["max_diff_vs_statevector"] = float(np.max(np.abs(direct - probs)))
+
+    if weights_path is not None:
+        try:
+            import tensorflow_quantum as tfq
+        except ImportError:
+            logger.warning("TensorFlow Quantum not installed - skipping TFQ comparison")
+        else:
+            from predictimg import create_tfq_model_layers, batch_features_to_circuits_layers
+            model = create_tfq_model_layers(n_qubits=head.n_qubits, n_layers=n_layers, learning_rate=1e-3)
+            model.load_weights(weights_path)
+            circuits, _ = batch_features_to_circuits_layers(X, head.n_qubits)
+            tfq_probs = model.predict(tfq.convert_to_tensor(circuits), verbose=0).ravel()
+            report["max_diff_vs_tfq"] = float(np.max(np.abs(tfq_probs - probs)))
+
+    for name, diff in report.items():
+        if diff > atol:
+            raise ValueError(f"Compiled quantum head disagrees ({name}={diff:.2e} > {atol:.0e})")
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description="Compile the trained quantum head into a .npz artifact")
+    parser.add_argument("--weights", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "tfq_face_layers_weights.h5"))
+    parser.add_argument("--out", default="quantum_head.npz")
+    parser.add_argument("--n-qubits", type=int, default=8)
+    parser.add_argument("--n-layers", type=int, default=12)
+    parser.add_argument("--check-samples", type=int, default=64)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    head = NumpyQuantumHead.from_h5(args.weights, n_qubits=args.n_qubits, n_layers=args.n_layers)
+    print(f"Check: {check_head(head, n_samples=args.check_samples, weights_path=args.weights, n_layers=args.n_layers)}")
+    head.save_npz(args.out)
+    print(f"Wrote {args.out} ({os.path.getsize(args.out) / 1024:.0f} KB)")
@@ -0,0 +1,278 @@
+import logging
+import re
+import struct
+import time
+
+import numpy as np
+import requests
+
+from result_cache import HashingFile
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+# First request: a small Range probe that also covers ftyp and usually a leading moov
+PROBE_BYTES = 64 * 1024
+# Needed byte ranges closer than this are fetched with one request
+MERGE_GAP_BYTES = 512 * 1024
+# Video fetched before the tail window so the decoder's backward seek lands on real data
+TAIL_MARGIN_S = 1.0
+# Leading video (and interleaved audio) fetched for the demuxer's stream probing and
+# OpenCV's first-frame read on seek
+HEAD_S = 1.0
+
+_TOP_LEVEL_BOXES = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"uuid", b"pdin", b"meta"}
+_CONTAINER_BOXES = {b"trak", b"mdia", b"minf", b"stbl"}
+
+
+class TailDownloadUnsupported(Exception):
+    """The file cannot be fetched tail-only (no MP4 index, fragmented, unknown length); download it in full instead."""
+
+
+def _iter_boxes(data, start, end):
+    """(type, payload_start, box_end) of the ISO BMFF boxes in data[start:end]."""
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", data, offset)
+        header = 8
+        if size == 1:
+            size, header = struct.unpack_from(">Q", data, offset + 8)[0], 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            raise TailDownloadUnsupported(f"corrupt {kind!r} box in moov")
+        yield kind, offset + header, offset + size
+        offset += size
+
+
+def _track_boxes(moov, start, end, boxes=None):
+    """Leaf boxes of one trak (mdhd, hdlr, stts, stss, stsz, stsc, stco/co64) by type."""
+    boxes = {} if boxes is None else boxes
+    for kind, payload, box_end in _iter_boxes(moov, start, end):
+        if kind in _CONTAINER_BOXES:
+            _track_boxes(moov, payload, box_end, boxes)
+        else:
+            boxes[kind] = (payload, box_end)
+    return boxes
+
+
+def _table(moov, box, dtype, columns=1, header=8):
+    """Entry table of a full box: version/flags, entry count, then count * columns values."""
+    payload, _ = box
+    count = struct.unpack_from(">I", moov, payload + header - 4)[0]
+    values = np.frombuffer(moov, dtype=dtype, count=count * columns, offset=payload + header).astype(np.int64)
+    return values.reshape(-1, columns) if columns > 1 else values
+
+
+def _video_samples(moov):
+    """
+    (sample byte offsets, sample sizes, decode times in seconds, sync sample
+    indices or None) for the first video track of a moov box.
+    """
+    for kind, payload, box_end in _iter_boxes(moov, 8, len(moov)):
+        if kind != b"trak":
+            continue
+        boxes = _track_boxes(moov, payload, box_end)
+        if b"hdlr" not in boxes or moov[boxes[b"hdlr"][0] + 8:boxes[b"hdlr"][0] + 12] != b"vide":
+            continue
+        if not {b"mdhd", b"stts", b"stsz", b"stsc"} <= boxes.keys() or not ({b"stco", b"co64"} & boxes.keys()):
+            raise TailDownloadUnsupported("video track without a sample table (fragmented MP4?)")
+
+        mdhd = boxes[b"mdhd"][0]
+        timescale = struct.unpack_from(">I", moov, mdhd + (20 if moov[mdhd] == 1 else 12))[0]
+
+        sample_size, n_samples = struct.unpack_from(">II", moov, boxes[b"stsz"][0] + 4)
+        if sample_size:
+            sizes = np.full(n_samples, sample_size, dtype=np.int64)
+        else:
+            sizes = _table(moov, boxes[b"stsz"], ">u4", header=12)
+        if n_samples == 0:
+            raise TailDownloadUnsupported("video track has no samples (fragmented MP4?)")
+
+        if b"co64" in boxes:
+            chunk_offsets = _table(moov, boxes[b"co64"], ">u8")
+        else:
+            chunk_offsets = _table(moov, boxes[b"stco"], ">u4")
+        stsc = _table(moov, boxes[b"stsc"], ">u4", columns=3)
+        # Samples per chunk, expanded from the run-length sample-to-chunk table
+        runs = np.diff(np.append(stsc[:, 0] - 1, len(chunk_offsets)))
+        per_chunk = np.repeat(stsc[:, 1], runs)
+        chunk_of_sample = np.repeat(np.arange(len(chunk_offsets)), per_chunk)[:n_samples]
+        chunk_first_sample = np.concatenate([[0], np.cumsum(per_chunk)[:-1]])
+        size_sums = np.concatenate([[0], np.cumsum(sizes)])
+        offsets = chunk_offsets[chunk_of_sample] + size_sums[:n_samples] - size_sums[chunk_first_sample[chunk_of_sample]]
+
+        stts = _table(moov, boxes[b"stts"], ">u4", columns=2)
+        deltas = np.repeat(stts[:, 1], stts[:, 0])[:n_samples]
+        times = np.concatenate([[0], np.cumsum(deltas)[:-1]]) / float(timescale)
+
+        sync = _table(moov, boxes[b"stss"], ">u4") - 1 if b"stss" in boxes else None
+        return offsets, sizes, times, sync
+    raise TailDownloadUnsupported("no video track")
+
+
+def _needed_ranges(offsets, sizes, times, sync, seconds_range):
+    """Inclusive byte ranges holding the head and the tail window (from its preceding keyframe) of the video track."""
+    ends = offsets + sizes
+    head_last = max(1, int(np.searchsorted(times, HEAD_S)))
+    head = (int(offsets[0]), int(ends[:head_last].max()) - 1)
+
+    tail_start = max(0.0, times[-1] - seconds_range - TAIL_MARGIN_S)
+    first = max(0, int(np.searchsorted(times, tail_start, side="right")) - 1)
+    if sync is not None and len(sync):
+        keyframes = sync[sync <= first]
+        first = int(keyframes[-1]) if len(keyframes) else 0
+    tail = (int(offsets[first:].min()), int(ends[first:].max()) - 1)
+    return [head, tail]
+
+
+def _merge(ranges, gap=MERGE_GAP_BYTES):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class _RangeReader:
+    """Range GETs against one URL, counting requests and bytes."""
+
+    def __init__(self, session, url, timeout, stats):
+        self.session = session
+        self.url = url
+        self.timeout = timeout
+        self.stats = stats
+
+    def _get(self, start, end):
+        response = self.session.get(self.url, headers={"Range": f"bytes={start}-{end}"}, stream=True, timeout=self.timeout)
+        response.raise_for_status()
+        self.stats["requests"] += 1
+        if response.status_code != 206:
+            response.close()
+            raise TailDownloadUnsupported(f"server ignored Range (HTTP {response.status_code})")
+        return response
+
+    def read(self, start, end):
+        with self._get(start, end) as response:
+            data = response.content
+        self.stats["bytes_transferred"] += len(data)
+        return data
+
+    def copy(self, start, end, f):
+        """Write bytes start..end (inclusive) into f at the same offset."""
+        with self._get(start, end) as response:
+            f.seek(start)
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+                self.stats["bytes_transferred"] += len(chunk)
+
+
+def _content_range_total(header):
+    match = re.match(r"bytes \d+-\d+/(\d+)", header or "")
+    return int(match.group(1)) if match else None
+
+
+def _top_level_boxes(reader, probe, total):
+    """
+    (type, offset, size, header bytes) of the file's top-level boxes; headers
+    past the probe are fetched (16 bytes each).
+    """
+    boxes, offset = [], 0
+    while offset + 8 <= total:
+        header = probe[offset:offset + 16] if offset + 16 <= len(probe) else reader.read(offset, min(offset + 15, total - 1))
+        size, kind = struct.unpack_from(">I4s", header)
+        header_size = 8
+        if size == 1:
+            size, header_size = struct.unpack_from(">Q", header, 8)[0], 16
+        elif size == 0:
+            size = total - offset
+        if size < header_size or (not boxes and kind not in _TOP_LEVEL_BOXES):
+            raise TailDownloadUnsupported("not an MP4/MOV file")
+        if kind == b"moof":
+            raise TailDownloadUnsupported("fragmented MP4")
+        boxes.append((kind, offset, size, header[:header_size]))
+        offset += size
+    return boxes
+
+
+def download_video_tail(url, path, seconds_range, timeout=30, session=None, stats=None):
+    """
+    Download only what decoding the last seconds_range seconds of an MP4/MOV
+    at url needs into a sparse local file at path: the top-level box headers,
+    the moov index (wherever it sits), the first HEAD_S seconds of media and
+    the media from the keyframe before the tail window to the end. Everything
+    else is left as zeros, never read by a decoder that seeks to the tail.
+
+    A server that ignores Range answers the probe with the whole file, which
+    is then saved as a full download. Raises TailDownloadUnsupported when the
+    file has to be downloaded in full by other means (unknown length, not
+    MP4/MOV, fragmented). If a stats dict is given it is filled with mode
+    ("ranged" or "full"), requests, bytes_transferred, file_size,
+    download_ms and sha256 (result_cache.HashingFile digest of what was
+    written, hashed while downloading).
+    """
+    session = session or requests
+    stats = {} if stats is None else stats
+    stats.update({"mode": "ranged", "requests": 1, "bytes_transferred": 0})
+    start_time = time.perf_counter()
+    reader = _RangeReader(session, url, timeout, stats)
+
+    response = session.get(url, headers={"Range": f"bytes=0-{PROBE_BYTES - 1}"}, stream=True, timeout=timeout)
+    with response:
+        response.raise_for_status()
+        if response.status_code == 200:
+            # No Range support - the probe response is the whole file
+            logger.info("Server does not support Range requests - saving the full response")
+            stats["mode"] = "full"
+            with open(path, "wb") as raw:
+                f = HashingFile(raw)
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
+                    stats["bytes_transferred"] += len(chunk)
+            stats["file_size"] = stats["bytes_transferred"]
+            stats["sha256"] = f.hexdigest()
+            stats["download_ms"] = round((time.perf_counter() - start_time) * 1000, 2)
+            return path
+        total = _content_range_total(response.headers.get("Content-Range"))
+        probe = response.content
+    stats["bytes_transferred"] += len(probe)
+    if total is None:
+        raise TailDownloadUnsupported("unknown file size")
+    stats["file_size"] = total
+
+    boxes = _top_level_boxes(reader, probe, total)
+    moov = [(offset, size) for kind, offset, size, _ in boxes if kind == b"moov"]
+    if not moov:
+        raise TailDownloadUnsupported("no moov box")
+    moov_offset, moov_size = moov[0]
+    if moov_offset + moov_size <= len(probe):
+        moov_data = probe[moov_offset:moov_offset + moov_size]
+    else:
+        moov_data = reader.read(moov_offset, moov_offset + moov_size - 1)
+
+    offsets, sizes, times, sync = _video_samples(moov_data)
+    ranges = _merge(_needed_ranges(offsets, sizes, times, sync, seconds_range))
+    logger.info(f"Tail-only download - moov at {moov_offset} ({moov_size} bytes), media ranges {ranges} of {total} bytes")
+
+    with open(path, "wb") as raw:
+        f = HashingFile(raw)
+        # Sparse file: unfetched media stays a hole of zeros
+        f.truncate(total)
+        f.write(probe)
+        # Box headers past the probe, so the demuxer can walk the top level
+        for _, offset, _, header in boxes:
+            f.seek(offset)
+            f.write(header)
+        f.seek(moov_offset)
+        f.write(moov_data)
+        for start, end in ranges:
+            start = max(start, len(probe))
+            if start <= end:
+                reader.copy(start, end, f)
+    stats["sha256"] = f.hexdigest()
+
+    stats["download_ms"] = round((time.perf_counter() - start_time) * 1000, 2)
+    logger.info(f"Tail-only download done - {stats['bytes_transferred']} of {total} bytes in {stats['requests']} requests")
+    return path
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+
+class HashingFile:
+    """
+    Writable file wrapper that feeds everything written into a SHA-256, so
+    media is hashed while it streams to disk instead of in a second pass.
+
+    Sequential writes hash exactly the file's bytes. Writes after a seek or
+    truncate (sparse ranged downloads, see ranged_download.py) also hash the
+    offset, so the digest still identifies the bytes the file was built from.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self._offset = 0
+        self._expected = 0
+
+    def write(self, data):
+        if self._offset != self._expected:
+            self.sha256.update(b"@%d:" % self._offset)
+        self.sha256.update(data)
+        written = self.f.write(data)
+        self._offset += len(data)
+        self._expected = self._offset
+        return written
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._offset = self.f.seek(offset, whence)
+        return self._offset
+
+    def truncate(self, size=None):
+        size = self.f.truncate(size)
+        self.sha256.update(b"#%d:" % size)
+        return size
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+
+def file_fingerprint(paths, extra=()):
+    """Short SHA-256 over the contents of the existing files in paths plus extra strings (e.g. a model version)."""
+    sha256 = hashlib.sha256()
+    for path in paths:
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha256.update(chunk)
+    for item in extra:
+        sha256.update(str(item).encode())
+    return sha256.hexdigest()[:16]
+
+
+class ResultCache:
+    """
+    Two-tier cache of JSON-serialisable prediction results.
+
+    The memory tier is an LRU of up to memory_items entries. The disk tier
+    keeps one JSON file per key under disk_dir and is shared by the worker
+    processes; when it grows past max_disk_bytes the least recently used
+    files are removed until it is back under 90% of the limit. Entries
+    older than ttl_s are ignored and dropped in both tiers. disk_dir=None
+    keeps the cache in memory only.
+    """
+
+    def __init__(self, memory_items=1024, disk_dir=None, max_disk_bytes=512 * 1024 * 1024, ttl_s=7 * 24 * 3600):
+        self.memory_items = memory_items
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_s = ttl_s
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "expired": 0, "evicted": 0}
+        self._disk_bytes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    @staticmethod
+    def key(*parts):
+        """Cache key from JSON-serialisable parts (media digest, parameters, model version...)."""
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_entries(self):
+        """(path, size, mtime) of every file in the disk tier."""
+        entries = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, key):
+        """The cached value or None (blocking: may read the disk tier)."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl_s:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+                self._counters["expired"] += 1
+
+        value = self._disk_get(key, now) if self.disk_dir else None
+        with self._lock:
+            if value is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            self._memory_put(key, value, now)
+        return value
+
+    def _disk_get(self, key, now):
+        path = self._path(key)
+        try:
+            if now - os.path.getmtime(path) > self.ttl_s:
+                os.remove(path)
+                with self._lock:
+                    self._counters["expired"] += 1
+                return None
+            with open(path) as f:
+                value = json.load(f)
+            # Touch: eviction removes the least recently used files first
+            os.utime(path)
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, value):
+        """Store value in both tiers (blocking: writes the disk tier)."""
+        now = time.time()
+        with self._lock:
+            self._memory_put(key, value, now)
+            self._counters["stores"] += 1
+        if self.disk_dir:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = json.dumps(value).encode()
+            # Atomic replace: concurrent readers never see a partial file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_bytes += len(data)
+                over = self._disk_bytes > self.max_disk_bytes
+            if over:
+                self._evict_disk()
+
+    def _memory_put(self, key, value, now):
+        self._memory[key] = (now, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        # Rescan: other processes write to the same directory
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_disk_bytes * 0.9)
+        evicted = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._counters["evicted"] += evicted
+        logger.info(f"Result cache disk tier evicted {evicted} entries, {total / (1024 * 1024):.1f} MB left")
+
+    def metrics(self):
+        with self._lock:
+            counters = dict(self._counters)
+            memory_items = len(self._memory)
+            disk_bytes = self._disk_bytes
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        lookups = hits + counters["misses"]
+        return {
+            **counters,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "memory_items": memory_items,
+            "disk_mb": round(disk_bytes / (1024 * 1024), 3) if self.disk_dir else None
+        }
@@ -0,0 +1,224 @@
+"""
+Production launcher: loads the models once, then forks uvicorn workers that
+share them copy-on-write.
+
+Usage:
+    python serve.py [--workers 4] [--host 0.0.0.0] [--port 8000] [--memory-report-interval 60]
+
+The parent validates the settings and loads the scaler, FaceNet embedder and
+quantum head (main.load_models), freezes the garbage collector so refcount
+and GC bookkeeping don't copy the shared pages, then forks the workers on one
+listening socket. Each worker runs main.app under uvicorn; its lifespan only
+creates what cannot cross fork() - executors, detectors, micro-batching
+threads, a TFQ model. Crashed workers are restarted, SIGINT/SIGTERM stop all
+of them, and SIGUSR1 (or --memory-report-interval) logs each worker's RSS
+split into memory shared with the other processes and unique to it.
+
+Nothing in the parent may start native threads before fork(): torch runs
+with one intra-op thread while loading, predictimg only imports TensorFlow
+for a TFQ model, and the parent checks for stray threads before forking.
+Fork-safe, preloaded and shared: the scaler, the NumPy quantum head and the
+FaceNet embedder in every EMBEDDER_MODE with EMBEDDER_EXPORT none or
+torchscript. Loaded by each worker instead: the TFQ quantum head
+(QUANTUM_BACKEND=tfq; TensorFlow's runtime does not survive fork()) and the
+face detectors (OpenCV DNN nets). EMBEDDER_EXPORT=compile is preloaded but
+compiles in each worker on its first call.
+
+fork() is Linux/macOS only; on Windows run `uvicorn main:app` instead.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+
+def process_memory(pid="self"):
+    """
+    Memory of a process in MB from /proc/<pid>/smaps_rollup (Linux): rss,
+    shared (pages also mapped by other processes, e.g. the preloaded weights),
+    unique (private to the process) and pss (rss with shared pages split
+    between their users - what the process really costs). None without /proc.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "shared_mb": round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / 1024, 1),
+        "unique_mb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024, 1),
+    }
+
+
+def native_threads():
+    """Names of this process's OS threads (Linux /proc), or None when unavailable."""
+    try:
+        tasks = os.listdir("/proc/self/task")
+        names = []
+        for task in tasks:
+            with open(f"/proc/self/task/{task}/comm") as f:
+                names.append(f.read().strip())
+        return names
+    except OSError:
+        return None
+
+
+def log_memory_report(workers):
+    """One line per worker (pid -> index) plus the parent, and the totals."""
+    rows = [("parent", os.getpid())] + [(f"worker {index}", pid) for pid, index in sorted(workers.items(), key=lambda w: w[1])]
+    total_rss = total_pss = 0.0
+    for name, pid in rows:
+        memory = process_memory(pid)
+        if memory is None:
+            logger.info(f"Memory report unavailable for {name} (pid {pid}) - needs /proc/<pid>/smaps_rollup")
+            continue
+        total_rss += memory["rss_mb"]
+        total_pss += memory["pss_mb"]
+        logger.info(
+            f"{name:>9} pid {pid}: RSS {memory['rss_mb']:.1f} MB = shared {memory['shared_mb']:.1f} MB "
+            f"+ unique {memory['unique_mb']:.1f} MB (PSS {memory['pss_mb']:.1f} MB)"
+        )
+    logger.info(f"Total: RSS {total_rss:.1f} MB summed, {total_pss:.1f} MB actually used (PSS)")
+
+
+def run_worker(app, sock, index, torch_threads, log_level):
+    """Body of a forked worker: per-process thread settings, then uvicorn on the inherited socket."""
+    import torch
+    import uvicorn
+
+    # Objects frozen by the parent stay out of collections; new ones are tracked as usual
+    gc.enable()
+    torch.set_num_threads(torch_threads)
+    for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGUSR1):
+        signal.signal(sig, signal.SIG_DFL)
+
+    logger.info(f"Worker {index} started (pid {os.getpid()}, {torch_threads} torch threads)")
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", str(os.cpu_count() or 1))))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--torch-threads", type=int, help="intra-op threads per worker (default: CPUs / workers)")
+    parser.add_argument("--memory-report-interval", type=float, default=60, help="seconds, 0 = only on SIGUSR1")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    if not hasattr(os, "fork"):
+        raise SystemExit("serve.py needs fork() - use `uvicorn main:app` on this platform")
+
+    import torch
+
+    # No OpenMP worker threads may exist in the parent: forking a process whose
+    # thread pool has run leaves the children's pool deadlocked
+    torch.set_num_threads(1)
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // args.workers)
+
+    # Everything allocated while loading is frozen below; skip collections until then.
+    # Importing main also configures logging
+    gc.disable()
+    import main as app_module
+    start = time.perf_counter()
+    app_module.load_models(fork_safe=True)
+    logger.info(f"Models preloaded in {time.perf_counter() - start:.1f} s")
+    if "tensorflow" in sys.modules:
+        logger.warning("TensorFlow was imported before fork() - its runtime threads are not fork-safe")
+    threads = native_threads()
+    if threads is not None and len(threads) > 1:
+        logger.warning(f"{len(threads)} threads running before fork() ({', '.join(threads)}) - workers may deadlock")
+
+    sock = socket.socket(socket.AF_INET6 if ":" in args.host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # Move every object to a permanent generation the collector never touches,
+    # so workers don't dirty (and copy) the pages holding the shared weights
+    gc.freeze()
+
+    workers = {}
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(app_module.app, sock, index, torch_threads, args.log_level)
+            except BaseException:
+                logger.exception(f"Worker {index} failed")
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+        workers[pid] = index
+
+    stopping = False
+    report_requested = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    def request_report(signum, frame):
+        nonlocal report_requested
+        report_requested = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGUSR1, request_report)
+
+    for index in range(args.workers):
+        spawn(index)
+    logger.info(f"Serving on {args.host}:{args.port} with {args.workers} workers")
+
+    next_report = time.monotonic() + args.memory_report_interval
+    while not stopping:
+        time.sleep(0.5)
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if not pid:
+                break
+            index = workers.pop(pid, None)
+            if index is not None and not stopping:
+                logger.warning(f"Worker {index} (pid {pid}) exited with status {status} - restarting")
+                spawn(index)
+        if report_requested or (args.memory_report_interval and time.monotonic() >= next_report):
+            report_requested = False
+            next_report = time.monotonic() + args.memory_report_interval
+            log_memory_report(workers)
+
+    logger.info("Shutting down workers...")
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in list(workers):
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.fixture(scope="session")
+def z0_expectation():
+    """<Z> on the first qubit of a cirq circuit's final state, simulated gate by gate."""
+    cirq = pytest.importorskip("cirq")
+    simulator = cirq.Simulator(dtype=np.complex128)
+
+    def expectation(circuit, qubits, resolver=None):
+        state = simulator.simulate(circuit, param_resolver=resolver, qubit_order=qubits).final_state_vector
+        msb = (np.arange(len(state)) >> (len(qubits) - 1)) & 1
+        return float(np.sum(np.abs(state) ** 2 * np.where(msb == 1, -1.0, 1.0)))
+
+    return expectation
+
+
+@pytest.fixture(scope="session")
+def facenet():
+    """FaceNet with random (not downloaded) weights: same architecture and shapes as the served model."""
+    torch = pytest.importorskip("torch")
+    from facenet_pytorch import InceptionResnetV1
+
+    torch.manual_seed(0)
+    return InceptionResnetV1(pretrained=None).eval()
+
+
+@pytest.fixture
+def face_crops(rng):
+    """BGR uint8 crops of assorted sizes, as cut out of frames by the detectors."""
+    return [rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8) for h, w in ((120, 100), (200, 180), (160, 160), (90, 240))]
+
+
+def frame_pattern(index, size=(64, 48)):
+    """Frame index drawn as 8 black/white vertical bars (its bits, most significant first)."""
+    bits = (index >> np.arange(7, -1, -1)) & 1
+    row = np.repeat(bits * 255, size[0] // 8).astype(np.uint8)
+    return np.tile(row[None, :, None], (size[1], 1, 3))
+
+
+def pattern_index(frame):
+    """Inverse of frame_pattern for a decoded (lossy) frame."""
+    bars = frame.reshape(frame.shape[0], 8, -1, frame.shape[2]).mean(axis=(0, 2, 3)) > 128
+    return int(np.sum(bars << np.arange(7, -1, -1)))
+
+
+@pytest.fixture
+def make_video(tmp_path):
+    """
+    Write a small test video and return its path. Frame i shows
+    pattern(i, size), by default frame_pattern (so decoded frames identify
+    themselves), with a keyframe every gop frames and nowhere else.
+    """
+    av = pytest.importorskip("av")
+
+    def make(name="clip.mp4", n_frames=60, fps=25, gop=10, size=(64, 48), codec="mpeg4", pattern=frame_pattern):
+        path = str(tmp_path / name)
+        with av.open(path, "w") as container:
+            stream = container.add_stream(codec, rate=fps)
+            stream.width, stream.height = size
+            stream.pix_fmt = "yuv420p"
+            stream.gop_size = gop
+            stream.codec_context.options = {"bf": "0", "sc_threshold": "1000000000"}
+            for i in range(n_frames):
+                frame = av.VideoFrame.from_ndarray(pattern(i, size), format="bgr24")
+                for packet in stream.encode(frame):
+                    container.mux(packet)
+            for packet in stream.encode():
+                container.mux(packet)
+        return path
+
+    return make
+
+
+@pytest.fixture
+def scripted_detector():
+    """
+    FaceDetector backend that "finds" fixed boxes, given in full-resolution
+    coordinates and scaled to whatever working image detect() hands it.
+    Records the working image shapes and min sizes it was called with.
+    """
+    from detector_backends import FaceDetector
+
+    class ScriptedDetector(FaceDetector):
+        name = "scripted"
+
+        def __init__(self, boxes=(), min_window=1):
+            super().__init__()
+            self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+            self.min_window = min_window
+            self.calls_seen = []
+            self._full_width = None
+
+        def _prepare(self, image):
+            self._full_width = image.shape[1]
+            return image
+
+        def _detect(self, image, min_size):
+            self.calls_seen.append((image.shape[:2], min_size))
+            return self.boxes * (image.shape[1] / self._full_width)
+
+    return ScriptedDetector
+
+
+@pytest.fixture
+def stub_models():
+    """
+    (quantum head, scaler, embedder) stand-ins for the scoring steps: the
+    embedder puts a crop's mean brightness (0-1) in feature 0, the scaler is
+    the identity and the head returns feature 0, so a face's fake
+    probability is its brightness.
+    """
+    torch = pytest.importorskip("torch")
+    from quantum_numpy import NumpyQuantumHead
+
+    class BrightnessHead(NumpyQuantumHead):
+        def __init__(self):
+            pass
+
+        def predict(self, X_scaled):
+            return np.asarray(X_scaled)[:, :1]
+
+    class IdentityScaler:
+        def transform(self, X):
+            return X
+
+    def embedder(faces_t):
+        features = torch.zeros(len(faces_t), 512)
+        features[:, 0] = (faces_t.mean(dim=(1, 2, 3)) + 1) / 2
+        return features
+
+    return BrightnessHead(), IdentityScaler(), embedder
+
+
+@pytest.fixture
+def png():
+    """png(level, size=200): encoded bytes of a uniform grey image, for uploads to api."""
+    cv2 = pytest.importorskip("cv2")
+
+    def encode(level, size=200):
+        return cv2.imencode(".png", np.full((size, size, 3), level, np.uint8))[1].tobytes()
+
+    return encode
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch, stub_models, scripted_detector):
+    """
+    main.app under a TestClient, lifespan included, serving stub_models with a
+    detector that finds one 80 px face at (8, 8) in every image or upper half
+    frame. Jobs and cached results live in tmp_path. Yields (client, main).
+    """
+    from fastapi.testclient import TestClient
+
+    import main
+    import predictimg
+    from detector_pool import DetectorPool
+
+    head, scaler, embedder = stub_models
+    for name, value in (
+        ("scaler", scaler), ("embedder_model", embedder), ("quantum_model", head),
+        ("model_version", "test"), ("embedder_variant", "fp32/none"),
+        ("JOBS_DB", str(tmp_path / "jobs" / "jobs.db")), ("RESULT_CACHE_DIR", str(tmp_path / "results")),
+        ("job_queue", None), ("result_cache", None),
+        ("create_detector", lambda *args: scripted_detector([(8, 8, 80, 80)])),
+    ):
+        monkeypatch.setattr(main, name, value)
+    pool = DetectorPool()
+    monkeypatch.setattr(main, "face_detectors", pool)
+    monkeypatch.setattr(predictimg, "face_detectors", pool)
+
+    with TestClient(main.app) as client:
+        yield client, main
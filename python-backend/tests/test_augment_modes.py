@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from predictimg import _face_probs, augment_face_crops, jpeg_round_trip, parse_augment_mode, tta_augment_face
+from quantum_numpy import NumpyQuantumHead
+
+
+@pytest.fixture
+def crops(face_crops):
+    return [crop.astype(np.float32) / 255.0 for crop in face_crops[:2]]
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("random", ("random", 1)),
+    ("None", ("none", 1)),
+    (" deterministic ", ("deterministic", 1)),
+    ("tta:4", ("tta", 4)),
+])
+def test_parse_augment_mode(spec, expected):
+    assert parse_augment_mode(spec) == expected
+
+
+@pytest.mark.parametrize("spec", ["tta", "tta:0", "tta:x", "none:2", "mixup", "tta:9"])
+def test_parse_augment_mode_rejects(spec):
+    with pytest.raises(ValueError):
+        parse_augment_mode(spec, max_k=8)
+
+
+def test_none_and_deterministic_are_reproducible(crops):
+    untouched, views = augment_face_crops(crops, "none")
+    assert views == 1 and all(a is b for a, b in zip(untouched, crops))
+
+    first, _ = augment_face_crops(crops, "deterministic")
+    second, _ = augment_face_crops(crops, "deterministic")
+    for a, b, crop in zip(first, second, crops):
+        np.testing.assert_array_equal(a, b)
+        np.testing.assert_array_equal(a, jpeg_round_trip(crop))
+
+
+def test_tta_views_are_seeded_and_grouped_per_face(crops):
+    views, k = augment_face_crops(crops, "tta:3", seed=7)
+    again, _ = augment_face_crops(crops, "tta:3", seed=7)
+    assert k == 3 and len(views) == 6
+    for a, b in zip(views, again):
+        np.testing.assert_array_equal(a, b)
+    assert views[0].shape == crops[0].shape and views[3].shape == crops[1].shape
+    assert not np.array_equal(views[0], views[1])
+
+
+def test_tta_views_stay_in_range(crops):
+    views = tta_augment_face(crops[0], 8, seed=1)
+    assert views.shape == (8,) + crops[0].shape and views.dtype == np.float32
+    assert views.min() >= 0.0 and views.max() <= 1.0
+
+
+class Identity:
+    def transform(self, X):
+        return X
+
+
+class FirstColumnHead(NumpyQuantumHead):
+    """Quantum head stand-in whose probability is the first feature."""
+
+    def __init__(self):
+        pass
+
+    def predict(self, X_scaled):
+        return X_scaled[:, :1]
+
+
+def test_face_probs_average_the_views_of_each_face():
+    embeddings = np.array([[0.2], [0.4], [0.9], [0.7]])
+    np.testing.assert_allclose(_face_probs(embeddings, 2, FirstColumnHead(), Identity()), [0.3, 0.8])
+    np.testing.assert_allclose(_face_probs(embeddings, 1, FirstColumnHead(), Identity()), [0.2, 0.4, 0.9, 0.7])
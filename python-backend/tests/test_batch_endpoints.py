@@ -0,0 +1,99 @@
+import predictimg
+from result_cache import ResultCache
+
+
+def upload(name, data, content_type="image/png"):
+    return ("files", (name, data, content_type))
+
+
+def count_embed_calls(monkeypatch):
+    calls = []
+    embed = predictimg.embed_faces
+
+    def counting_embed(face_crops, *args, **kwargs):
+        calls.append(len(face_crops))
+        return embed(face_crops, *args, **kwargs)
+
+    monkeypatch.setattr(predictimg, "embed_faces", counting_embed)
+    return calls
+
+
+def test_image_batch_matches_single_image_responses(api, monkeypatch, png):
+    client, main = api
+    calls = count_embed_calls(monkeypatch)
+    files = [upload("bright.png", png(230)), upload("notes.txt", b"hello", "text/plain"), upload("dark.png", png(20))]
+    response = client.post("/predict/image-batch", files=files, params={"augment": "none"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total_files"] == 3 and body["successful_predictions"] == 2
+
+    bright, text, dark = body["batch_results"]
+    assert [bright["filename"], text["filename"], dark["filename"]] == ["bright.png", "notes.txt", "dark.png"]
+    assert text["status"] == "error" and "Invalid file type" in text["error"]
+    assert bright["prediction"]["label"] == "fake" and dark["prediction"]["label"] == "real"
+    # Both faces went through one embedding pass
+    assert calls == [2]
+
+    for name, level, result in (("bright.png", 230, bright), ("dark.png", 20, dark)):
+        single = client.post("/predict/image", files={"file": (name, png(level), "image/png")}, params={"augment": "none"}).json()
+        assert result == single
+        assert result["cache"] == "bypass"
+
+
+def test_image_batch_reports_undecodable_files_per_image(api, png):
+    client, main = api
+    files = [upload("broken.png", b"not an image"), upload("face.png", png(230))]
+    body = client.post("/predict/image-batch", files=files, params={"augment": "none"}).json()
+    broken, face = body["batch_results"]
+    assert broken["status"] == "error" and broken["filename"] == "broken.png"
+    assert face["status"] == "success"
+    assert body["successful_predictions"] == 1
+
+
+def test_image_batch_only_analyses_uncached_images(api, monkeypatch, tmp_path, png):
+    client, main = api
+    monkeypatch.setattr(main, "result_cache", ResultCache(disk_dir=str(tmp_path / "cache")))
+    calls = count_embed_calls(monkeypatch)
+
+    first = client.post("/predict/image-batch", files=[upload("a.png", png(230))], params={"augment": "none"}).json()
+    assert first["batch_results"][0]["cache"] == "miss"
+
+    files = [upload("a.png", png(230)), upload("b.png", png(20))]
+    second = client.post("/predict/image-batch", files=files, params={"augment": "none"}).json()
+    a, b = second["batch_results"]
+    assert a["cache"] == "hit" and b["cache"] == "miss"
+    assert {key: value for key, value in a.items() if key != "cache"} == \
+        {key: value for key, value in first["batch_results"][0].items() if key != "cache"}
+    # The cached image was not embedded again
+    assert calls == [1, 1]
+
+
+def test_image_batch_rejects_too_many_files(api, monkeypatch, png):
+    client, main = api
+    monkeypatch.setattr(main, "BATCH_MAX_FILES", 2)
+    files = [upload(f"{i}.png", png(230)) for i in range(3)]
+    assert client.post("/predict/image-batch", files=files).status_code == 400
+
+
+def test_video_batch_keeps_upload_order_and_errors(api, monkeypatch):
+    client, main = api
+
+    def fake_prediction(path, max_faces, seconds_range, augment, early_exit, video_stats):
+        if "broken" in path:
+            raise Exception("no_face_detected")
+        video_stats["faces_used"] = 4
+        return (0.2, "real") if "real" in path else (0.9, "fake")
+
+    monkeypatch.setattr(main, "run_video_prediction", fake_prediction)
+    files = [
+        ("files", ("real.mp4", b"video", "video/mp4")),
+        ("files", ("clip.gif", b"gif", "image/gif")),
+        ("files", ("broken.mp4", b"video", "video/mp4")),
+        ("files", ("fake.mp4", b"video", "video/mp4")),
+    ]
+    body = client.post("/predict-batch", files=files).json()
+    assert body["total_files"] == 4 and body["successful_predictions"] == 2
+    real, gif, broken, fake = body["batch_results"]
+    assert real["prediction"]["label"] == "real" and fake["prediction"]["label"] == "fake"
+    assert gif["status"] == "error" and "Invalid file type" in gif["error"]
+    assert broken == {"error": "No faces detected in the video", "filename": "broken.mp4", "status": "error"}
@@ -0,0 +1,122 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher
+
+
+class GatedFn:
+    """Batch function that blocks until released and records the batch sizes it ran."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.sizes = []
+
+    def __call__(self, batch):
+        self.started.set()
+        self.release.wait(5)
+        self.sizes.append(len(batch))
+        return batch * 2
+
+
+def test_stop_with_a_full_queue_fails_blocked_submitters():
+    fn = GatedFn()
+    batcher = MicroBatcher(fn, max_batch_size=1, max_queue=2)
+    running = batcher.submit(np.ones(1))
+    assert fn.started.wait(1)
+    queued = [batcher.submit(np.ones(1)) for _ in range(2)]
+
+    # The queue is full: this submission waits for room
+    blocked = []
+    submitter = threading.Thread(target=lambda: blocked.append(batcher.submit(np.ones(1))))
+    submitter.start()
+    time.sleep(0.05)
+    assert not blocked
+
+    stopper = threading.Thread(target=batcher.stop)
+    stopper.start()
+    # stop() must not wait for the blocked submitter, which fails instead of queueing
+    submitter.join(1)
+    assert not submitter.is_alive()
+    with pytest.raises(RuntimeError, match="stopped"):
+        blocked[0].result(timeout=1)
+
+    fn.release.set()
+    stopper.join(5)
+    assert not stopper.is_alive()
+    np.testing.assert_array_equal(running.result(timeout=1), [2.0])
+    for future in queued:
+        with pytest.raises(RuntimeError, match="stopped"):
+            future.result(timeout=1)
+    assert fn.sizes == [1]
+
+
+def test_rows_are_routed_back_to_their_submitters():
+    fn = GatedFn()
+    batcher = MicroBatcher(fn, max_batch_size=64, max_wait_ms=200)
+    try:
+        fn.release.set()
+        inputs = [np.arange(n, dtype=float) + 100 * n for n in (1, 3, 2, 5)]
+        futures = [batcher.submit(x) for x in inputs]
+        for x, future in zip(inputs, futures):
+            np.testing.assert_array_equal(future.result(timeout=2), x * 2)
+        # Submitted within max_wait_ms of each other, so they share one call
+        assert fn.sizes == [11]
+        assert batcher.metrics()["submissions"] == 4
+    finally:
+        batcher.stop()
+
+
+def test_batches_never_exceed_max_batch_size():
+    fn = GatedFn()
+    batcher = MicroBatcher(fn, max_batch_size=4, max_wait_ms=50)
+    try:
+        fn.release.set()
+        futures = [batcher.submit(np.full(3, float(i))) for i in range(5)]
+        for i, future in enumerate(futures):
+            np.testing.assert_array_equal(future.result(timeout=2), np.full(3, 2.0 * i))
+        assert max(fn.sizes) <= 4 and sum(fn.sizes) == 15
+    finally:
+        batcher.stop()
+
+
+def test_a_failing_batch_fails_only_its_submitters():
+    def fn(batch):
+        if np.any(batch < 0):
+            raise ValueError("bad rows")
+        return batch + 1
+
+    batcher = MicroBatcher(fn, max_batch_size=64, max_wait_ms=1)
+    try:
+        with pytest.raises(ValueError, match="bad rows"):
+            batcher(np.array([-1.0]))
+        np.testing.assert_array_equal(batcher(np.array([1.0, 2.0])), [2.0, 3.0])
+        assert batcher.metrics()["errors"] == 1
+    finally:
+        batcher.stop()
+
+
+def test_submit_after_stop_fails():
+    batcher = MicroBatcher(lambda batch: batch)
+    batcher.stop()
+    with pytest.raises(RuntimeError, match="stopped"):
+        batcher.submit(np.ones(1)).result(timeout=1)
+
+
+def test_batched_embedder_concatenates_tensors_without_grad():
+    import torch
+
+    from batching import BatchedEmbedder
+
+    model = torch.nn.Linear(4, 2)
+    embedder = BatchedEmbedder(model, max_wait_ms=1)
+    try:
+        x = torch.randn(3, 4)
+        out = embedder(x)
+        assert not out.requires_grad
+        torch.testing.assert_close(out, model(x).detach())
+    finally:
+        embedder.batcher.stop()
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from detector_backends import DETECTOR_BACKENDS, HaarDetector, create_detector
+
+
+def test_boxes_are_clipped_without_moving_their_far_corner(scripted_detector):
+    detector = scripted_detector([(-20, -10, 100, 100), (150, 150, 80, 80), (10, 10, 50, 50)])
+    faces = detector.detect(np.zeros((200, 200, 3), np.uint8), min_size=1)
+    assert faces == [(0, 0, 80, 90), (150, 150, 50, 50), (10, 10, 50, 50)]
+
+
+def test_boxes_outside_the_image_are_dropped(scripted_detector):
+    detector = scripted_detector([(250, 10, 40, 40), (-60, 20, 50, 50), (190, 190, 10, 10)])
+    assert detector.detect(np.zeros((200, 200, 3), np.uint8), min_size=1) == [(190, 190, 10, 10)]
+
+
+def test_clipping_uses_full_resolution_bounds(scripted_detector):
+    detector = scripted_detector([(1800, 900, 200, 200)])
+    assert detector.detect(np.zeros((1080, 1920, 3), np.uint8), min_size=1, max_side=640) == [(1800, 900, 120, 180)]
+
+
+def test_metrics_count_calls_and_faces(scripted_detector):
+    detector = scripted_detector([(0, 0, 90, 90)])
+    for _ in range(3):
+        detector.detect(np.zeros((100, 100, 3), np.uint8))
+    metrics = detector.metrics()
+    assert metrics["backend"] == "scripted" and metrics["calls"] == 3 and metrics["faces"] == 3
+
+
+def test_haar_backend_runs_on_color_and_gray():
+    detector = create_detector("haar")
+    assert isinstance(detector, HaarDetector)
+    assert detector.detect(np.full((240, 320, 3), 127, np.uint8)) == []
+    assert detector.detect(np.full((240, 320), 127, np.uint8)) == []
+
+
+@pytest.mark.parametrize("backend", ["res10", "yunet"])
+def test_dnn_backends_need_their_local_model_files(tmp_path, backend):
+    with pytest.raises(FileNotFoundError):
+        create_detector(backend, model_path=str(tmp_path / "missing.onnx"), config_path=str(tmp_path / "missing.prototxt"))
+
+
+def test_unknown_backend_is_rejected():
+    assert DETECTOR_BACKENDS == ("haar", "res10", "yunet")
+    with pytest.raises(ValueError, match="Unknown face detector backend"):
+        create_detector("mtcnn")
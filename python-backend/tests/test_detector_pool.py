@@ -0,0 +1,77 @@
+import queue
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from detector_pool import DetectorPool
+
+
+def test_detectors_are_created_on_demand_and_reused(scripted_detector):
+    pool = DetectorPool(max_size=2, factory=scripted_detector)
+    with pool.checkout() as first:
+        pass
+    with pool.checkout() as again:
+        assert again is first
+    with pool.checkout() as a, pool.checkout() as b:
+        assert a is not b
+    metrics = pool.metrics()
+    assert metrics["created"] == 2 and metrics["available"] == 2 and metrics["checkouts"] == 4
+
+
+def test_exhausted_pool_waits_for_a_return(scripted_detector):
+    pool = DetectorPool(max_size=1, factory=scripted_detector)
+    with pool.checkout() as held:
+        with pytest.raises(queue.Empty):
+            with pool.checkout(timeout=0.05):
+                pass
+        returned = []
+        waiter = threading.Thread(target=lambda: returned.append(pool.checkout().__enter__()))
+        waiter.start()
+        time.sleep(0.05)
+        assert not returned
+    waiter.join(1)
+    assert returned == [held]
+
+
+def test_a_detector_is_never_shared_between_threads(scripted_detector):
+    pool = DetectorPool(max_size=3, factory=scripted_detector)
+    in_use, overlaps = set(), []
+    lock = threading.Lock()
+
+    def work():
+        for _ in range(50):
+            with pool.checkout() as detector:
+                with lock:
+                    overlaps.append(id(detector) in in_use)
+                    in_use.add(id(detector))
+                time.sleep(0.0005)
+                with lock:
+                    in_use.discard(id(detector))
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not any(overlaps)
+    assert pool.metrics()["created"] == 3 and pool.metrics()["in_use"] == 0
+
+
+def test_configure_switches_the_factory(scripted_detector):
+    pool = DetectorPool(max_size=2, factory=scripted_detector)
+    with pool.checkout() as old:
+        pool.configure(factory=lambda: scripted_detector(min_window=24), max_size=4)
+    with pool.checkout() as new:
+        assert new is not old and new.min_window == 24
+    assert pool.metrics()["created"] == 1 and pool.max_size == 4
+
+
+def test_haar_detector_reuses_its_clahe():
+    from detector_backends import HaarDetector
+
+    detector = HaarDetector()
+    clahe = detector.clahe
+    detector.detect(np.zeros((200, 200, 3), np.uint8))
+    assert detector.clahe is clahe and detector.calls == 1
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import predictimg
+from detector_backends import adaptive_scale_factor
+from detector_pool import DetectorPool
+
+
+def test_boxes_are_mapped_back_to_full_resolution(scripted_detector):
+    detector = scripted_detector([(400, 200, 320, 320), (1500, 600, 200, 240)])
+    faces = detector.detect(np.zeros((1080, 1920, 3), np.uint8), min_size=80, max_side=640)
+    (working_shape, working_min), = detector.calls_seen
+    assert working_shape == (360, 640) and working_min == 27
+    assert faces == [(400, 200, 320, 320), (1500, 600, 200, 240)]
+
+
+def test_small_images_are_not_resized(scripted_detector):
+    detector = scripted_detector([(10, 20, 100, 100)])
+    assert detector.detect(np.zeros((480, 600, 3), np.uint8), min_size=80, max_side=640) == [(10, 20, 100, 100)]
+    assert detector.calls_seen == [((480, 600), 80)]
+
+
+def test_max_side_zero_detects_at_full_resolution(scripted_detector):
+    detector = scripted_detector()
+    detector.detect(np.zeros((1080, 1920, 3), np.uint8), max_side=0)
+    assert detector.calls_seen[0][0] == (1080, 1920)
+
+
+def test_downscale_keeps_min_size_faces_above_the_backend_window(scripted_detector):
+    detector = scripted_detector(min_window=24)
+    detector.detect(np.zeros((3000, 4000, 3), np.uint8), min_size=40, max_side=640)
+    (working_shape, working_min), = detector.calls_seen
+    # 640 / 4000 would shrink a 40 px face to 6 px; 24 / 40 is the floor
+    assert working_shape == (1800, 2400) and working_min == 24
+
+
+def test_faces_smaller_than_min_size_are_dropped(scripted_detector):
+    detector = scripted_detector([(0, 0, 60, 60), (100, 100, 90, 90)])
+    assert detector.detect(np.zeros((400, 400, 3), np.uint8), min_size=80) == [(100, 100, 90, 90)]
+
+
+@pytest.mark.parametrize("side, min_size", [(360, 80), (4000, 24), (1080, 30)])
+def test_adaptive_scale_factor_bounds_the_pyramid(side, min_size):
+    factor = adaptive_scale_factor(side, min_size, max_levels=72)
+    assert factor >= 1.05
+    assert np.log(side / min_size) / np.log(factor) <= 72 + 1e-9
+
+
+def test_image_faces_are_sorted_largest_first(monkeypatch, scripted_detector):
+    boxes = [(10, 10, 100, 100), (300, 50, 200, 200), (600, 300, 150, 150)]
+    monkeypatch.setattr(predictimg, "face_detectors", DetectorPool(factory=lambda: scripted_detector(boxes)))
+    assert predictimg.detect_faces_in_image(np.zeros((720, 1280, 3), np.uint8)) == [boxes[1], boxes[2], boxes[0]]
+
+
+def test_upper_half_keeps_the_best_face(scripted_detector):
+    # Large face near the upper-half centre beats a small off-centre one
+    detector = scripted_detector([(20, 20, 90, 90), (560, 100, 160, 160)])
+    frame = np.zeros((720, 1280, 3), np.uint8)
+    assert predictimg.detect_faces_upper_half(frame, detector) == [(560, 100, 160, 160)]
+    # Only the upper half is searched, downscaled to max_side
+    assert detector.calls_seen[0][0] == (180, 640)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from early_exit import SequentialScorer
+
+
+def scorer_after(probs, **kwargs):
+    scorer = SequentialScorer(**kwargs)
+    scorer.add(probs)
+    return scorer
+
+
+def test_off_scores_the_whole_budget():
+    assert not scorer_after([1.0] * 19, max_faces=20, method="off").decided()
+    assert scorer_after([1.0] * 20, max_faces=20, method="off").decided()
+
+
+def test_stops_once_the_remaining_faces_cannot_flip_the_label():
+    # 6 certain fakes out of 10: even 4 zeros leave the mean at 0.6
+    assert scorer_after([1.0] * 6, max_faces=10, min_faces=8).decided()
+    assert not scorer_after([1.0] * 5, max_faces=10, min_faces=8).decided()
+
+
+def test_waits_for_min_faces():
+    assert not scorer_after([0.95] * 3, max_faces=20, min_faces=4).decided()
+    assert scorer_after([0.95, 0.96, 0.94, 0.97], max_faces=20, min_faces=4).decided()
+
+
+def test_hoeffding_is_more_conservative_than_normal():
+    probs = [0.95, 0.96, 0.94, 0.97]
+    assert scorer_after(probs, max_faces=20, method="normal").decided()
+    assert not scorer_after(probs, max_faces=20, method="hoeffding").decided()
+    assert scorer_after(probs * 3, max_faces=20, method="hoeffding").decided()
+
+
+@pytest.mark.parametrize("method", ["normal", "hoeffding"])
+def test_ambiguous_faces_are_not_decided_early(method):
+    assert not scorer_after([0.45, 0.55, 0.52, 0.48, 0.51, 0.49], max_faces=20, method=method).decided()
+
+
+def test_incremental_adds_match_one_add():
+    probs = np.array([0.2, 0.9, 0.4, 0.7, 0.65])
+    scorer = SequentialScorer(max_faces=20)
+    for p in probs:
+        scorer.add([p])
+    whole = scorer_after(probs, max_faces=20)
+    assert scorer.n == whole.n == 5
+    assert scorer.mean == pytest.approx(probs.mean())
+    assert scorer.radius() == pytest.approx(whole.radius())
+
+
+@pytest.mark.parametrize("method", ["normal", "hoeffding"])
+def test_early_labels_agree_with_the_full_budget(rng, method):
+    agree = stopped_early = 0
+    trials = 300
+    for _ in range(trials):
+        mean = rng.uniform(0.1, 0.9)
+        probs = rng.beta(8 * mean, 8 * (1 - mean), size=20)
+        scorer = SequentialScorer(max_faces=20, method=method)
+        for p in probs:
+            scorer.add([p])
+            if scorer.decided():
+                break
+        stopped_early += scorer.n < 20
+        agree += (scorer.mean > 0.5) == (probs.mean() > 0.5)
+    assert agree / trials >= 0.95
+    assert stopped_early > trials // 4
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError, match="Unknown early exit method"):
+        SequentialScorer(max_faces=20, method="sprt")
@@ -0,0 +1,37 @@
+import numpy as np
+import torch
+
+from predictimg import embed_faces, facenet_preprocess_batch
+
+
+def test_batched_embedding_matches_one_crop_at_a_time(facenet, face_crops):
+    batched = embed_faces(face_crops, facenet)
+    single = np.concatenate([embed_faces([crop], facenet) for crop in face_crops])
+    assert batched.shape == (len(face_crops), 512)
+    np.testing.assert_allclose(batched, single, atol=1e-4)
+
+
+def test_chunked_passes_keep_crop_order(facenet, face_crops):
+    calls = []
+
+    def model(chunk):
+        calls.append(len(chunk))
+        return facenet(chunk)
+
+    np.testing.assert_allclose(embed_faces(face_crops, model, max_batch=3), embed_faces(face_crops, facenet), atol=1e-4)
+    assert calls == [3, 1]
+
+
+def test_embedding_runs_without_grad(face_crops):
+    def model(chunk):
+        assert not torch.is_grad_enabled()
+        return chunk.flatten(1)[:, :512]
+
+    np.testing.assert_array_equal(
+        embed_faces(face_crops, model),
+        facenet_preprocess_batch(face_crops).flatten(1)[:, :512].numpy()
+    )
+
+
+def test_no_crops_gives_an_empty_matrix(facenet):
+    assert embed_faces([], facenet).shape == (0, 512)
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+import torch
+
+from embedder_opt import build_optimized_embedder, cache_path_for, embedding_drift
+
+
+def small_embedder():
+    torch.manual_seed(0)
+    return torch.nn.Sequential(
+        torch.nn.Conv2d(3, 8, 3, stride=4),
+        torch.nn.ReLU(),
+        torch.nn.AdaptiveAvgPool2d(1),
+        torch.nn.Flatten(),
+        torch.nn.Linear(8, 16),
+    ).eval()
+
+
+@pytest.fixture
+def batch():
+    torch.manual_seed(1)
+    return torch.randn(4, 3, 160, 160)
+
+
+def test_fp32_without_export_is_the_model_itself(facenet):
+    assert build_optimized_embedder(facenet) is facenet
+
+
+def test_channels_last_leaves_the_reference_model_untouched(facenet, batch):
+    optimized = build_optimized_embedder(facenet, mode="channels_last")
+    conv = facenet.conv2d_1a.conv.weight
+    assert conv.is_contiguous() and not conv.is_contiguous(memory_format=torch.channels_last)
+    report, _, _ = embedding_drift(facenet, optimized, [batch])
+    assert report["faces"] == 4 and report["min_cosine"] > 0.9999
+
+
+def test_int8_dynamic_stays_close_to_fp32(facenet, batch):
+    optimized = build_optimized_embedder(facenet, mode="int8_dynamic")
+    assert any(isinstance(m, torch.ao.nn.quantized.dynamic.Linear) for m in optimized.modules())
+    assert not any(isinstance(m, torch.ao.nn.quantized.dynamic.Linear) for m in facenet.modules())
+    report, _, _ = embedding_drift(facenet, optimized, [batch])
+    assert report["mean_cosine"] > 0.99
+
+
+def test_int8_static_needs_calibration():
+    with pytest.raises(ValueError, match="calibration"):
+        build_optimized_embedder(small_embedder(), mode="int8_static")
+
+
+@pytest.mark.parametrize("mode, export", [("fp16", "none"), ("fp32", "onnx")])
+def test_unknown_mode_or_export_is_rejected(mode, export):
+    with pytest.raises(ValueError, match="Unknown embedder"):
+        build_optimized_embedder(small_embedder(), mode=mode, export=export)
+
+
+def test_torchscript_export_is_cached_and_reloaded(tmp_path, batch):
+    model = small_embedder()
+    scripted = build_optimized_embedder(model, export="torchscript", cache_dir=str(tmp_path))
+    assert isinstance(scripted, torch.jit.ScriptModule)
+    assert os.path.exists(cache_path_for(str(tmp_path), "fp32"))
+
+    reloaded = build_optimized_embedder(torch.nn.Identity(), export="torchscript", cache_dir=str(tmp_path))
+    with torch.no_grad():
+        torch.testing.assert_close(reloaded(batch), model(batch))
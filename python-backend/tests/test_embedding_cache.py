@@ -0,0 +1,111 @@
+import cv2
+import numpy as np
+import pytest
+import torch
+
+from embedding_cache import EMBEDDING_CACHE_HASHES, CachedEmbedder, EmbeddingCache, dhash, hamming, phash
+
+
+def smooth_faces(rng, n):
+    """(n,3,160,160) FaceNet inputs in [-1, 1] with face-like low-frequency structure."""
+    faces = [cv2.resize(rng.uniform(-0.8, 0.8, (6, 6, 3)).astype(np.float32), (160, 160), interpolation=cv2.INTER_CUBIC) for _ in range(n)]
+    return torch.from_numpy(np.stack(faces).transpose(0, 3, 1, 2).copy())
+
+
+def recompressed(faces_t):
+    """The crops through a JPEG round trip and a 0.8x rescale, as a re-encoded copy of the video would give."""
+    out = []
+    for face in faces_t.numpy().transpose(0, 2, 3, 1):
+        image = np.clip((face + 1) * 127.5, 0, 255).astype(np.uint8)
+        image = cv2.imdecode(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 70])[1], cv2.IMREAD_COLOR)
+        image = cv2.resize(cv2.resize(image, (128, 128), interpolation=cv2.INTER_AREA), (160, 160))
+        out.append(image.astype(np.float32) / 127.5 - 1)
+    return torch.from_numpy(np.stack(out).transpose(0, 3, 1, 2).copy())
+
+
+def test_hamming_matches_bit_counts(rng, monkeypatch):
+    a = rng.integers(0, 2 ** 63, 5, dtype=np.uint64) * np.uint64(2)
+    b = rng.integers(0, 2 ** 63, 7, dtype=np.uint64) + np.uint64(1)
+    expected = np.array([[bin(int(x) ^ int(y)).count("1") for y in b] for x in a])
+    assert np.array_equal(hamming(a, b), expected)
+    assert np.array_equal(np.diag(hamming(a, a)), np.zeros(5))
+    # NumPy < 2.0 has no bitwise_count: byte lookup table instead
+    monkeypatch.delattr(np, "bitwise_count", raising=False)
+    assert np.array_equal(hamming(a, b), expected)
+
+
+@pytest.mark.parametrize("hash_fn", [dhash, phash])
+def test_hashes_are_stable_under_recompression_and_tell_faces_apart(rng, hash_fn):
+    faces = smooth_faces(rng, 6)
+    hashes = hash_fn(faces)
+    assert hashes.dtype == np.uint64 and hashes.shape == (6,)
+    assert np.array_equal(hash_fn(faces), hashes)
+
+    near = np.diag(hamming(hashes, hash_fn(recompressed(faces))))
+    assert near.max() <= 8
+    apart = hamming(hashes, hashes)[np.triu_indices(6, k=1)]
+    assert apart.min() > 12
+
+
+def test_exact_and_near_hits(rng):
+    cache = EmbeddingCache(capacity=4, max_distance=2, dim=4)
+    cache.insert(np.array([0b1111], dtype=np.uint64), np.ones((1, 4)))
+    found, hit = cache.lookup(np.array([0b1111, 0b0111, 0b0001, 0b110000], dtype=np.uint64))
+    # Exact, 1 bit and 3 bits away from the stored hash, then one far off
+    assert hit.tolist() == [True, True, False, False]
+    assert np.array_equal(found[:2], np.ones((2, 4))) and not found[2:].any()
+    assert found.dtype == np.float32
+
+    metrics = cache.metrics()
+    assert metrics["lookups"] == 4 and metrics["hits"] == 2 and metrics["near_hits"] == 1
+    assert metrics["hit_ratio"] == 0.5 and metrics["size"] == 1
+
+
+def test_exact_only_cache_ignores_near_hashes():
+    cache = EmbeddingCache(capacity=4, max_distance=0, dim=4)
+    cache.insert(np.array([0b1111], dtype=np.uint64), np.ones((1, 4)))
+    assert cache.lookup(np.array([0b1111, 0b0111], dtype=np.uint64))[1].tolist() == [True, False]
+
+
+def test_full_cache_replaces_the_least_recently_used_entry():
+    cache = EmbeddingCache(capacity=2, dim=2)
+    cache.insert(np.array([1, 2], dtype=np.uint64), np.array([[1, 1], [2, 2]]))
+    cache.lookup(np.array([1], dtype=np.uint64))
+    cache.insert(np.array([3], dtype=np.uint64), np.array([[3, 3]]))
+
+    found, hit = cache.lookup(np.array([1, 2, 3], dtype=np.uint64))
+    assert hit.tolist() == [True, False, True]
+    assert found[0].tolist() == [1, 1] and found[2].tolist() == [3, 3]
+    assert cache.metrics()["evictions"] == 1 and cache.metrics()["size"] == 2
+
+
+def test_bad_settings_are_rejected():
+    with pytest.raises(ValueError, match="hash"):
+        EmbeddingCache(hash="ahash")
+    with pytest.raises(ValueError, match="max_distance"):
+        EmbeddingCache(max_distance=65)
+    assert EMBEDDING_CACHE_HASHES == ("dhash", "phash")
+
+
+def test_cached_embedder_only_embeds_misses(rng):
+    batches = []
+
+    def embedder(faces_t):
+        batches.append(len(faces_t))
+        return faces_t.mean(dim=(2, 3)).repeat(1, 4)
+
+    cached = CachedEmbedder(embedder, EmbeddingCache(capacity=16, max_distance=8, hash="phash", dim=12))
+    faces = smooth_faces(rng, 4)
+    first = cached(faces[:3])
+    assert batches == [3]
+    assert torch.allclose(first, embedder(faces[:3]), atol=1e-3)
+    batches.clear()
+
+    # Re-encoded copies of known faces hit; only the new face reaches the embedder
+    mixed = torch.cat([recompressed(faces[:3]), faces[3:]])
+    second = cached(mixed)
+    assert batches == [1]
+    assert torch.allclose(second[:3], first, atol=1e-3)
+
+    cached(faces)
+    assert batches == [1]
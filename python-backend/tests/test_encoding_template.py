@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+import pytest
+
+from quantum_numpy import _z0_diagonal, encode_features
+
+cirq = pytest.importorskip("cirq")
+from predictimg import build_encoding_template, feature_vector_to_circuit_layers
+
+WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tfq_face_layers_weights.h5")
+
+
+def test_template_symbols_follow_feature_order():
+    circuit, symbols, qubits = build_encoding_template(n_qubits=4, n_features=12)
+    assert [str(s) for s in symbols] == [f"x_{l}_{i}" for l in range(3) for i in range(4)]
+    assert len(qubits) == 4
+    # 4 RX + 3 CZ per layer
+    assert len(list(circuit.all_operations())) == 3 * 7
+
+
+def test_resolved_template_matches_per_face_circuit(rng, z0_expectation):
+    circuit, symbols, qubits = build_encoding_template(n_qubits=8, n_features=48)
+    for features in rng.normal(size=(3, 48)) * 4:
+        angles = np.mod(features, 2 * np.pi)
+        resolver = cirq.ParamResolver(dict(zip(symbols, angles)))
+        expected = z0_expectation(feature_vector_to_circuit_layers(features, qubits), qubits)
+        assert z0_expectation(circuit, qubits, resolver) == pytest.approx(expected, abs=1e-9)
+        state = encode_features(features[None])
+        assert np.sum(state ** 2 * _z0_diagonal(8)) == pytest.approx(expected, abs=1e-9)
+
+
+def test_template_head_matches_numpy_head(rng):
+    pytest.importorskip("tensorflow_quantum")
+    from predictimg import TFQTemplateHead, create_tfq_model_layers
+    from quantum_numpy import NumpyQuantumHead, load_quantum_head_weights
+
+    keras_model = create_tfq_model_layers(n_qubits=8, n_layers=12)
+    keras_model.load_weights(WEIGHTS_PATH)
+    X = rng.normal(size=(6, 512))
+    numpy_head = NumpyQuantumHead.from_weights(*load_quantum_head_weights(WEIGHTS_PATH))
+    np.testing.assert_allclose(TFQTemplateHead(keras_model).predict(X), numpy_head.predict(X), atol=1e-4)
@@ -0,0 +1,57 @@
+import threading
+import time
+
+
+def test_image_inference_runs_on_the_inference_executor(api, monkeypatch, png):
+    client, main = api
+    threads = []
+    predict = main.predict_image_deepfake_single
+
+    def recording_predict(**kwargs):
+        threads.append(threading.current_thread().name)
+        return predict(**kwargs)
+
+    monkeypatch.setattr(main, "predict_image_deepfake_single", recording_predict)
+    response = client.post("/predict/image", files={"file": ("face.png", png(230), "image/png")}, params={"augment": "none"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["prediction"]["label"] == "fake" and body["prediction"]["is_deepfake"]
+    assert body["analysis_parameters"]["faces_found"] == 1
+    assert threads and threads[0].startswith("inference")
+
+
+def test_health_answers_while_a_video_is_being_scored(api, monkeypatch):
+    client, main = api
+    started, release = threading.Event(), threading.Event()
+
+    def slow_prediction(path, max_faces, seconds_range, augment, early_exit, video_stats):
+        started.set()
+        release.wait(5)
+        video_stats["faces_used"] = 3
+        return 0.2, "real"
+
+    monkeypatch.setattr(main, "run_video_prediction", slow_prediction)
+    responses = []
+    request = threading.Thread(target=lambda: responses.append(
+        client.post("/predict", files={"file": ("clip.mp4", b"not decoded", "video/mp4")})
+    ))
+    request.start()
+    try:
+        assert started.wait(5)
+        start = time.perf_counter()
+        assert client.get("/health").status_code == 200
+        metrics = client.get("/metrics").json()
+        assert time.perf_counter() - start < 1.0
+        assert metrics["executors"]["inference"]["in_flight"] == 1
+    finally:
+        release.set()
+        request.join(5)
+    assert responses[0].status_code == 200
+    assert responses[0].json()["prediction"]["label"] == "real"
+
+
+def test_bad_parameters_are_rejected_before_any_work(api, monkeypatch, png):
+    client, main = api
+    monkeypatch.setattr(main, "run_blocking", None)
+    response = client.post("/predict/image", files={"file": ("face.png", png(100), "image/png")}, params={"augment": "tta:0"})
+    assert response.status_code == 400
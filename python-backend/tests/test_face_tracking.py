@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+import pytest
+
+from face_tracking import FaceTracker
+
+
+@pytest.fixture
+def scene(rng):
+    """Smooth background with a textured 120 px "face" that can be placed anywhere."""
+    background = cv2.resize(rng.integers(0, 256, size=(6, 8, 3), dtype=np.uint8), (640, 480), interpolation=cv2.INTER_CUBIC)
+    face = cv2.resize(rng.integers(0, 256, size=(12, 12, 3), dtype=np.uint8), (120, 120), interpolation=cv2.INTER_NEAREST)
+
+    def frame_with_face(x, y):
+        frame = background.copy()
+        frame[y:y + 120, x:x + 120] = face
+        return frame
+
+    return background, frame_with_face
+
+
+class CountingDetector:
+    def __init__(self, boxes):
+        self.boxes = boxes
+        self.calls = 0
+
+    def __call__(self, frame):
+        self.calls += 1
+        return [self.boxes[self.calls - 1]] if self.boxes[self.calls - 1] else []
+
+
+def test_moving_face_is_tracked_without_detection(scene):
+    _, frame_with_face = scene
+    positions = [(100, 80), (108, 84), (115, 90), (124, 93), (130, 99)]
+    detector = CountingDetector([(100, 80, 120, 120)])
+    tracker = FaceTracker(detector, redetect_every=10)
+    for x, y in positions:
+        (bx, by, bw, bh), = tracker(frame_with_face(x, y))
+        assert abs(bx - x) <= 2 and abs(by - y) <= 2 and (bw, bh) == (120, 120)
+    assert detector.calls == 1
+    assert tracker.stats == {"detections_run": 1, "frames_tracked": 4, "track_lost": 0}
+
+
+def test_detection_reruns_every_redetect_every_frames(scene):
+    _, frame_with_face = scene
+    detector = CountingDetector([(100, 80, 120, 120)] * 3)
+    tracker = FaceTracker(detector, redetect_every=2)
+    for _ in range(7):
+        tracker(frame_with_face(100, 80))
+    # detect, track, track, detect, track, track, detect
+    assert detector.calls == 3 and tracker.stats["frames_tracked"] == 4
+
+
+def test_lost_face_falls_back_to_detection(scene):
+    background, frame_with_face = scene
+    detector = CountingDetector([(100, 80, 120, 120), None, (300, 200, 120, 120)])
+    tracker = FaceTracker(detector, redetect_every=10)
+    tracker(frame_with_face(100, 80))
+    # The face left: matching fails, the detector runs and finds nothing
+    assert tracker(background) == []
+    assert tracker.stats["track_lost"] == 1
+    # Nothing tracked, so the next frame is detected again
+    assert tracker(frame_with_face(300, 200)) == [(300, 200, 120, 120)]
+    assert detector.calls == 3
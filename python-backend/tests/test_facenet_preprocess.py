@@ -0,0 +1,45 @@
+import cv2
+import numpy as np
+import pytest
+
+from predictimg import facenet_preprocess_batch, facenet_transform
+
+# facenet_preprocess_batch promises facenet_transform's output within 3 uint8 steps
+TOLERANCE = 3 * 2.0 / 255.0 + 1e-6
+
+
+def smooth_face(rng, h, w):
+    """Low-frequency BGR image, closer to a face crop than pixel noise."""
+    small = rng.integers(0, 256, size=(8, 8, 3), dtype=np.uint8)
+    return cv2.resize(small, (w, h), interpolation=cv2.INTER_CUBIC)
+
+
+@pytest.mark.parametrize("h, w", [(160, 160), (240, 200), (100, 120), (90, 300)])
+def test_matches_facenet_transform(rng, h, w):
+    face = smooth_face(rng, h, w)
+    batch = facenet_preprocess_batch([face])
+    assert batch.shape == (1, 3, 160, 160) and batch.dtype.is_floating_point
+    np.testing.assert_allclose(batch[0].numpy(), facenet_transform(face).numpy(), atol=TOLERANCE)
+
+
+def test_float_crops_are_truncated_like_to_pil_image(rng):
+    face = smooth_face(rng, 180, 170).astype(np.float32) / 255.0
+    np.testing.assert_allclose(
+        facenet_preprocess_batch([face])[0].numpy(),
+        facenet_transform(face).numpy(),
+        atol=TOLERANCE
+    )
+
+
+def test_channels_keep_their_order(rng):
+    face = np.zeros((160, 160, 3), dtype=np.uint8)
+    face[..., 0] = 255
+    batch = facenet_preprocess_batch([face]).numpy()
+    assert np.all(batch[0, 0] == 1.0) and np.all(batch[0, 1:] == -1.0)
+
+
+def test_mixed_sizes_stack_into_one_batch(rng):
+    faces = [smooth_face(rng, h, w) for h, w in ((50, 60), (300, 280))]
+    batch = facenet_preprocess_batch(faces)
+    assert batch.shape == (2, 3, 160, 160)
+    assert batch.min() >= -1.0 and batch.max() <= 1.0
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from frame_sampling import frame_thumbnail, skip_near_duplicates, thumbnail_difference
+
+
+def flat(value, shape=(240, 320, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+class ClosableFrames:
+    def __init__(self, frames):
+        self.frames = frames
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def close(self):
+        self.closed = True
+
+
+def kept(frames, threshold, stats=None):
+    return [frame_no for frame_no, _ in skip_near_duplicates(iter(frames), threshold, stats)]
+
+
+def test_thumbnails_are_small_gray_floats(rng):
+    thumb = frame_thumbnail(rng.integers(0, 256, size=(1080, 1920, 3), dtype=np.uint8))
+    assert thumb.shape == (32, 32) and thumb.dtype == np.float32
+    assert thumbnail_difference(frame_thumbnail(flat(10)), frame_thumbnail(flat(30))) == pytest.approx(20, abs=0.5)
+
+
+def test_threshold_zero_keeps_every_frame():
+    frames = [(i, flat(50)) for i in range(5)]
+    stats = {}
+    assert kept(frames, 0, stats) == [0, 1, 2, 3, 4]
+    assert stats == {"frames_gated": 5, "frames_skipped": 0}
+
+
+def test_near_duplicates_are_skipped():
+    frames = [(0, flat(50)), (1, flat(51)), (2, flat(90)), (3, flat(89)), (4, flat(20))]
+    stats = {}
+    assert kept(frames, 4.0, stats) == [0, 2, 4]
+    assert stats == {"frames_gated": 5, "frames_skipped": 2}
+
+
+def test_slow_drift_is_compared_with_the_last_kept_frame():
+    # Each step is below the threshold, but the drift since the last kept frame adds up
+    frames = [(i, flat(50 + 2 * i)) for i in range(8)]
+    assert kept(frames, 5.0) == [0, 3, 6]
+
+
+def test_upstream_iterator_is_closed():
+    frames = ClosableFrames([(i, flat(50)) for i in range(5)])
+    gated = skip_near_duplicates(frames, 4.0)
+    next(gated)
+    gated.close()
+    assert frames.closed
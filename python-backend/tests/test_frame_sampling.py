@@ -0,0 +1,70 @@
+import cv2
+import numpy as np
+import pytest
+
+from conftest import pattern_index
+from frame_sampling import FRAME_SAMPLERS, PYAV_AVAILABLE, grab_frames, iter_sampled_frames
+
+
+def sample(path, start, end, step, sampler):
+    cap = cv2.VideoCapture(path)
+    try:
+        return [(frame_no, frame) for frame_no, frame in iter_sampled_frames(path, cap, start, end, step, sampler)]
+    finally:
+        cap.release()
+
+
+def test_grab_yields_the_frames_seek_does(make_video):
+    path = make_video()
+    seek = sample(path, 5, 50, 3, "seek")
+    grab = sample(path, 5, 50, 3, "grab")
+    assert [n for n, _ in grab] == [n for n, _ in seek] == list(range(5, 50, 3))
+    for (frame_no, a), (_, b) in zip(seek, grab):
+        np.testing.assert_array_equal(a, b)
+        assert pattern_index(a) == frame_no
+
+
+def test_grab_reseeks_across_long_gaps(make_video):
+    path = make_video()
+    cap = cv2.VideoCapture(path)
+    try:
+        frames = list(grab_frames(cap, 2, 60, 25, max_gap=10))
+    finally:
+        cap.release()
+    assert [n for n, _ in frames] == [2, 27, 52]
+    assert [pattern_index(f) for _, f in frames] == [2, 27, 52]
+
+
+def test_grab_stops_at_the_end_of_the_video(make_video):
+    path = make_video(n_frames=20)
+    assert [n for n, _ in sample(path, 10, 40, 4, "grab")] == [10, 14, 18]
+
+
+@pytest.mark.skipif(not PYAV_AVAILABLE, reason="PyAV not installed")
+def test_keyframes_yield_the_first_keyframe_at_or_after_each_sample(make_video):
+    path = make_video(gop=10)
+    frames = sample(path, 15, 60, 12, "keyframes")
+    # Keyframes sit at multiples of 10: 20 (>= 15), 40 (>= 20 + 12), 60 is past the end
+    assert [n for n, _ in frames] == [20, 40]
+    assert [pattern_index(f) for _, f in frames] == [20, 40]
+
+
+@pytest.mark.skipif(not PYAV_AVAILABLE, reason="PyAV not installed")
+def test_keyframes_fall_back_to_grab_without_a_keyframe_in_range(make_video):
+    path = make_video(gop=30)
+    assert [n for n, _ in sample(path, 32, 40, 2, "keyframes")] == [32, 34, 36, 38]
+
+
+@pytest.mark.skipif(not PYAV_AVAILABLE, reason="PyAV not installed")
+def test_keyframe_numbers_are_relative_to_the_stream_start(make_video):
+    # MPEG-TS streams start at a non-zero timestamp
+    path = make_video("clip.ts", gop=10, codec="mpeg2video")
+    frames = sample(path, 25, 60, 1, "keyframes")
+    assert [n for n, _ in frames][:3] == [30, 40, 50]
+    assert pattern_index(frames[0][1]) == 30
+
+
+def test_unknown_sampler_is_rejected(make_video):
+    with pytest.raises(ValueError, match="Unknown frame sampler"):
+        sample(make_video(), 0, 10, 1, "random")
+    assert FRAME_SAMPLERS == ("seek", "grab", "keyframes")
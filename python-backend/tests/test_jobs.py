@@ -0,0 +1,224 @@
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import jobs
+from jobs import JobQueue
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = predicate()
+        if value:
+            return value
+        time.sleep(0.02)
+    raise AssertionError("timed out")
+
+
+def finished(queue, job_id):
+    return lambda: (job := queue.get(job_id)) and job["status"] in ("done", "failed") and job
+
+
+def set_row(queue, job_id, **columns):
+    db = sqlite3.connect(queue.db_path)
+    db.execute(
+        f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in columns)} WHERE id = ?",
+        (*columns.values(), job_id)
+    )
+    db.commit()
+    db.close()
+
+
+@pytest.fixture
+def job_queue(tmp_path):
+    queues = []
+
+    def make(handler=lambda *args: (200, {}), **kwargs):
+        kwargs.setdefault("poll_interval_s", 0.02)
+        queue = JobQueue(str(tmp_path / "jobs.db"), handler, **kwargs)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.stop(timeout=5)
+
+
+def test_submit_get_and_metrics(job_queue):
+    queue = job_queue()
+    first = queue.submit("upload", {"max_faces": 3})
+    second = queue.submit("url", {"url": "http://example.com/v.mp4"}, callback_url="http://example.com/hook")
+
+    job = queue.get(second)
+    assert job["kind"] == "url" and job["status"] == "queued"
+    assert job["params"] == {"url": "http://example.com/v.mp4"} and job["progress"] == {}
+    assert job["queue_position"] == 2 and queue.get(first)["queue_position"] == 1
+    assert queue.get("missing") is None
+    assert queue.metrics() == {"workers": 1, "queued": 2, "running": 0, "done": 0, "failed": 0}
+
+
+def test_worker_runs_jobs_and_removes_their_directory(job_queue):
+    seen = []
+
+    def handler(job_id, kind, params, job_dir, progress):
+        with open(os.path.join(job_dir, "video.mp4"), "wb") as f:
+            f.write(b"video")
+        seen.append(job_dir)
+        progress({"stage": "analysing", "faces_embedded": params["n"]})
+        if params["n"] == 2:
+            return 422, {"error": "No faces detected in the video", "status": "error"}
+        if params["n"] == 3:
+            raise RuntimeError("decoder crashed")
+        return 200, {"label": "real"}
+
+    queue = job_queue(handler)
+    ids = [queue.submit("upload", {"n": n}) for n in (1, 2, 3)]
+    queue.start()
+    done, no_face, crashed = (wait_for(finished(queue, job_id)) for job_id in ids)
+
+    assert done["status"] == "done" and done["status_code"] == 200 and done["result"] == {"label": "real"}
+    assert done["progress"] == {"stage": "analysing", "faces_embedded": 1} and done["attempts"] == 1
+    assert no_face["status"] == "failed" and no_face["status_code"] == 422
+    assert no_face["error"] == "No faces detected in the video"
+    assert crashed["status"] == "failed" and crashed["status_code"] == 500 and crashed["error"] == "decoder crashed"
+    assert not any(os.path.exists(path) for path in seen)
+
+
+def test_recover_requeues_expired_leases_until_max_attempts(job_queue):
+    queue = job_queue(max_attempts=2, lease_s=60)
+    expired, abandoned, live = (queue.submit("upload", {}) for _ in range(3))
+    now = time.time()
+    set_row(queue, expired, status="running", owner="otherhost:1", attempts=1, heartbeat_at=now - 120)
+    set_row(queue, abandoned, status="running", owner="otherhost:1", attempts=2, heartbeat_at=now - 120)
+    set_row(queue, live, status="running", owner="otherhost:1", attempts=1, heartbeat_at=now)
+    orphan_dir = queue.job_dir(abandoned)
+
+    queue.recover()
+    assert queue.get(expired)["status"] == "queued" and queue.get(expired)["owner"] is None
+    job = queue.get(abandoned)
+    assert job["status"] == "failed" and job["status_code"] == 500 and "2 attempts" in job["error"]
+    assert not os.path.exists(orphan_dir)
+    # Another host's fresh lease is left alone
+    assert queue.get(live)["status"] == "running"
+
+
+def test_recover_detects_dead_owner_processes_on_this_host(job_queue):
+    queue = job_queue(lease_s=60)
+    dead, alive = queue.submit("upload", {}), queue.submit("upload", {})
+    host = queue.owner.rpartition(":")[0]
+    now = time.time()
+    set_row(queue, dead, status="running", owner=f"{host}:999999999", attempts=1, heartbeat_at=now)
+    set_row(queue, alive, status="running", owner=f"{host}:{os.getppid()}", attempts=1, heartbeat_at=now)
+
+    queue.recover()
+    assert queue.get(dead)["status"] == "queued"
+    assert queue.get(alive)["status"] == "running"
+
+
+def test_started_queue_reruns_a_job_interrupted_by_a_restart(job_queue):
+    runs = []
+    queue = job_queue(lambda job_id, *args: runs.append(job_id) or (200, {}))
+    job_id = queue.submit("upload", {})
+    set_row(queue, job_id, status="running", owner="otherhost:1", attempts=1, heartbeat_at=None)
+
+    queue.start()
+    job = wait_for(finished(queue, job_id))
+    assert job["status"] == "done" and job["attempts"] == 2 and runs == [job_id]
+
+
+def test_prune_deletes_old_finished_jobs_only(job_queue):
+    queue = job_queue(retention_s=3600)
+    old, recent, queued = (queue.submit("upload", {}) for _ in range(3))
+    set_row(queue, old, status="done", finished_at=time.time() - 7200)
+    set_row(queue, recent, status="failed", finished_at=time.time())
+
+    queue.prune()
+    assert queue.get(old) is None
+    assert queue.get(recent) is not None and queue.get(queued) is not None
+
+
+def test_callback_is_posted_with_the_outcome(job_queue, monkeypatch):
+    posted = []
+
+    class Response:
+        status_code = 204
+
+        def raise_for_status(self):
+            pass
+
+    monkeypatch.setattr(jobs.requests, "post", lambda url, json, timeout: posted.append((url, json)) or Response())
+    queue = job_queue(lambda *args: (200, {"label": "fake"}))
+    job_id = queue.submit("upload", {}, callback_url="http://example.com/hook")
+    queue.start()
+    wait_for(lambda: queue.get(job_id)["callback_status"])
+
+    assert queue.get(job_id)["callback_status"] == "sent (204)"
+    assert posted == [(
+        "http://example.com/hook",
+        {"job_id": job_id, "status": "done", "status_code": 200, "result": {"label": "fake"}}
+    )]
+
+
+def test_job_endpoints_run_uploads_on_the_inference_executor(api, monkeypatch):
+    client, main = api
+    threads = []
+
+    def fake_prediction(path, max_faces, seconds_range, augment, early_exit, video_stats, progress=None):
+        threads.append(threading.current_thread().name)
+        with open(path, "rb") as f:
+            assert f.read() == b"video bytes"
+        progress({"frames_decoded": 10, "faces_embedded": 4})
+        video_stats["faces_used"] = 4
+        return 0.2, "real"
+
+    monkeypatch.setattr(main, "run_video_prediction", fake_prediction)
+    response = client.post("/jobs/predict", files={"file": ("clip.mp4", b"video bytes", "video/mp4")}, params={"max_faces": 4})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    status = wait_for(lambda: (body := client.get(f"/jobs/{job_id}").json())["status"] == "done" and body)
+    assert status["attempts"] == 1 and status["progress"]["faces_embedded"] == 4
+    result = client.get(f"/jobs/{job_id}/result")
+    assert result.status_code == 200
+    assert result.json()["filename"] == "clip.mp4" and result.json()["prediction"]["label"] == "real"
+    assert threads and threads[0].startswith("inference")
+    assert os.listdir(main.job_queue.work_dir) == []
+
+
+def test_job_result_keeps_the_synchronous_status_code(api, monkeypatch):
+    client, main = api
+
+    def no_faces(*args, **kwargs):
+        raise Exception("no_face_detected")
+
+    monkeypatch.setattr(main, "run_video_prediction", no_faces)
+    job_id = client.post("/jobs/predict", files={"file": ("clip.mp4", b"video", "video/mp4")}).json()["job_id"]
+    wait_for(lambda: client.get(f"/jobs/{job_id}").json()["status"] == "failed")
+    result = client.get(f"/jobs/{job_id}/result")
+    assert result.status_code == 422
+    assert result.json() == {"error": "No faces detected in the video", "filename": "clip.mp4", "status": "error"}
+
+
+def test_job_endpoints_reject_bad_requests(api):
+    client, main = api
+    assert client.get("/jobs/unknown").status_code == 404
+    assert client.get("/jobs/unknown/result").status_code == 404
+    assert client.post("/jobs/predict", files={"file": ("clip.gif", b"gif", "image/gif")}).status_code == 400
+    response = client.post("/jobs/predict-url", json={"url": "http://example.com/v.mp4", "callback_url": "ftp://example.com"})
+    assert response.status_code == 400
+
+
+def test_failed_submit_removes_the_job_directory(api, monkeypatch):
+    client, main = api
+
+    def broken_submit(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(main.job_queue, "submit", broken_submit)
+    with pytest.raises(sqlite3.OperationalError):
+        client.post("/jobs/predict", files={"file": ("clip.mp4", b"video", "video/mp4")})
+    assert os.listdir(main.job_queue.work_dir) == []
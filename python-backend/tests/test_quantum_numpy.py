@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from quantum_numpy import (
+    NumpyQuantumHead,
+    _z0_diagonal,
+    apply_pqc_layers,
+    encode_features,
+    load_quantum_head_weights,
+    rotation_blocks,
+)
+
+cirq = pytest.importorskip("cirq")
+sympy = pytest.importorskip("sympy")
+from predictimg import build_pqc_circuit_layers, feature_vector_to_circuit_layers
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEIGHTS_PATH = os.path.join(BACKEND_DIR, "tfq_face_layers_weights.h5")
+
+
+def numpy_z0(X, thetas):
+    state = apply_pqc_layers(encode_features(X, thetas.shape[1]), thetas)
+    return np.sum(state ** 2 * _z0_diagonal(thetas.shape[1]), axis=(1, 2))
+
+
+def cirq_z0(z0_expectation, features, thetas):
+    n_layers, n_qubits = thetas.shape
+    qubits = cirq.GridQubit.rect(1, n_qubits)
+    ansatz, symbols = build_pqc_circuit_layers(qubits, n_layers)
+    circuit = feature_vector_to_circuit_layers(features, qubits) + ansatz
+    resolver = cirq.ParamResolver(dict(zip(symbols, thetas.ravel())))
+    return z0_expectation(circuit, qubits, resolver)
+
+
+def test_rotation_blocks_are_orthogonal_kronecker_products():
+    angles = np.array([0.3, -1.2, 2.5])
+    blocks = rotation_blocks(angles)
+    single = [np.array([[np.cos(a / 2), np.sin(a / 2)], [-np.sin(a / 2), np.cos(a / 2)]]) for a in angles]
+    expected = np.kron(np.kron(single[0], single[1]), single[2])
+    np.testing.assert_allclose(blocks, expected, atol=1e-12)
+    np.testing.assert_allclose(blocks @ blocks.T, np.eye(8), atol=1e-12)
+
+
+@pytest.mark.parametrize("n_qubits", [3, 4, 8])
+def test_statevector_matches_cirq(rng, z0_expectation, n_qubits):
+    X = rng.normal(size=(3, n_qubits * 5)) * 3
+    thetas = rng.uniform(-np.pi, np.pi, size=(2, n_qubits))
+    expected = [cirq_z0(z0_expectation, x, thetas) for x in X]
+    np.testing.assert_allclose(numpy_z0(X, thetas), expected, atol=1e-9)
+
+
+def test_encoding_ignores_trailing_features(rng):
+    X = rng.normal(size=(2, 8 * 4 + 5))
+    np.testing.assert_allclose(encode_features(X), encode_features(X[:, :32]), atol=1e-12)
+
+
+def test_trained_head_matches_cirq(rng, z0_expectation):
+    thetas, kernel, bias = load_quantum_head_weights(WEIGHTS_PATH, n_qubits=8, n_layers=12)
+    head = NumpyQuantumHead.from_weights(thetas, kernel, bias)
+    X = rng.normal(size=(2, 512))
+    z = np.array([cirq_z0(z0_expectation, x, thetas) for x in X])
+    expected = 1.0 / (1.0 + np.exp(-(kernel * z + bias)))
+    np.testing.assert_allclose(head.predict(X).ravel(), expected, atol=1e-6)
+
+
+def test_numpy_head_serves_without_tensorflow():
+    code = "import sys, predictimg; assert 'tensorflow' not in sys.modules, 'tensorflow imported'"
+    subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, check=True, capture_output=True)
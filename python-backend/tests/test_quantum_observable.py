@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from quantum_numpy import NumpyQuantumHead, _z0_diagonal, apply_pqc_layers, check_head, compile_observable, encode_features
+
+
+@pytest.fixture
+def head(rng):
+    thetas = rng.uniform(-np.pi, np.pi, size=(3, 8))
+    return NumpyQuantumHead.from_weights(thetas, kernel=2.5, bias=-0.3)
+
+
+def test_observable_is_symmetric_with_unit_spectrum(head):
+    np.testing.assert_allclose(head.observable, head.observable.T, atol=1e-12)
+    # U^T Z0 U has the eigenvalues of Z0: half +1, half -1
+    eigenvalues = np.sort(np.linalg.eigvalsh(head.observable))
+    np.testing.assert_allclose(eigenvalues, np.repeat([-1.0, 1.0], 128), atol=1e-9)
+
+
+def test_compiled_expectation_matches_gate_by_gate(rng, head):
+    X = rng.normal(size=(40, 512))
+    state = apply_pqc_layers(encode_features(X), head.thetas)
+    direct = np.sum(state ** 2 * _z0_diagonal(8), axis=(1, 2))
+    # chunk_size smaller than the batch exercises the chunked path
+    np.testing.assert_allclose(head.expectation(X, chunk_size=16), direct, atol=1e-10)
+    assert check_head(head, n_samples=16)["max_diff_vs_statevector"] < 1e-9
+
+
+def test_identity_ansatz_reads_z0_of_the_encoding(rng):
+    X = rng.normal(size=(4, 64))
+    observable = compile_observable(np.zeros((2, 8)))
+    state = encode_features(X).reshape(4, -1)
+    # With zero thetas only the CZ chains remain, which commute with Z0
+    expected = np.sum(state ** 2 * _z0_diagonal(8).reshape(-1), axis=1)
+    np.testing.assert_allclose(np.sum((state @ observable) * state, axis=1), expected, atol=1e-12)
+
+
+def test_npz_round_trip(tmp_path, rng, head):
+    path = tmp_path / "quantum_head.npz"
+    head.save_npz(path)
+    loaded = NumpyQuantumHead.from_npz(path)
+    X = rng.normal(size=(5, 512))
+    np.testing.assert_allclose(loaded.predict(X), head.predict(X), atol=1e-12)
+    np.testing.assert_array_equal(loaded.thetas, head.thetas)
+    assert head.predict(X).shape == (5, 1)
@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+import pytest
+
+import predictimg
+from predictimg import predict_quantum_probs, requires_tfq, warmup_quantum_head
+from quantum_numpy import NumpyQuantumHead
+
+WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tfq_face_layers_weights.h5")
+
+
+class CountingHead(NumpyQuantumHead):
+    def __init__(self, thetas):
+        head = NumpyQuantumHead.from_weights(thetas, kernel=1.0, bias=0.0)
+        super().__init__(head.observable, head.kernel, head.bias, thetas=thetas)
+        self.batch_sizes = []
+
+    def predict(self, X_scaled):
+        self.batch_sizes.append(len(X_scaled))
+        return super().predict(X_scaled)
+
+
+def test_warmup_runs_the_head_on_a_dummy_batch(rng):
+    head = CountingHead(rng.uniform(-np.pi, np.pi, size=(2, 8)))
+    first_ms, steady_ms = warmup_quantum_head(head, batch_size=4, repeats=2)
+    assert head.batch_sizes == [4, 4, 4]
+    assert first_ms >= 0 and 0 <= steady_ms < float("inf")
+
+
+def test_numpy_head_skips_tfq(rng):
+    head = NumpyQuantumHead.from_weights(rng.uniform(-np.pi, np.pi, size=(2, 8)), kernel=1.0, bias=0.0)
+    X = rng.normal(size=(3, 512))
+    assert not requires_tfq(head) and requires_tfq(object())
+    np.testing.assert_allclose(predict_quantum_probs(head, X), head.predict(X).ravel())
+
+
+def test_keras_model_without_tfq_raises(monkeypatch):
+    monkeypatch.setattr(predictimg, "TFQ_AVAILABLE", False)
+    with pytest.raises(Exception, match="tfq_unavailable"):
+        predict_quantum_probs(object(), np.zeros((1, 512)))
+
+
+def test_template_head_traces_once_for_all_batch_sizes(rng):
+    pytest.importorskip("tensorflow_quantum")
+    head = predictimg.load_quantum_head(WEIGHTS_PATH, use_tfq=True)
+    warmup_quantum_head(head, batch_size=20, repeats=1)
+    for batch in (1, 5, 33):
+        assert head.predict(rng.normal(size=(batch, 512))).shape == (batch, 1)
+    assert head._forward.experimental_get_tracing_count() == 1
@@ -0,0 +1,171 @@
+import hashlib
+import os
+import re
+
+import cv2
+import numpy as np
+import pytest
+import requests
+
+import ranged_download
+from conftest import pattern_index
+from frame_sampling import grab_frames
+from ranged_download import TailDownloadUnsupported, _iter_boxes, _video_samples, download_video_tail
+
+
+class FakeResponse:
+    def __init__(self, status_code, data, headers=None):
+        self.status_code = status_code
+        self.content = data
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class RangeServer:
+    """requests stand-in serving one file, with or without Range support; logs the ranges asked for."""
+
+    def __init__(self, data, ranges=True, total_known=True):
+        self.data = data
+        self.ranges = ranges
+        self.total_known = total_known
+        self.requested = []
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        match = re.match(r"bytes=(\d+)-(\d+)", (headers or {}).get("Range", ""))
+        if not self.ranges or not match:
+            return FakeResponse(200, self.data)
+        start, end = int(match.group(1)), min(int(match.group(2)), len(self.data) - 1)
+        self.requested.append((start, end))
+        total = len(self.data) if self.total_known else "*"
+        return FakeResponse(206, self.data[start:end + 1], {"Content-Range": f"bytes {start}-{end}/{total}"})
+
+
+@pytest.fixture
+def long_video(make_video):
+    """10 s, 25 fps, keyframe every second; moov written after the media (not fast-start)."""
+    path = make_video("long.mp4", n_frames=250, fps=25, gop=25, size=(320, 240))
+    with open(path, "rb") as f:
+        return path, f.read()
+
+
+def moov_of(data):
+    for kind, payload, end in _iter_boxes(data, 0, len(data)):
+        if kind == b"moov":
+            return data[payload - 8:end]
+    raise AssertionError("no moov")
+
+
+def tail_indices(path, start, end):
+    cap = cv2.VideoCapture(path)
+    try:
+        return [(frame_no, pattern_index(frame)) for frame_no, frame in grab_frames(cap, start, end, 1)]
+    finally:
+        cap.release()
+
+
+def test_sample_table_matches_the_demuxer(long_video):
+    av = pytest.importorskip("av")
+    path, data = long_video
+    offsets, sizes, times, sync = _video_samples(moov_of(data))
+    with av.open(path) as container:
+        packets = [p for p in container.demux(video=0) if p.size]
+        packets.sort(key=lambda p: p.dts)
+    assert len(offsets) == 250
+    np.testing.assert_array_equal(offsets, [p.pos for p in packets])
+    np.testing.assert_array_equal(sizes, [p.size for p in packets])
+    np.testing.assert_allclose(times, np.arange(250) / 25)
+    np.testing.assert_array_equal(sync, np.arange(0, 250, 25))
+
+
+def test_tail_download_decodes_like_the_full_file(tmp_path, monkeypatch, long_video):
+    path, data = long_video
+    # Scale the probe and merge gap down to the size of the test clip
+    merge = ranged_download._merge
+    monkeypatch.setattr(ranged_download, "PROBE_BYTES", 4096)
+    monkeypatch.setattr(ranged_download, "_merge", lambda ranges: merge(ranges, gap=4096))
+    server = RangeServer(data)
+    stats = {}
+    out = download_video_tail("http://example.test/v.mp4", str(tmp_path / "tail.mp4"), 2, session=server, stats=stats)
+    assert stats["mode"] == "ranged" and stats["file_size"] == len(data)
+    assert stats["bytes_transferred"] < len(data) * 0.6
+    assert stats["requests"] == len(server.requested) > 1
+    assert os.path.getsize(out) == len(data)
+    assert tail_indices(out, 200, 250) == tail_indices(path, 200, 250) == [(i, i % 256) for i in range(200, 250)]
+    # The digest identifies the fetched bytes and where they went, so a repeat download keys the same
+    again = {}
+    download_video_tail("http://example.test/v.mp4", str(tmp_path / "again.mp4"), 2, session=RangeServer(data), stats=again)
+    assert again["sha256"] == stats["sha256"] != hashlib.sha256(data).hexdigest()
+
+
+def test_server_without_range_support_gives_a_full_download(tmp_path, long_video):
+    _, data = long_video
+    stats = {}
+    out = download_video_tail("http://example.test/v.mp4", str(tmp_path / "full.mp4"), 2, session=RangeServer(data, ranges=False), stats=stats)
+    with open(out, "rb") as f:
+        assert f.read() == data
+    assert stats["mode"] == "full" and stats["sha256"] == hashlib.sha256(data).hexdigest()
+
+
+@pytest.mark.parametrize("make_server, reason", [
+    (lambda data: RangeServer(data, total_known=False), "unknown file size"),
+    (lambda data: RangeServer(b"\x47" * 200000), "not an MP4"),
+    (lambda data: RangeServer(data.replace(b"moov", b"free", 1)), "no moov"),
+])
+def test_unsupported_files_are_reported(tmp_path, long_video, make_server, reason):
+    _, data = long_video
+    with pytest.raises(TailDownloadUnsupported, match=reason):
+        download_video_tail("http://example.test/v.mp4", str(tmp_path / "x.mp4"), 2, session=make_server(data))
+
+
+def test_main_falls_back_to_a_full_download_and_removes_the_partial_file(tmp_path, monkeypatch):
+    import main
+
+    partial = tmp_path / "downloaded_file.mp4"
+
+    def failing_tail(url, path, seconds_range, stats=None):
+        with open(path, "wb") as f:
+            f.write(b"partial")
+        raise TailDownloadUnsupported("fragmented MP4")
+
+    def full_download(url, temp_dir, stats=None):
+        path = os.path.join(temp_dir, "downloaded_file.mov")
+        with open(path, "wb") as f:
+            f.write(b"full")
+        return path
+
+    monkeypatch.setattr(main, "RANGED_DOWNLOAD", True)
+    monkeypatch.setattr(main, "download_video_tail", failing_tail)
+    monkeypatch.setattr(main, "download_file_from_url", full_download)
+    path = main.download_video_from_url("http://example.test/v.mp4", str(tmp_path), 6, {})
+    assert path.endswith(".mov") and not partial.exists()
+
+
+def test_main_removes_the_partial_file_when_the_download_fails(tmp_path, monkeypatch):
+    import main
+
+    def failing_tail(url, path, seconds_range, stats=None):
+        with open(path, "wb") as f:
+            f.write(b"partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(main, "RANGED_DOWNLOAD", True)
+    monkeypatch.setattr(main, "download_video_tail", failing_tail)
+    with pytest.raises(OSError, match="disk full"):
+        main.download_video_from_url("http://example.test/v.mp4", str(tmp_path), 6, {})
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,136 @@
+import hashlib
+import io
+import os
+import time
+
+import pytest
+
+from result_cache import HashingFile, ResultCache, file_fingerprint
+
+
+def test_key_depends_on_every_part():
+    key = ResultCache.key("video", "abc", {"max_faces": 20, "augment": "none"}, "v1")
+    assert key == ResultCache.key("video", "abc", {"augment": "none", "max_faces": 20}, "v1")
+    for other in (
+        ResultCache.key("image", "abc", {"max_faces": 20, "augment": "none"}, "v1"),
+        ResultCache.key("video", "abd", {"max_faces": 20, "augment": "none"}, "v1"),
+        ResultCache.key("video", "abc", {"max_faces": 21, "augment": "none"}, "v1"),
+        ResultCache.key("video", "abc", {"max_faces": 20, "augment": "none"}, "v2"),
+    ):
+        assert other != key
+
+
+def test_memory_tier_is_an_lru():
+    cache = ResultCache(memory_items=2)
+    cache.put("a", {"n": 1})
+    cache.put("b", {"n": 2})
+    assert cache.get("a") == {"n": 1}
+    cache.put("c", {"n": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"n": 1} and cache.get("c") == {"n": 3}
+    metrics = cache.metrics()
+    assert metrics["memory_hits"] == 3 and metrics["misses"] == 1 and metrics["stores"] == 3
+    assert metrics["memory_items"] == 2 and metrics["disk_mb"] is None
+
+
+def test_disk_tier_is_shared_between_instances(tmp_path):
+    ResultCache(disk_dir=str(tmp_path)).put("a" * 64, {"label": "real"})
+    other = ResultCache(disk_dir=str(tmp_path))
+    assert other.get("a" * 64) == {"label": "real"}
+    assert other.get("a" * 64) == {"label": "real"}
+    metrics = other.metrics()
+    assert metrics["disk_hits"] == 1 and metrics["memory_hits"] == 1
+    assert not [name for _, _, names in os.walk(tmp_path) for name in names if name.endswith(".tmp")]
+
+
+def test_entries_expire_after_the_ttl(tmp_path):
+    cache = ResultCache(disk_dir=str(tmp_path), ttl_s=0.2)
+    cache.put("b" * 64, {"label": "fake"})
+    assert cache.get("b" * 64) == {"label": "fake"}
+    time.sleep(0.3)
+    assert cache.get("b" * 64) is None
+    assert cache.metrics()["expired"] == 2
+    assert not os.path.exists(cache._path("b" * 64))
+
+
+def test_disk_tier_evicts_least_recently_used_files(tmp_path):
+    value = {"payload": "x" * 1000}
+    cache = ResultCache(memory_items=0, disk_dir=str(tmp_path), max_disk_bytes=3500)
+    keys = [f"{i:064x}" for i in range(3)]
+    now = time.time()
+    for index, key in enumerate(keys):
+        cache.put(key, value)
+        os.utime(cache._path(key), (now - 100 + index, now - 100 + index))
+    assert cache.get(keys[0]) == value  # touched: now the most recent
+
+    cache.put(f"{3:064x}", value)
+    assert cache.metrics()["evicted"] == 1
+    assert not os.path.exists(cache._path(keys[1]))
+    assert all(os.path.exists(cache._path(key)) for key in (keys[0], keys[2], f"{3:064x}"))
+    assert cache.metrics()["disk_mb"] <= 3500 / (1024 * 1024)
+
+
+def test_hashing_file_hashes_sequential_writes_like_the_file():
+    data = os.urandom(10000)
+    hashing = HashingFile(io.BytesIO())
+    for start in range(0, len(data), 3000):
+        hashing.write(data[start:start + 3000])
+    assert hashing.hexdigest() == hashlib.sha256(data).hexdigest()
+
+
+def test_hashing_file_digest_covers_the_offsets_of_sparse_writes():
+    def sparse(offset):
+        hashing = HashingFile(io.BytesIO())
+        hashing.truncate(100)
+        hashing.seek(offset)
+        hashing.write(b"tail")
+        return hashing.hexdigest()
+
+    assert sparse(90) == sparse(90)
+    assert sparse(90) != sparse(80)
+
+
+def test_file_fingerprint_follows_contents_and_extras(tmp_path):
+    weights = tmp_path / "weights.h5"
+    weights.write_bytes(b"v1")
+    first = file_fingerprint([str(weights), str(tmp_path / "missing")], extra=("numpy",))
+    assert len(first) == 16
+    assert file_fingerprint([str(weights)], extra=("numpy",)) == first
+    assert file_fingerprint([str(weights)], extra=("tfq",)) != first
+    weights.write_bytes(b"v2")
+    assert file_fingerprint([str(weights)], extra=("numpy",)) != first
+
+
+def test_result_cache_key_skips_random_augmentation(api, monkeypatch):
+    client, main = api
+    params = {"max_faces": 5, "augment": "none"}
+    assert main.result_cache_key("image", "abc", params) is None  # cache off
+
+    monkeypatch.setattr(main, "result_cache", ResultCache())
+    key = main.result_cache_key("image", "abc", params)
+    assert key is not None
+    assert main.result_cache_key("image", "abc", {**params, "augment": "random"}) is None
+    assert main.result_cache_key("image", "abc", {**params, "augment": "tta:4"}) not in (None, key)
+    monkeypatch.setattr(main, "model_version", "retrained")
+    assert main.result_cache_key("image", "abc", params) != key
+
+
+@pytest.mark.parametrize("augment, expected", [("none", ["miss", "hit"]), ("random", ["bypass", "bypass"])])
+def test_video_results_are_served_from_the_cache(api, monkeypatch, tmp_path, augment, expected):
+    client, main = api
+    monkeypatch.setattr(main, "result_cache", ResultCache(disk_dir=str(tmp_path / "cache")))
+    runs = []
+
+    def fake_prediction(path, max_faces, seconds_range, augment, early_exit, video_stats):
+        runs.append(path)
+        video_stats["faces_used"] = 5
+        return 0.3, "real"
+
+    monkeypatch.setattr(main, "run_video_prediction", fake_prediction)
+    bodies = [
+        client.post("/predict", files={"file": ("clip.mp4", b"same video", "video/mp4")}, params={"augment": augment}).json()
+        for _ in range(2)
+    ]
+    assert [body["cache"] for body in bodies] == expected
+    assert len(runs) == (1 if augment == "none" else 2)
+    assert bodies[0]["prediction"] == bodies[1]["prediction"]
@@ -0,0 +1,87 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+import serve
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Preload the models the way serve.main does, then fork a worker that uses them
+PRELOAD_AND_FORK = textwrap.dedent("""
+    import os, sys
+    import numpy as np
+    import torch
+    torch.set_num_threads(1)
+    from facenet_pytorch import InceptionResnetV1
+    import main, serve
+    main.SCALER_PATH = os.path.join(sys.argv[1], "scaler.joblib")
+    main.QUANTUM_WEIGHTS_PATH = os.path.join(sys.argv[1], "tfq_face_layers_weights.h5")
+    main.get_facenet_feature_extractor = lambda: InceptionResnetV1(pretrained=None).eval()
+    main.load_models(fork_safe=True)
+    print("threads", len(serve.native_threads()), "tensorflow" in sys.modules, main.model_version)
+    sys.stdout.flush()
+    pid = os.fork()
+    if pid == 0:
+        with torch.no_grad():
+            features = main.embedder_model(torch.zeros(2, 3, 160, 160)).numpy()
+        probs = main.quantum_model.predict(main.scaler.transform(features))
+        os._exit(0 if probs.shape == (2, 1) else 1)
+    print("child", os.waitpid(pid, 0)[1])
+""")
+
+
+@pytest.mark.skipif(not hasattr(os, "fork") or not os.path.exists("/proc/self/task"), reason="needs fork() and /proc")
+def test_preloaded_models_leave_one_thread_and_work_after_fork(tmp_path):
+    # main logs to deepfake_api.log in the working directory
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [BACKEND_DIR, os.environ.get("PYTHONPATH")]))}
+    result = subprocess.run(
+        [sys.executable, "-c", PRELOAD_AND_FORK, BACKEND_DIR],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=300
+    )
+    lines = dict(line.split(" ", 1) for line in result.stdout.splitlines() if line.startswith(("threads", "child")))
+    assert result.returncode == 0, result.stderr[-2000:]
+    threads, tensorflow, model_version = lines["threads"].split()
+    assert threads == "1" and tensorflow == "False" and model_version
+    assert lines["child"] == "0"
+
+
+def test_load_models_keeps_what_is_already_loaded(monkeypatch, stub_models):
+    import main
+
+    head, scaler, embedder = stub_models
+    for name, value in (("scaler", scaler), ("embedder_model", embedder), ("quantum_model", head), ("model_version", "v1")):
+        monkeypatch.setattr(main, name, value)
+    monkeypatch.setattr(main, "load_scaler", None)
+    monkeypatch.setattr(main, "load_quantum_head", None)
+    main.load_models()
+    assert main.scaler is scaler and main.embedder_model is embedder and main.quantum_model is head
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"), reason="needs /proc/<pid>/smaps_rollup")
+def test_process_memory_splits_shared_and_unique():
+    memory = serve.process_memory()
+    assert set(memory) == {"rss_mb", "pss_mb", "shared_mb", "unique_mb"}
+    assert memory["rss_mb"] > 0
+    assert memory["shared_mb"] + memory["unique_mb"] == pytest.approx(memory["rss_mb"], abs=0.2)
+
+
+def test_process_memory_of_a_missing_process():
+    assert serve.process_memory(pid=2 ** 22 + 1) is None
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/task"), reason="needs /proc")
+def test_native_threads_sees_python_threads():
+    import threading
+
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait, daemon=True)
+    before = len(serve.native_threads())
+    thread.start()
+    try:
+        assert len(serve.native_threads()) == before + 1
+    finally:
+        stop.set()
+        thread.join()
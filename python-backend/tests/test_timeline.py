@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import predictimg
+from predictimg import predict_video_timeline
+
+
+def grey_scenes(cuts):
+    """Flat frames whose grey level changes at the given {first_frame: level} cuts."""
+    def pattern(index, size):
+        level = [value for start, value in sorted(cuts.items()) if start <= index][-1]
+        return np.full((size[1], size[0], 3), level, dtype=np.uint8)
+    return pattern
+
+
+@pytest.fixture
+def one_face_per_frame(monkeypatch):
+    monkeypatch.setattr(predictimg, "detect_faces_upper_half", lambda frame, max_side=None: [(0, 0, 16, 16)])
+
+
+def run_timeline(path, stub_models, **kwargs):
+    head, scaler, embedder = stub_models
+    stats = {}
+    segments = list(predict_video_timeline(path, head, scaler, embedder, augment="none", stats=stats, **kwargs))
+    return segments, stats
+
+
+def test_fixed_segments_cover_the_whole_video(make_video, stub_models, one_face_per_frame):
+    path = make_video(n_frames=100, fps=10, pattern=grey_scenes({0: 40, 50: 220}))
+    segments, stats = run_timeline(path, stub_models, segment_seconds=3, faces_per_segment=2)
+    assert [(s["start_s"], s["end_s"]) for s in segments] == [(0.0, 3.0), (3.0, 6.0), (6.0, 9.0), (9.0, 10.0)]
+    assert [s["segment"] for s in segments] == [0, 1, 2, 3]
+    assert all(s["faces_used"] == 2 for s in segments)
+    assert [s["label"] for s in segments] == ["real", "real", "fake", "fake"]
+    assert segments[0]["probability"] == pytest.approx(40 / 255, abs=0.02)
+    assert stats["segments"] == 4
+
+
+def test_scene_segments_cut_at_scene_changes(make_video, stub_models, one_face_per_frame):
+    path = make_video(n_frames=100, fps=10, pattern=grey_scenes({0: 40, 35: 200, 80: 120}))
+    segments, _ = run_timeline(path, stub_models, segment_seconds=5, faces_per_segment=5, segmenter="scene")
+    assert [(s["start_s"], s["end_s"]) for s in segments] == [(0.0, 3.5), (3.5, 8.0), (8.0, 10.0)]
+    assert [s["label"] for s in segments] == ["real", "fake", "real"]
+
+
+def test_windows_without_sampled_frames_are_still_reported(make_video, stub_models, one_face_per_frame):
+    path = make_video(n_frames=100, fps=10, pattern=grey_scenes({0: 90}))
+    # A static video: the duplicate gate passes only the first frame
+    segments, stats = run_timeline(path, stub_models, segment_seconds=2, faces_per_segment=2, dedup_threshold=1.0)
+    assert len(segments) == 5
+    assert segments[0]["faces_used"] == 1 and segments[0]["label"] == "real"
+    assert all(s["frames_sampled"] == 0 and s["probability"] is None for s in segments[1:])
+    assert stats["frames_sampled"] == 1
+
+
+def test_segments_are_yielded_as_they_are_scored(make_video, stub_models, one_face_per_frame):
+    path = make_video(n_frames=100, fps=10)
+    head, scaler, embedder = stub_models
+    timeline = predict_video_timeline(path, head, scaler, embedder, segment_seconds=2, faces_per_segment=1, augment="none")
+    first = next(timeline)
+    assert first["segment"] == 0 and first["end_s"] == 2.0
+    timeline.close()
+
+
+def test_unknown_segmenter_is_rejected(make_video, stub_models):
+    with pytest.raises(ValueError, match="Unknown segmenter"):
+        run_timeline(make_video(), stub_models, segmenter="shots")
@@ -0,0 +1,119 @@
+import random
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from video_pipeline import VideoFacePipeline
+
+
+class Frames:
+    """Frame iterator like iter_sampled_frames: (frame_no, frame) with frame value == frame_no, closable."""
+
+    def __init__(self, n, fail_at=None):
+        self.n = n
+        self.fail_at = fail_at
+        self.closed = False
+
+    def __iter__(self):
+        for frame_no in range(self.n):
+            if frame_no == self.fail_at:
+                raise OSError("decode failed")
+            yield frame_no, np.full((8, 8, 3), frame_no, dtype=np.uint8)
+
+    def close(self):
+        self.closed = True
+
+
+def jittery_detector():
+    """Detector with random latency so workers finish out of order; frames divisible by 3 have no face, odd ones two."""
+    rng = random.Random(threading.get_ident())
+
+    def detect(frame):
+        time.sleep(rng.uniform(0, 0.004))
+        frame_no = int(frame[0, 0, 0])
+        if frame_no % 3 == 0:
+            return []
+        return [(0, 0, 4, 4)] * (2 if frame_no % 2 else 1)
+
+    return detect
+
+
+def crop_ids(crops):
+    return np.array([crop[0, 0, 0] for crop in crops])
+
+
+def sequential_ids(n_frames, max_faces):
+    detect = jittery_detector()
+    ids = []
+    for frame_no in range(n_frames):
+        ids.extend([frame_no] * len(detect(np.full((1, 1, 1), frame_no))))
+    return ids[:max_faces]
+
+
+def pipeline_threads():
+    return [t.name for t in threading.enumerate() if t.name.startswith("video-")]
+
+
+@pytest.mark.parametrize("max_faces", [7, 25, 1000])
+def test_faces_come_out_in_frame_order(max_faces):
+    frames = Frames(40)
+    pipeline = VideoFacePipeline(jittery_detector, crop_ids, detect_workers=4, embed_chunk=4, queue_size=4)
+    outputs, n_faces, stats = pipeline.run(frames, max_faces)
+    expected = sequential_ids(40, max_faces)
+    assert outputs.tolist() == expected and n_faces == len(expected)
+    assert frames.closed and not pipeline_threads()
+    if max_faces < len(sequential_ids(40, 1000)):
+        assert stats["frames_detected"] < 40
+
+
+def test_stop_when_ends_collection_after_a_chunk():
+    seen = []
+
+    def stop_when(chunk_output):
+        seen.append(chunk_output.tolist())
+        return True
+
+    pipeline = VideoFacePipeline(jittery_detector, crop_ids, detect_workers=2, embed_chunk=3)
+    outputs, _, stats = pipeline.run(Frames(40), 1000, stop_when=stop_when)
+    assert stats["stopped_early"] and len(seen) == 1
+    assert outputs.tolist() == seen[0] == sequential_ids(40, 1000)[:len(seen[0])]
+    assert not pipeline_threads()
+
+
+def test_decode_error_is_raised_and_stages_stopped():
+    frames = Frames(40, fail_at=5)
+    pipeline = VideoFacePipeline(jittery_detector, crop_ids, detect_workers=3)
+    with pytest.raises(OSError, match="decode failed"):
+        pipeline.run(frames, 1000)
+    assert frames.closed and not pipeline_threads()
+
+
+def test_embed_error_cancels_upstream_and_the_pool():
+    def failing_embed(crops):
+        raise RuntimeError("embed failed")
+
+    pipeline = VideoFacePipeline(jittery_detector, failing_embed, detect_workers=2, embed_chunk=2)
+    with pytest.raises(RuntimeError, match="embed failed"):
+        pipeline.run(Frames(400), 1000, stop_when=lambda output: False)
+    assert not pipeline_threads()
+
+
+def test_no_faces_gives_empty_output():
+    pipeline = VideoFacePipeline(lambda: (lambda frame: []), crop_ids, detect_workers=2)
+    outputs, n_faces, stats = pipeline.run(Frames(10), 20)
+    assert n_faces == 0 and outputs.size == 0
+    assert stats["frames_decoded"] == stats["frames_detected"] == 10
+
+
+def test_detections_are_logged_with_their_frame_number(caplog):
+    pipeline = VideoFacePipeline(jittery_detector, crop_ids, detect_workers=3)
+    with caplog.at_level("DEBUG", logger="video_pipeline"):
+        pipeline.run(Frames(6), 1000)
+    assert [r.getMessage() for r in caplog.records] == [
+        "Found 2 face(s) in frame 1",
+        "Found 1 face(s) in frame 2",
+        "Found 1 face(s) in frame 4",
+        "Found 2 face(s) in frame 5",
+    ]
@@ -0,0 +1,171 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+_POLL_S = 0.05
+
+
+def _put(q, item, cancel):
+    """Blocking put that gives up once cancel is set. Returns False if cancelled."""
+    while not cancel.is_set():
+        try:
+            q.put(item, timeout=_POLL_S)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, cancel):
+    """Blocking get that returns _DONE once cancel is set."""
+    while not cancel.is_set():
+        try:
+            return q.get(timeout=_POLL_S)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+class VideoFacePipeline:
+    """
+    Decode -> detect -> embed pipeline for one video.
+
+    A decoder thread pulls (frame_no, frame) from a frame iterator into a
+    bounded queue, detect_workers threads run face detection (each with its
+    own detect callable from detector_factory, so per-worker state such as a
+    tracker or a checked-out cascade is never shared) and an embed pool runs embed_fn (embedding, optionally scoring)
+    on face crops in chunks of embed_chunk while decoding and detection
+    continue. Detections are re-ordered by
+    frame so the faces kept are exactly those the sequential loop would
+    keep. Once max_faces crops are collected (or stop_when says so),
+    upstream stages are cancelled and the decoder is joined before run()
+    returns.
+    """
+
+    def __init__(self, detector_factory, embed_fn, detect_workers=4, embed_workers=1, queue_size=16, embed_chunk=32):
+        self.detector_factory = detector_factory
+        self.embed_fn = embed_fn
+        self.detect_workers = max(1, detect_workers)
+        self.embed_workers = max(1, embed_workers)
+        self.queue_size = queue_size
+        self.embed_chunk = embed_chunk
+
+    def run(self, frames, max_faces, stop_when=None):
+        """
+        Consume frames and return (outputs, n_faces, stats), where outputs
+        are embed_fn's results for the first max_faces crops concatenated in
+        frame order. With stop_when, each chunk is embedded
+        before the next is formed and stop_when(chunk_output) returning True
+        ends collection early (decode and detection keep running meanwhile).
+        """
+        cancel = threading.Event()
+        errors = []
+        frame_q = queue.Queue(maxsize=self.queue_size)
+        result_q = queue.Queue(maxsize=self.queue_size)
+        stats = {"frames_decoded": 0, "frames_detected": 0, "stopped_early": False}
+        started = time.perf_counter()
+
+        def decode():
+            try:
+                for seq, (frame_no, frame) in enumerate(frames):
+                    if not _put(frame_q, (seq, frame_no, frame), cancel):
+                        break
+                    stats["frames_decoded"] += 1
+            except Exception as e:
+                errors.append(e)
+                cancel.set()
+            finally:
+                close = getattr(frames, "close", None)
+                if close:
+                    close()
+                for _ in range(self.detect_workers):
+                    _put(frame_q, _DONE, cancel)
+
+        def detect():
+            try:
+                detect_faces = self.detector_factory()
+                while True:
+                    item = _get(frame_q, cancel)
+                    if item is _DONE:
+                        break
+                    seq, frame_no, frame = item
+                    crops = []
+                    for (x, y, w, h) in detect_faces(frame):
+                        crop = frame[y:y+h, x:x+w]
+                        if crop.size:
+                            crops.append(crop)
+                    if not _put(result_q, (seq, frame_no, crops), cancel):
+                        break
+            except Exception as e:
+                errors.append(e)
+                cancel.set()
+            finally:
+                _put(result_q, _DONE, cancel)
+
+        decoder = threading.Thread(target=decode, name="video-decoder", daemon=True)
+        detectors = [threading.Thread(target=detect, name=f"video-detector-{i}", daemon=True) for i in range(self.detect_workers)]
+        decoder.start()
+        for thread in detectors:
+            thread.start()
+
+        def stop_upstream():
+            cancel.set()
+            decoder.join()
+            for thread in detectors:
+                thread.join()
+
+        embed_pool = None
+        embed_futures = []
+        pending, reorder = [], {}
+        next_seq, n_faces, finished = 0, 0, 0
+        try:
+            embed_pool = ThreadPoolExecutor(max_workers=self.embed_workers, thread_name_prefix="video-embed")
+            while finished < self.detect_workers and n_faces < max_faces and not stats["stopped_early"]:
+                item = _get(result_q, cancel)
+                if item is _DONE:
+                    if cancel.is_set():
+                        break
+                    finished += 1
+                    continue
+                seq, frame_no, crops = item
+                reorder[seq] = (frame_no, crops)
+                # Release detections in frame order so the kept faces match the sequential loop
+                while next_seq in reorder and n_faces < max_faces:
+                    frame_no, crops = reorder.pop(next_seq)
+                    crops = crops[:max_faces - n_faces]
+                    stats["frames_detected"] += 1
+                    next_seq += 1
+                    if crops:
+                        logger.debug(f"Found {len(crops)} face(s) in frame {frame_no}")
+                    pending.extend(crops)
+                    n_faces += len(crops)
+                    if len(pending) >= self.embed_chunk:
+                        embed_futures.append(embed_pool.submit(self.embed_fn, pending))
+                        pending = []
+                        if stop_when is not None and stop_when(embed_futures[-1].result()):
+                            stats["stopped_early"] = True
+                            break
+
+            # Stop upstream work as soon as enough faces are collected
+            stop_upstream()
+            if errors:
+                raise errors[0]
+            if pending:
+                embed_futures.append(embed_pool.submit(self.embed_fn, pending))
+            outputs = [future.result() for future in embed_futures]
+        finally:
+            # Also when collection raised (an embed error, stop_when): no stage or pool outlives run()
+            stop_upstream()
+            if embed_pool is not None:
+                embed_pool.shutdown(wait=True, cancel_futures=True)
+
+        stats["wall_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return (np.concatenate(outputs) if outputs else np.empty(0)), n_faces, stats